@@ -4,17 +4,126 @@ Statistics Simulation Routes
 Interactive simulations for learning statistics concepts.
 '''
 
-import random
-from typing import Any, List
-from fastapi import APIRouter, Depends
+import math
+from typing import Any, List, Optional, Tuple
+from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.deps import get_current_active_user, get_optional_current_user
 from app.models.user import User
+from app.services.sim_service.admission import AdmissionError, admission
+from app.services.sim_service.cache import cache_key, result_cache
+from app.services.sim_service.datasets import check_access, delete_dataset, save_upload
+from app.services.sim_service.encoding import MEDIA_TYPES, encode_result, negotiate_encoding
+from app.services.sim_service.executor import SimulationUnavailableError, run_in_pool, stream_in_pool
+from app.services.sim_service.jobs import job_manager
+from app.services.sim_service.registry import (
+    resolve_sim_type,
+    supports_batch,
+    supports_streaming,
+)
 
 router = APIRouter()
 
+# Numeric catalog ids (see /available) -> simulation types
+LEGACY_SIMULATION_IDS = {
+    1: "coin_flipper",
+    2: "clt",
+}
+
+# XP the numeric catalog ids have always awarded
+LEGACY_XP = {
+    1: 5,
+    2: 10,
+}
+
+
+def _capped(parameters: dict, name: str, default: int, cap: int) -> int:
+    '''Legacy count parameter, clamped to its old cap.'''
+    value = parameters.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{name} must be an integer, got {value!r}"
+        )
+    return min(value, cap)
+
+
+def _legacy_params(simulation_id: int, parameters: dict) -> dict:
+    '''Translate the parameters of the numeric catalog ids to engine parameters.'''
+    if simulation_id == 1:
+        return {"trials": _capped(parameters, "num_flips", 100, 10000), "seed": parameters.get("seed")}
+    return {
+        "distribution": "uniform",
+        "dist_params": {"a": 0, "b": 10},
+        "sample_size": _capped(parameters, "sample_size", 30, 1000),
+        "num_samples": _capped(parameters, "num_samples", 100, 5000),
+        "seed": parameters.get("seed")
+    }
+
+
+def _legacy_body(simulation_id: int, params: dict, result: dict) -> dict:
+    '''Response of the numeric catalog ids, in the shape they always returned.'''
+    metrics = result["metrics"]
+    if simulation_id == 1:
+        num_flips = params["trials"]
+        heads_percentage = metrics["proportion_heads"] * 100
+        return {
+            "simulation_id": 1,
+            "title": "Coin Flip Probability",
+            "parameters": {"num_flips": num_flips},
+            "results": {
+                "total_flips": num_flips,
+                "heads": metrics["heads"],
+                "tails": metrics["tails"],
+                "heads_percentage": round(heads_percentage, 2),
+                "expected_percentage": 50.0,
+                "deviation": round(abs(heads_percentage - 50.0), 2)
+            },
+            "insights": [
+                f"You flipped {metrics['heads']} heads out of {num_flips} flips",
+                f"That's {heads_percentage:.1f}% heads vs expected 50%",
+                "The more flips you do, the closer you get to 50%" if num_flips < 1000 else "Great! You can see the law of large numbers in action!"
+            ],
+            "xp_earned": LEGACY_XP[1],
+            "next_simulation": {
+                "id": 2,
+                "title": "Try the Central Limit Theorem simulation",
+                "unlock_tip": "Complete 3 probability lessons to unlock"
+            }
+        }
+
+    sample_size, num_samples = params["sample_size"], params["num_samples"]
+    overall_mean = metrics["observed_mean"]
+    return {
+        "simulation_id": 2,
+        "title": "Central Limit Theorem",
+        "parameters": {
+            "sample_size": sample_size,
+            "num_samples": num_samples,
+            "population": "Uniform(0,10)"
+        },
+        "results": {
+            # 50 means for display, from the series strided over the whole run
+            "sample_means": [float(m) for m in result["series"]["sample_means"][:50]],
+            "overall_mean": round(overall_mean, 3),
+            "expected_mean": 5.0,
+            "standard_error": round(metrics["theoretical_se"], 3),
+            "distribution_shape": "approximately normal"
+        },
+        "insights": [
+            f"Generated {num_samples} sample means from samples of size {sample_size}",
+            f"Sample means average: {overall_mean:.2f} (expected: 5.0)",
+            "The sample means form a normal distribution!",
+            "This demonstrates the Central Limit Theorem"
+        ],
+        "xp_earned": LEGACY_XP[2]
+    }
+
 
 @router.get("/available")
 async def get_available_simulations(
@@ -82,91 +191,434 @@ async def get_available_simulations(
     }
 
 
+def _negotiate(accept: Optional[str], encoding: Optional[str]) -> str:
+    '''
+    Pick the response encoding from ?encoding= or the Accept header.
+
+    `json` (default) sends series arrays as number lists, `base64` as
+    packed little-endian float32 buffers inside JSON, and `msgpack` as
+    raw buffers in a msgpack body (see sim_service.encoding).
+    '''
+    try:
+        return negotiate_encoding(accept, encoding)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+
+
+def _respond(body: dict, encoding: str) -> Response:
+    '''Serialize a result body, straight from its NumPy arrays.'''
+    return Response(content=encode_result(body, encoding), media_type=MEDIA_TYPES[encoding])
+
+
+def _admit(user: User, sim_type: str, parameters: dict, method: str = "run") -> float:
+    '''
+    Charge a run's estimated CPU cost to the user's and the pool's budget
+    (see sim_service.admission).
+
+    Returns:
+        Charged cost, to refund if the run is rejected before doing work
+
+    Raises:
+        HTTPException: 429 if the user is over budget, 503 if the workers
+            are saturated, both with Retry-After
+    '''
+    try:
+        return admission.admit(user.id, sim_type, parameters, method)
+    except AdmissionError as e:
+        raise _admission_error(e)
+
+
+def _admission_error(e: AdmissionError) -> HTTPException:
+    '''429 (user over budget) or 503 (workers saturated) with Retry-After.'''
+    return HTTPException(
+        status_code=(
+            status.HTTP_503_SERVICE_UNAVAILABLE if e.overloaded
+            else status.HTTP_429_TOO_MANY_REQUESTS
+        ),
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
+
+
+def _unavailable_error(e: SimulationUnavailableError) -> HTTPException:
+    '''503 with Retry-After for runs lost to a worker failure.'''
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
+
+
+def _check_datasets(parameters: dict, user: User) -> None:
+    '''400 unless every dataset named in the parameters belongs to the user.'''
+    try:
+        check_access(parameters, user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def _run_cached(sim_type: str, parameters: dict, user: User) -> Tuple[dict, bool]:
+    '''
+    Run a simulation in the pool, serving deterministic runs (seeded or
+    analytic) from the result cache. Only runs that miss the cache are
+    charged to the admission budgets.
+
+    Returns:
+        (result dict, whether it came from the cache)
+    '''
+    # Before the cache lookup, so cached runs over other users' data are not served
+    _check_datasets(parameters, user)
+    key = cache_key(sim_type, parameters)
+    result = await result_cache.get(key) if key else None
+    if result is not None:
+        return result, True
+
+    cost = _admit(user, sim_type, parameters)
+    try:
+        result = await run_in_pool(sim_type, parameters)
+    except ValueError as e:
+        admission.refund(user.id, cost)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except SimulationUnavailableError as e:
+        raise _unavailable_error(e)
+    # Truncated runs are not cached so a later request can complete them
+    if key and not result["meta"].get("partial"):
+        await result_cache.set(key, result)
+    return result, False
+
+
 @router.post("/run/{simulation_id}")
 async def run_simulation(
     *,
-    simulation_id: int,
+    simulation_id: str,
     parameters: dict,
+    encoding: Optional[str] = None,
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     '''
     Run a statistics simulation with given parameters.
+
+    `simulation_id` is either a simulation type (e.g. `pi_darts`, `clt`)
+    or one of the numeric catalog ids from `/available`, which take and
+    return their original parameters and `results`/`insights` body.
+    Series arrays can be requested packed with `?encoding=base64` or
+    `msgpack`.
     '''
-    if simulation_id == 1:  # Coin Flip Simulation
-        num_flips = min(parameters.get("num_flips", 100), 10000)
-        
-        # Simulate coin flips
-        flips = [random.choice(["H", "T"]) for _ in range(num_flips)]
-        heads_count = flips.count("H")
-        heads_percentage = (heads_count / num_flips) * 100
-        
-        return {
-            "simulation_id": 1,
-            "title": "Coin Flip Probability",
-            "parameters": {"num_flips": num_flips},
-            "results": {
-                "total_flips": num_flips,
-                "heads": heads_count,
-                "tails": num_flips - heads_count,
-                "heads_percentage": round(heads_percentage, 2),
-                "expected_percentage": 50.0,
-                "deviation": round(abs(heads_percentage - 50.0), 2)
-            },
-            "insights": [
-                f"You flipped {heads_count} heads out of {num_flips} flips",
-                f"That's {heads_percentage:.1f}% heads vs expected 50%",
-                "The more flips you do, the closer you get to 50%" if num_flips < 1000 else "Great! You can see the law of large numbers in action!"
-            ],
-            "xp_earned": 5,
-            "next_simulation": {
-                "id": 2,
-                "title": "Try the Central Limit Theorem simulation",
-                "unlock_tip": "Complete 3 probability lessons to unlock"
+    encoding = _negotiate(accept, encoding)
+    if simulation_id.isdigit():
+        legacy_id = int(simulation_id)
+        sim_type = LEGACY_SIMULATION_IDS.get(legacy_id)
+        if sim_type is None:
+            # Catalog entries without a simulation behind them
+            return {
+                "error": "Simulation not implemented yet",
+                "available_simulations": list(LEGACY_SIMULATION_IDS),
+                "message": "Try simulation 1 (Coin Flip) or 2 (Central Limit Theorem)"
             }
-        }
-    
-    elif simulation_id == 2:  # Central Limit Theorem
-        sample_size = min(parameters.get("sample_size", 30), 1000)
-        num_samples = min(parameters.get("num_samples", 100), 5000)
-        
-        # Simulate CLT (using uniform distribution)
-        sample_means = []
-        for _ in range(num_samples):
-            sample = [random.uniform(0, 10) for _ in range(sample_size)]
-            sample_means.append(sum(sample) / len(sample))
-        
-        overall_mean = sum(sample_means) / len(sample_means)
-        
-        return {
-            "simulation_id": 2,
-            "title": "Central Limit Theorem",
-            "parameters": {
-                "sample_size": sample_size,
-                "num_samples": num_samples,
-                "population": "Uniform(0,10)"
-            },
-            "results": {
-                "sample_means": sample_means[:50],  # First 50 for display
-                "overall_mean": round(overall_mean, 3),
-                "expected_mean": 5.0,
-                "standard_error": round(2.887 / (sample_size ** 0.5), 3),
-                "distribution_shape": "approximately normal"
-            },
-            "insights": [
-                f"Generated {num_samples} sample means from samples of size {sample_size}",
-                f"Sample means average: {overall_mean:.2f} (expected: 5.0)",
-                "The sample means form a normal distribution!",
-                "This demonstrates the Central Limit Theorem"
-            ],
-            "xp_earned": 10
-        }
-    
     else:
-        return {
-            "error": "Simulation not implemented yet",
-            "available_simulations": [1, 2],
-            "message": "Try simulation 1 (Coin Flip) or 2 (Central Limit Theorem)"
-        }
+        legacy_id = None
+        sim_type = resolve_sim_type(simulation_id)
+
+    if sim_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown simulation: {simulation_id}"
+        )
+
+    if legacy_id is not None:
+        # Catalog ids keep their original parameters and response shape
+        parameters = _legacy_params(legacy_id, parameters)
+        result, _ = await _run_cached(sim_type, parameters, current_user)
+        return _respond(_legacy_body(legacy_id, parameters, result), encoding)
+
+    result, cached = await _run_cached(sim_type, parameters, current_user)
+
+    return _respond({
+        "simulation_id": simulation_id,
+        "sim_type": sim_type,
+        **result,
+        "cached": cached,
+        "xp_earned": settings.XP_RUN_SIMULATION
+    }, encoding)
+
+
+@router.post("/plan")
+async def plan_power(
+    *,
+    parameters: dict,
+    encoding: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Power surface over grids of n and effect size for the z or t test,
+    plus the minimum n reaching `target_power` for each effect size.
+
+    Results are cached, so repeated slider positions cost nothing.
+    '''
+    encoding = _negotiate(accept, encoding)
+    result, cached = await _run_cached("power_planner", parameters, current_user)
+    return _respond({**result, "cached": cached}, encoding)
+
+
+@router.post("/batch/{sim_type}")
+async def run_simulation_batch(
+    *,
+    sim_type: str,
+    parameters: dict,
+    encoding: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Run many hypothesis tests in one vectorized call.
+
+    Supported for `z_test_prop` (arrays of successes, n, p0) and
+    `t_test_one_sample` (arrays of sample_mean, sample_std, n, mu0).
+    Curves are omitted unless `include_curves` is true.
+    '''
+    encoding = _negotiate(accept, encoding)
+    key = resolve_sim_type(sim_type)
+    if key is None or not supports_batch(key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Batch mode not available for: {sim_type}"
+        )
+
+    _check_datasets(parameters, current_user)
+    cost = _admit(current_user, key, parameters, method="run_batch")
+    try:
+        result = await run_in_pool(key, parameters, method="run_batch")
+    except ValueError as e:
+        admission.refund(current_user.id, cost)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except SimulationUnavailableError as e:
+        raise _unavailable_error(e)
+
+    return _respond({"sim_type": key, **result}, encoding)
+
+
+@router.post("/datasets", status_code=status.HTTP_201_CREATED)
+async def upload_dataset(
+    *,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Upload a CSV, JSON or Excel file for the data-driven simulations.
+
+    Returns a `dataset_id` to pass (with a `column` name) as parameters
+    of e.g. `/run/resampling`.
+    '''
+    # Read one byte past the limit so oversized files are rejected without buffering them
+    content = await file.read(settings.MAX_UPLOAD_SIZE + 1)
+    try:
+        return await run_in_threadpool(save_upload, file.filename, content, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete("/datasets/{dataset_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_dataset(
+    *,
+    dataset_id: str,
+    current_user: User = Depends(get_current_active_user)
+) -> None:
+    '''
+    Delete one of the current user's uploaded datasets.
+
+    Datasets are also deleted `SIMULATION_DATASET_TTL_SECONDS` after upload.
+    '''
+    try:
+        await run_in_threadpool(delete_dataset, dataset_id, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_simulation_cache_stats(
+    *,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Get hit/miss counters and usage of the simulation result cache.
+    '''
+    return result_cache.info()
+
+
+@router.get("/admission/stats")
+async def get_simulation_admission_stats(
+    *,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Get the remaining global CPU budget of the simulation pool.
+    '''
+    return admission.info()
+
+
+@router.post("/stream/{sim_type}")
+async def stream_simulation(
+    *,
+    sim_type: str,
+    parameters: dict,
+    encoding: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Run a simulation and stream partial results as NDJSON.
+
+    Each line is a SimulationResult snapshot, one per batch, so clients
+    can plot convergence while the run is still in progress. Available
+    for simulations that compute in batches (`pi_darts`,
+    `arrival_simulator`). The run executes in the simulation pool under
+    the usual time limits; if it fails after the first line, the stream
+    ends with an `{"error": ...}` line. Series arrays are packed per line
+    with `?encoding=base64`.
+    '''
+    encoding = _negotiate(None, encoding)
+    if encoding == "msgpack":
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Streaming supports json or base64 encoding"
+        )
+
+    key = resolve_sim_type(sim_type)
+    if key is None or not supports_streaming(key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Streaming not available for: {sim_type}"
+        )
+
+    cost = _admit(current_user, key, parameters)
+    results = stream_in_pool(key, parameters)
+
+    # Pull the first snapshot eagerly so invalid parameters become a 400
+    try:
+        first = await results.__anext__()
+    except ValueError as e:
+        admission.refund(current_user.id, cost)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except SimulationUnavailableError as e:
+        raise _unavailable_error(e)
+
+    async def gen():
+        yield encode_result(first, encoding) + b"\n"
+        try:
+            async for result in results:
+                yield encode_result(result, encoding) + b"\n"
+        except (ValueError, TimeoutError, SimulationUnavailableError) as e:
+            yield encode_result({"error": str(e)}, encoding) + b"\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@router.post("/jobs/{sim_type}", status_code=status.HTTP_202_ACCEPTED)
+async def submit_simulation_job(
+    *,
+    sim_type: str,
+    parameters: dict,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Run a simulation as a background job, for runs too large for a request.
+
+    Returns the job status at once. Follow it by polling `/jobs/{job_id}`
+    or through `simJobUpdated` events on `/progress/events`, then fetch
+    `/jobs/{job_id}/result`. Jobs get `SIMULATION_JOB_TIMEOUT_SECONDS` to
+    run and are kept for `SIMULATION_JOB_TTL_SECONDS` once finished.
+    '''
+    key = resolve_sim_type(sim_type)
+    if key is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown simulation: {sim_type}"
+        )
+
+    _check_datasets(parameters, current_user)
+    try:
+        cost = admission.admit(
+            current_user.id, key, parameters,
+            timeout=settings.SIMULATION_JOB_TIMEOUT_SECONDS, shared_pool=False
+        )
+    except AdmissionError as e:
+        raise _admission_error(e)
+    try:
+        return await job_manager.submit(current_user.id, key, parameters, cost)
+    except AdmissionError as e:
+        admission.refund(current_user.id, cost, shared_pool=False)
+        raise _admission_error(e)
+
+
+@router.get("/jobs")
+async def list_simulation_jobs(
+    *,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    List the current user's simulation jobs that have not expired.
+    '''
+    return {"jobs": job_manager.list(current_user.id)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_simulation_job(
+    *,
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Get the status and progress of a simulation job.
+
+    `progress` holds the engine's completed and total work units (trials,
+    samples, resamples, ...) and their `fraction`.
+    '''
+    job = job_manager.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown or expired job: {job_id}"
+        )
+    return job
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_simulation_job_result(
+    *,
+    job_id: str,
+    encoding: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    '''
+    Get the result of a finished simulation job.
+
+    Same body and encodings as `/run/{simulation_id}`; 409 while the job
+    is still queued or running, or if it failed.
+    '''
+    encoding = _negotiate(accept, encoding)
+    job = job_manager.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown or expired job: {job_id}"
+        )
+    result = job_manager.result(job_id, current_user.id)
+    if result is None:
+        detail = f"Job failed: {job['error']}" if job["error"] else f"Job is {job['status']}"
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+    return _respond({"job_id": job_id, "sim_type": job["sim_type"], **result}, encoding)
 
 
 @router.get("/history")
@@ -104,16 +104,74 @@ class Settings(BaseSettings):
     # --- File Upload ---
     MAX_UPLOAD_SIZE: int = Field(10485760, description="Max upload size (10MB)")
     ALLOWED_EXTENSIONS: List[str] = Field(
-        [".csv", ".json", ".xlsx", ".xls"],
+        [".csv", ".json", ".xlsx"],
         description="Allowed file extensions"
     )
     UPLOAD_DIR: Path = Field(Path("uploads"), description="Upload directory")
     
     # --- Simulation Settings ---
     MAX_SIMULATION_TRIALS: int = Field(2000000, description="Max trials per simulation")
-    MAX_SIMULATION_REPLICATES: int = Field(10000, description="Max replicates for CLT")
+    MAX_SIMULATION_REPLICATES: int = Field(100000, description="Max replicates for CLT")
+    MAX_SIMULATION_BATCH_SIZE: int = Field(10000, description="Max tests per batch request")
     SIMULATION_TIMEOUT_SECONDS: float = Field(2.0, description="Simulation timeout")
+    SIMULATION_HARD_TIMEOUT_SECONDS: float = Field(
+        10.0,
+        description="Kill pool workers when a simulation overruns this long"
+    )
     SIMULATION_CACHE_TTL: int = Field(30, description="Cache TTL for sim results (seconds)")
+    SIMULATION_CACHE_MAX_BYTES: int = Field(33554432, description="In-process sim cache size (32MB)")
+    SIMULATION_CACHE_REDIS_ENABLED: bool = Field(False, description="Also cache sim results in Redis")
+    SIMULATION_MAX_WORKERS: int = Field(2, description="Process pool size for simulation runs")
+    SIMULATION_WARM_UP: bool = Field(
+        True,
+        description="Start the pool workers and run each simulation once at startup"
+    )
+    SIMULATION_MEMORY_BUDGET_BYTES: int = Field(
+        16777216,
+        description="Max work-buffer bytes per simulation run (16MB)"
+    )
+    SIMULATION_SHARDS: int = Field(
+        8,
+        description="Shards per parallel run (fixed, so results do not depend on worker count)"
+    )
+    SIMULATION_PARALLEL_MIN_TRIALS: int = Field(
+        250000,
+        description="Split runs with at least this many work units (see parallel.should_shard) across the process pool"
+    )
+    SIMULATION_JOB_WORKERS: int = Field(1, description="Process pool size for background simulation jobs")
+    SIMULATION_JOB_TIMEOUT_SECONDS: float = Field(
+        60.0,
+        description="Cooperative time budget of a background simulation job"
+    )
+    SIMULATION_JOB_TTL_SECONDS: int = Field(600, description="Keep finished job results this long")
+    SIMULATION_DATASET_TTL_SECONDS: int = Field(86400, description="Keep uploaded datasets this long")
+    SIMULATION_MAX_JOBS_PER_USER: int = Field(3, description="Max queued or running jobs per user")
+    SIMULATION_MAX_QUEUED_JOBS: int = Field(50, description="Max queued or running jobs in total")
+    SIMULATION_USER_BUDGET_MS: float = Field(
+        20000.0,
+        gt=0,
+        description="Per-user burst budget of estimated simulation CPU-ms"
+    )
+    SIMULATION_USER_REFILL_MS: float = Field(
+        500.0,
+        gt=0,
+        description="Estimated simulation CPU-ms a user regains per second"
+    )
+    SIMULATION_GLOBAL_BUDGET_MS: float = Field(
+        30000.0,
+        gt=0,
+        description="Burst budget of estimated CPU-ms for the whole pool (refills at pool capacity)"
+    )
+    SIMULATION_CHEAP_COST_MS: float = Field(
+        50.0,
+        description="Runs estimated at most this many CPU-ms may use the reserved pool budget"
+    )
+    SIMULATION_RESERVED_BUDGET_FRACTION: float = Field(
+        0.2,
+        ge=0,
+        lt=1,
+        description="Share of the pool budget kept for cheap runs"
+    )
     
     # --- Gamification ---
     XP_CORRECT_ANSWER: int = Field(10, description="XP for correct answer")
@@ -2,8 +2,9 @@
 Simple per-user Server-Sent Events (SSE) registry.
 
 This keeps an in-memory mapping of user_id -> set of asyncio queues.
-When server code emits a user progress update, we publish it to all
-connected clients for that user.
+When server code emits a user progress update (or another event, such
+as a simulation job update), we publish it to all connected clients for
+that user.
 
 For multi-process deployments, replace the in-memory fanout with
 Redis Pub/Sub or another broker.
@@ -38,7 +39,12 @@ async def unsubscribe(user_id: int, q: asyncio.Queue[str]) -> None:
 
 async def emit_user_progress(user_id: int, payload: Dict[str, Any]) -> None:
     """Publish a user progress payload to all subscribers for that user."""
-    data = json.dumps({"type": "progressUpdated", "payload": payload})
+    await emit_user_event(user_id, "progressUpdated", payload)
+
+
+async def emit_user_event(user_id: int, event: str, payload: Dict[str, Any]) -> None:
+    """Publish a payload as an `event` SSE event to all subscribers for that user."""
+    data = json.dumps({"type": event, "payload": payload})
     async with _lock:
         queues = list(_subs.get(user_id, set()))
     for q in queues:
@@ -52,6 +58,7 @@ async def next_or_heartbeat(q: asyncio.Queue[str], timeout: float = 20.0) -> byt
     """Return next queue item or a heartbeat comment if timeout expires."""
     try:
         data = await asyncio.wait_for(q.get(), timeout=timeout)
-        return ("event: progressUpdated\n" + f"data: {data}\n\n").encode("utf-8")
+        event = json.loads(data)["type"]
+        return (f"event: {event}\n" + f"data: {data}\n\n").encode("utf-8")
     except asyncio.TimeoutError:
         return b":hb\n\n"
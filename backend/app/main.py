@@ -19,6 +19,9 @@ from app.core.config import settings
 from app.api.v1.api import api_router
 from app.db.init_db import init_db
 from app.core.logging import setup_logging
+from app.services.sim_service import datasets
+from app.services.sim_service.executor import shutdown_executor, warm_up_executor
+from app.services.sim_service.jobs import job_manager
 
 # Setup logging
 setup_logging()
@@ -39,10 +42,17 @@ async def lifespan(app: FastAPI):
     logger.info("Initializing database...")
     init_db()
     
+    # Fork the simulation workers and import the engines (scipy) in them
+    if settings.SIMULATION_WARM_UP:
+        logger.info("Warming up simulation workers...")
+        await warm_up_executor()
+    
+    # Delete uploaded datasets once they expire
+    datasets.start_purger()
+    
     # You could add other startup tasks here:
     # - Connect to Redis
     # - Load ML models
-    # - Warm up caches
     
     logger.info("Startup complete!")
     
@@ -50,6 +60,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down...")
+    shutdown_executor()
+    job_manager.shutdown()
+    datasets.stop_purger()
     # Add cleanup tasks here if needed
     # - Close database connections
     # - Flush caches
@@ -103,7 +116,8 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
             "success": False,
             "error": exc.detail,
             "status_code": exc.status_code
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
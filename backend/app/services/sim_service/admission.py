@@ -0,0 +1,280 @@
+'''
+Simulation Admission Control
+
+Admits simulation runs by their estimated CPU cost instead of counting
+requests: a 2M-dart pi estimate costs as much as thousands of z-tests.
+
+Each run is priced in estimated CPU-milliseconds from its parameters
+(COST_MODELS: work units times calibrated nanoseconds per unit, plus
+BASE_COST_MS) and must fit two token buckets:
+    - one per user (settings.SIMULATION_USER_BUDGET_MS burst, refilled at
+      SIMULATION_USER_REFILL_MS per second); a user over budget gets 429
+    - one global bucket for the process pool, refilled at the pool's
+      capacity (SIMULATION_MAX_WORKERS CPU-seconds per second); an
+      overloaded pool gets 503
+Expensive runs may not take the global bucket below its reserved
+fraction, which only cheap runs (at most SIMULATION_CHEAP_COST_MS) can
+spend, so a stream of large runs cannot starve small ones.
+
+State is kept in-process, like the pool it protects; with several app
+processes each one budgets its own pool.
+'''
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.services.sim_service import datasets
+from app.services.sim_service.registry import resolve_sim_type, supports_sharding
+
+
+# Fixed CPU-ms per run: pool hand-off, validation and result building
+BASE_COST_MS = 1.0
+
+# Users tracked at once; the least recently seen bucket is dropped first
+MAX_TRACKED_USERS = 10000
+
+
+def _number(params: Dict[str, Any], name: str, default: float) -> float:
+    '''Numeric parameter for estimates; malformed values count as 0 (the run rejects them).'''
+    try:
+        value = float(params.get(name, default))
+    except (TypeError, ValueError):
+        return 0.0
+    return value if math.isfinite(value) and value > 0 else 0.0
+
+
+def _rows(params: Dict[str, Any]) -> float:
+    '''Rows of a batch request: the longest list parameter (scalars broadcast).'''
+    return float(max([len(value) for value in params.values() if isinstance(value, list)], default=1))
+
+
+def _grid_points(params: Dict[str, Any], name: str) -> float:
+    '''Points of a power_planner grid axis (a list or a {min, max, points} range).'''
+    spec = params.get(name)
+    if isinstance(spec, list):
+        return float(len(spec))
+    if isinstance(spec, dict):
+        return _number(spec, 'points', 100)
+    return 100.0
+
+
+def _dataset_values(params: Dict[str, Any]) -> float:
+    '''Values resampled per resample, read from the dataset manifests.'''
+    total = 0.0
+    columns = [(params.get('dataset_id'), params.get('column'))]
+    if params.get('method') == 'permutation':
+        columns.append((params.get('dataset_id_b', params.get('dataset_id')), params.get('column_b')))
+    for dataset_id, column in columns:
+        try:
+            total += datasets.column_summary(dataset_id, column)['count']
+        except ValueError:
+            # Unknown datasets are reported by the run itself
+            pass
+    return total
+
+
+# Simulation type -> (work units of a run, CPU nanoseconds per unit).
+# Rates were measured on single-core runs of a few million units.
+COST_MODELS: Dict[str, Tuple[Callable[[Dict[str, Any]], float], float]] = {
+    'coin_flipper': (lambda p: _number(p, 'trials', 200), 30),
+    'pi_darts': (lambda p: _number(p, 'trials', 10000), 10),
+    'clt': (lambda p: _number(p, 'num_samples', 1000) * _number(p, 'sample_size', 30), 10),
+    'bag_draw': (lambda p: _number(p, 'trials', 10000) * _number(p, 'draws', 2), 40),
+    'binomial_bars': (lambda p: _number(p, 'trials', 1000), 100),
+    'arrival_simulator': (lambda p: _number(p, 'windows', 1000) * _number(p, 'lambda', 6), 60),
+    'outcome_tree': (lambda p: _number(p, 'page_size', 100), 100),
+    'contingency_table': (lambda p: _number(p, 'tables', 1000), 850),
+    'distribution_table': (lambda p: _number(p, 'trials', 1000), 25),
+    'resampling': (lambda p: _number(p, 'resamples', 1000) * _dataset_values(p), 20),
+    't_test_one_sample': (lambda p: len(p['data']) if isinstance(p.get('data'), list) else 1, 80),
+    'z_test_prop': (lambda p: 1, 200000),
+    'power_planner': (lambda p: _grid_points(p, 'n_values') * _grid_points(p, 'effect_sizes'), 80),
+}
+
+# Cost models of run_batch(): one unit per test row
+BATCH_COST_MODELS: Dict[str, Tuple[Callable[[Dict[str, Any]], float], float]] = {
+    't_test_one_sample': (_rows, 5000),
+    'z_test_prop': (_rows, 1000),
+}
+
+
+def max_run_cost_ms(sim_type: str, timeout: Optional[float] = None) -> float:
+    '''
+    Most CPU-ms one run can use: its cooperative deadline (default
+    settings.SIMULATION_TIMEOUT_SECONDS) on one worker, or on every
+    worker for sharded simulations.
+    '''
+    workers = max(1, settings.SIMULATION_MAX_WORKERS) if supports_sharding(sim_type) else 1
+    return (timeout or settings.SIMULATION_TIMEOUT_SECONDS) * 1000 * workers
+
+
+def estimate_cost_ms(
+    sim_type: str, params: Dict[str, Any], method: str = 'run', timeout: Optional[float] = None
+) -> float:
+    '''
+    Estimated CPU-milliseconds of a simulation run.
+
+    Args:
+        sim_type: Registry key or content simType alias
+        params: Simulation parameters (defaults are priced like the engine
+            applies them)
+        method: Simulation method to call ('run' or 'run_batch')
+        timeout: Cooperative deadline of the run (default
+            settings.SIMULATION_TIMEOUT_SECONDS)
+
+    Returns:
+        Estimated cost, at most max_run_cost_ms(sim_type, timeout)
+    '''
+    key = resolve_sim_type(sim_type)
+    models = BATCH_COST_MODELS if method == 'run_batch' else COST_MODELS
+    if key not in models:
+        return BASE_COST_MS
+    units, ns_per_unit = models[key]
+    cost = BASE_COST_MS + units(params) * ns_per_unit / 1e6
+    return min(cost, max(BASE_COST_MS, max_run_cost_ms(key, timeout)))
+
+
+class AdmissionError(Exception):
+    '''
+    A run was not admitted.
+
+    Attributes:
+        retry_after: Seconds until the run would fit the budget
+        overloaded: True if the global budget is exhausted (503), False
+            if the user's own budget is (429)
+    '''
+
+    def __init__(self, message: str, retry_after: float, overloaded: bool):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.overloaded = overloaded
+
+
+class TokenBucket:
+    '''Bucket of CPU-ms tokens holding up to `capacity`, refilled at `rate` per second.'''
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, cost: float, floor: float = 0.0) -> float:
+        '''Seconds until `cost` can be taken without dropping below `floor` (0 if now).'''
+        self._refill()
+        return max(0.0, cost + floor - self.tokens) / self.rate
+
+    def take(self, cost: float) -> None:
+        self.tokens -= cost
+
+    def give(self, cost: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class AdmissionController:
+    '''
+    Per-user and global CPU-ms budgets for simulation runs.
+
+    Thread-safe; buckets are created on first use, so budget settings
+    take effect for new users and after restart.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users: 'OrderedDict[Hashable, TokenBucket]' = OrderedDict()
+        self._pool = TokenBucket(
+            settings.SIMULATION_GLOBAL_BUDGET_MS,
+            max(1, settings.SIMULATION_MAX_WORKERS) * 1000.0
+        )
+
+    def _user_bucket(self, user: Hashable) -> TokenBucket:
+        bucket = self._users.get(user)
+        if bucket is None:
+            bucket = TokenBucket(settings.SIMULATION_USER_BUDGET_MS, settings.SIMULATION_USER_REFILL_MS)
+            self._users[user] = bucket
+            if len(self._users) > MAX_TRACKED_USERS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user)
+        return bucket
+
+    def admit(
+        self,
+        user: Hashable,
+        sim_type: str,
+        params: Dict[str, Any],
+        method: str = 'run',
+        timeout: Optional[float] = None,
+        shared_pool: bool = True
+    ) -> float:
+        '''
+        Charge a run's estimated cost to the user's and the global budget.
+
+        Args:
+            user: Key of the requesting user (e.g. user id)
+            sim_type: Registry key or content simType alias
+            params: Simulation parameters
+            method: Simulation method to call ('run' or 'run_batch')
+            timeout: Cooperative deadline of the run (see estimate_cost_ms)
+            shared_pool: False for runs outside the interactive pool (e.g.
+                background jobs), which are charged to the user only
+
+        Returns:
+            Charged cost in CPU-ms (pass to refund() if the run never ran)
+
+        Raises:
+            AdmissionError: If either budget cannot cover the run
+        '''
+        cost = estimate_cost_ms(sim_type, params, method, timeout)
+        if not settings.RATE_LIMIT_ENABLED:
+            return 0.0
+
+        # Only cheap runs may dip into the reserved part of the pool budget
+        floor = 0.0 if cost <= settings.SIMULATION_CHEAP_COST_MS else (
+            settings.SIMULATION_RESERVED_BUDGET_FRACTION * self._pool.capacity
+        )
+        with self._lock:
+            bucket = self._user_bucket(user)
+            user_wait = bucket.wait(min(cost, bucket.capacity))
+            if user_wait > 0:
+                raise AdmissionError(
+                    f"Simulation budget exceeded (run costs ~{cost:.0f} CPU-ms)",
+                    user_wait, overloaded=False
+                )
+            if shared_pool:
+                pool_wait = self._pool.wait(min(cost, self._pool.capacity - floor), floor)
+                if pool_wait > 0:
+                    raise AdmissionError("Simulation workers are busy", pool_wait, overloaded=True)
+                self._pool.take(cost)
+            bucket.take(cost)
+        return cost
+
+    def refund(self, user: Hashable, cost: float, shared_pool: bool = True) -> None:
+        '''Return the cost of an admitted run that did no work (e.g. invalid parameters).'''
+        with self._lock:
+            self._user_bucket(user).give(cost)
+            if shared_pool:
+                self._pool.give(cost)
+
+    def info(self) -> Dict[str, Any]:
+        '''Current global budget and the number of tracked users.'''
+        with self._lock:
+            self._pool.wait(0)
+            return {
+                'global_tokens_ms': round(self._pool.tokens, 1),
+                'global_capacity_ms': self._pool.capacity,
+                'global_refill_ms_per_second': self._pool.rate,
+                'tracked_users': len(self._users)
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,300 @@
+'''
+Poisson Arrival Simulation
+
+Simulates a Poisson arrival process over many consecutive time windows
+and compares per-window counts and inter-arrival gaps with theory.
+'''
+
+import math
+import re
+import numpy as np
+from typing import Dict, Any, Iterator, Tuple
+
+from app.services.sim_service import tables
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, rehistogram
+from app.core.config import settings
+
+
+# Largest mean number of arrivals per window
+MAX_ARRIVAL_RATE = 1000
+
+# Work-buffer bytes per arrival: float64 time, float64 gap, int64 window
+# index, plus slack for the chunk's temporaries
+BYTES_PER_ARRIVAL = 32
+
+# Windows per partial result in streaming mode
+STREAM_WINDOWS = 1000
+
+# Inter-arrival histogram: equal bins over [0, GAP_HISTOGRAM_MEANS mean gaps)
+GAP_HISTOGRAM_BINS = 50
+GAP_HISTOGRAM_MEANS = 5
+
+# Window length units, in minutes
+WINDOW_UNITS = {'s': 1 / 60, 'm': 1, 'h': 60, 'd': 1440}
+
+
+class PoissonArrivalSimulation(BaseSimulation):
+    '''
+    Poisson process arrivals, counted per time window.
+
+    Arrival times are cumulative sums of exponential gaps, so one set
+    of draws gives both the per-window counts and the inter-arrival
+    times. Windows are generated in chunks whose size is bounded by
+    settings.SIMULATION_MEMORY_BUDGET_BYTES, and only running tallies
+    are kept between chunks.
+
+    Math:
+        - Gaps ~ Exponential(mean = window / λ)
+        - Arrivals per window ~ Poisson(λ): mean = variance = λ
+        - P(no arrivals in a window) = e^(-λ)
+    '''
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run Poisson arrival simulation.
+
+        Args:
+            params:
+                - lambda: Mean arrivals per window (default 6)
+                - window: Window length in minutes, or a string such as
+                  '30m', '45s', '2h' (default '30m')
+                - windows: Number of consecutive windows (default 1000)
+                - max_points / max_bytes: Series budget (see downsample.py)
+
+        Returns:
+            SimulationResult with count and inter-arrival distributions
+        '''
+        rate, window, windows = self._setup(params)
+        tally = self._new_tally()
+        timeline = budget_points(params, 100, num_series=4)
+
+        for start, counts, gaps, times in self._arrivals(rate, window, windows, self._chunk_windows(rate)):
+            self._accumulate(tally, counts, gaps, rate, window)
+            if start == 0:
+                # Keep the start of the run for the timeline views
+                tally['first_counts'] = counts[:timeline]
+                tally['first_arrivals'] = times[times < window][:timeline]
+
+        return self._result(params, rate, window, windows, tally)
+
+    def iter_run(self, params: Dict[str, Any]) -> Iterator[SimulationResult]:
+        '''
+        Run Poisson arrivals, yielding a partial result per block of windows.
+
+        Args:
+            params: Same as run(), plus stream_windows (windows per
+                partial result, default STREAM_WINDOWS)
+
+        Yields:
+            SimulationResult with the running distributions and, in
+            series.window_counts, the counts of the windows just simulated
+        '''
+        rate, window, windows = self._setup(params)
+        stream_windows = params.get('stream_windows', STREAM_WINDOWS)
+        self.validate_params({'stream_windows': stream_windows}, {'stream_windows': (1, windows)})
+
+        tally = self._new_tally()
+        chunk_windows = min(stream_windows, self._chunk_windows(rate))
+        for start, counts, gaps, _ in self._arrivals(rate, window, windows, chunk_windows):
+            self._accumulate(tally, counts, gaps, rate, window)
+            result = self._result(params, rate, window, windows, tally)
+            result.meta['done'] = start + len(counts) == windows
+            result.series['window_counts'] = {'start': start, 'counts': counts}
+            yield result
+
+    def _setup(self, params: Dict[str, Any]) -> Tuple[float, float, int]:
+        '''
+        Extract and validate parameters.
+
+        Returns:
+            (mean arrivals per window, window length in minutes, windows)
+        '''
+        rate = params.get('lambda', 6)
+        window = self._parse_window(params.get('window', '30m'))
+        windows = params.get('windows', 1000)
+
+        self.validate_params(
+            {'lambda': rate, 'windows': windows},
+            {'lambda': (1e-6, MAX_ARRIVAL_RATE),
+             'windows': (1, settings.MAX_SIMULATION_TRIALS)}
+        )
+        if rate * windows > settings.MAX_SIMULATION_TRIALS:
+            raise ValueError(
+                f"Expected arrivals (lambda x windows) must be at most "
+                f"{settings.MAX_SIMULATION_TRIALS}, got {rate * windows:g}"
+            )
+
+        return float(rate), window, int(windows)
+
+    def _parse_window(self, window: Any) -> float:
+        '''Window length in minutes from a number of minutes or e.g. '30m'.'''
+        if isinstance(window, (int, float)) and not isinstance(window, bool):
+            length = float(window)
+        else:
+            match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd])\s*', str(window))
+            if match is None:
+                raise ValueError("Window must be minutes or a length like '30m', '45s', '2h', '1d'")
+            length = float(match.group(1)) * WINDOW_UNITS[match.group(2)]
+        if length <= 0:
+            raise ValueError("Window must be longer than zero")
+        return length
+
+    def _chunk_windows(self, rate: float) -> int:
+        '''Windows per chunk that fit the memory budget.'''
+        return max(1, int(settings.SIMULATION_MEMORY_BUDGET_BYTES // (BYTES_PER_ARRIVAL * max(rate, 1))))
+
+    def _arrivals(
+        self, rate: float, window: float, windows: int, chunk_windows: int
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+        '''
+        Generate the arrival process chunk by chunk.
+
+        Gaps are drawn in blocks sized from the expected arrivals left in
+        the chunk (plus a few standard deviations), cumulatively summed
+        into arrival times, and binned into windows with np.bincount.
+        Arrivals past the end of the chunk carry over to the next one.
+        Stops early (after at least one chunk) once the run deadline has
+        passed.
+
+        Yields:
+            (first window index, arrivals per window in the chunk,
+             inter-arrival gaps, arrival times) for each chunk
+        '''
+        mean_gap = window / rate
+        pending = np.empty(0)  # Arrival times drawn past the previous chunk
+        last_arrival = 0.0
+
+        for start in range(0, windows, chunk_windows):
+            self.report_progress(start, windows)
+            if start > 0 and self.expired():
+                return
+            end = min(start + chunk_windows, windows)
+            end_time = end * window
+
+            blocks = [pending]
+            clock = pending[-1] if len(pending) else last_arrival
+            while clock < end_time:
+                expected = (end_time - clock) / mean_gap
+                size = int(expected + 4 * math.sqrt(expected)) + 16
+                block = clock + np.cumsum(self.rng.exponential(mean_gap, size=size))
+                blocks.append(block)
+                clock = block[-1]
+            times = np.concatenate(blocks)
+
+            split = np.searchsorted(times, end_time)
+            times, pending = times[:split], times[split:]
+
+            # The gap before the chunk's first arrival starts at the previous arrival
+            gaps = np.diff(times, prepend=last_arrival)
+            if len(times):
+                last_arrival = times[-1]
+
+            window_index = np.minimum((times // window).astype(np.int64), end - 1) - start
+            counts = np.bincount(window_index, minlength=end - start)
+            yield start, counts, gaps, times
+
+    def _new_tally(self) -> Dict[str, Any]:
+        '''Running totals kept between chunks.'''
+        return {
+            'windows': 0,
+            'arrivals': 0,
+            'sum_sq': 0,
+            'count_hist': np.zeros(1, dtype=np.int64),
+            'gap_hist': np.zeros(GAP_HISTOGRAM_BINS, dtype=np.int64),
+            'gap_sum': 0.0,
+            'first_counts': np.empty(0, dtype=np.int64),
+            'first_arrivals': np.empty(0)
+        }
+
+    def _accumulate(
+        self, tally: Dict[str, Any], counts: np.ndarray, gaps: np.ndarray, rate: float, window: float
+    ) -> None:
+        '''Fold one chunk into the running tallies.'''
+        tally['windows'] += len(counts)
+        tally['arrivals'] += int(counts.sum())
+        tally['sum_sq'] += int(counts @ counts)
+
+        chunk_hist = np.bincount(counts)
+        if len(chunk_hist) > len(tally['count_hist']):
+            tally['count_hist'] = np.pad(tally['count_hist'], (0, len(chunk_hist) - len(tally['count_hist'])))
+        tally['count_hist'][:len(chunk_hist)] += chunk_hist
+
+        # Fixed-width gap bins; gaps past the last edge are only counted in gap_sum
+        bin_width = GAP_HISTOGRAM_MEANS * window / rate / GAP_HISTOGRAM_BINS
+        gap_bins = (gaps // bin_width).astype(np.int64)
+        tally['gap_hist'] += np.bincount(
+            gap_bins[gap_bins < GAP_HISTOGRAM_BINS], minlength=GAP_HISTOGRAM_BINS
+        )
+        tally['gap_sum'] += float(gaps.sum())
+
+    def _result(
+        self, params: Dict[str, Any], rate: float, window: float, windows: int, tally: Dict[str, Any]
+    ) -> SimulationResult:
+        '''Build distributions and metrics from the running tallies.'''
+        completed = tally['windows']
+        arrivals = tally['arrivals']
+        mean_count = arrivals / completed
+        var_count = tally['sum_sq'] / completed - mean_count ** 2
+
+        # Counts per window vs the Poisson pmf, from the smallest observed count
+        count_hist = tally['count_hist']
+        pmf = tables.poisson_pmf(rate, len(count_hist) - 1)
+        lowest = int(np.flatnonzero(count_hist)[0])
+        edges = np.arange(lowest, len(count_hist) + 1)
+        max_bars = budget_points(params, len(edges) - 1, num_series=4, values_per_point=3)
+        empirical, edges = rehistogram(count_hist[lowest:] / completed, edges, max_bars)
+        theoretical, _ = rehistogram(pmf[lowest:], np.arange(lowest, len(count_hist) + 1), max_bars)
+
+        # Inter-arrival gaps vs the exponential bin probabilities
+        mean_gap = window / rate
+        gap_edges = np.linspace(0, GAP_HISTOGRAM_MEANS * mean_gap, GAP_HISTOGRAM_BINS + 1)
+        gap_theoretical = np.diff(-np.exp(-gap_edges / mean_gap))
+        gap_empirical = tally['gap_hist'] / max(arrivals, 1)
+        max_bins = budget_points(params, GAP_HISTOGRAM_BINS, num_series=4, values_per_point=3)
+        gap_empirical, merged_edges = rehistogram(gap_empirical, gap_edges, max_bins)
+        gap_theoretical, _ = rehistogram(gap_theoretical, gap_edges, max_bins)
+
+        return SimulationResult(
+            meta={
+                'simulation': 'arrival_simulator',
+                'lambda': rate,
+                'window_minutes': window,
+                'windows': windows,
+                'windows_completed': completed,
+                'partial': completed < windows,
+                'seed': params.get('seed')
+            },
+            series={
+                'count_distribution': {
+                    'k': edges[:-1],  # First count in each bar
+                    'empirical': empirical,
+                    'theoretical': theoretical
+                },
+                'inter_arrival': {
+                    'edges': merged_edges,
+                    'empirical': gap_empirical,
+                    'theoretical': gap_theoretical
+                },
+                'window_counts': {'start': 0, 'counts': tally['first_counts']},
+                'first_window_arrivals': tally['first_arrivals']
+            },
+            metrics={
+                'total_arrivals': arrivals,
+                'mean_per_window': round(mean_count, 6),
+                'variance_per_window': round(var_count, 6),
+                'theoretical_mean': rate,
+                # Variance / mean is 1 for a Poisson process
+                'dispersion_index': round(var_count / mean_count, 6) if mean_count > 0 else None,
+                # Half the L1 distance between empirical and exact pmf over observed counts
+                'total_variation_distance': round(float(np.abs(count_hist / completed - pmf).sum()) / 2, 6),
+                'p_zero_arrivals': {
+                    'empirical': round(int(count_hist[0]) / completed, 6),
+                    'theoretical': round(math.exp(-rate), 6)
+                },
+                'mean_gap_minutes': {
+                    'empirical': round(tally['gap_sum'] / arrivals, 6) if arrivals else None,
+                    'theoretical': round(mean_gap, 6)
+                }
+            }
+        )
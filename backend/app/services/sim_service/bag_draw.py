@@ -5,10 +5,28 @@ Simulates drawing colored items from a bag with/without replacement.
 '''
 
 import numpy as np
-from typing import Dict, Any, List
-from collections import Counter
+from typing import Dict, Any, List, Tuple
 
 from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.core.config import settings
+
+
+# Max elements held in a work buffer per chunk (bag copies without
+# replacement, draw indices with replacement)
+BAG_DRAW_CHUNK_ELEMENTS = 1_000_000
+
+# Max items in the bag (the bag is materialized as one code per item)
+BAG_DRAW_MAX_ITEMS = 100_000
+
+# Max items drawn per trial
+BAG_DRAW_MAX_DRAWS = 100
+
+# Max trials * draws of a run: bounds the (trials, draws) result matrix
+# and the int64 temporaries used to summarize it
+BAG_DRAW_MAX_DRAWN_ITEMS = 10_000_000
+
+# Largest sequence space counted with mixed-radix encoding + bincount
+BAG_DRAW_MAX_ENCODED_SEQUENCES = 1 << 20
 
 
 class BagDrawSimulation(BaseSimulation):
@@ -25,6 +43,9 @@ class BagDrawSimulation(BaseSimulation):
         What's P(drawing 2 red in a row)?
     '''
     
+    # Trial-count parameter split across shards (see parallel.py)
+    SHARD_PARAM = 'trials'
+    
     def run(self, params: Dict[str, Any]) -> SimulationResult:
         '''
         Run bag drawing simulation.
@@ -32,13 +53,65 @@ class BagDrawSimulation(BaseSimulation):
         Args:
             params:
                 - colors: Dict of color -> count (e.g., {'red': 5, 'blue': 3})
-                - draws: Number of items to draw
+                - draws: Number of items to draw (at most BAG_DRAW_MAX_DRAWS)
                 - replacement: Whether to replace after each draw
-                - trials: Number of simulation trials
+                - trials: Number of simulation trials (trials * draws at
+                  most BAG_DRAW_MAX_DRAWN_ITEMS)
                 
         Returns:
             SimulationResult with probabilities and distributions
         '''
+        colors, draws, replacement, trials, color_names, bag = self._setup(params)
+        drawn = self._draw(bag, draws, replacement, trials)
+        tally = self._tally(drawn, len(color_names))
+        return self._summarize(colors, color_names, bag, draws, replacement, tally, trials)
+    
+    def run_shard(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        '''
+        Draw and tally one shard of a sharded run (see parallel.run_sharded).
+        
+        Only the tally (see _tally) leaves the worker, never the draw
+        matrix itself.
+        '''
+        _, draws, replacement, trials, color_names, bag = self._setup(params)
+        return self._tally(self._draw(bag, draws, replacement, trials), len(color_names))
+    
+    def merge_shards(self, params: Dict[str, Any], parts: List[Dict[str, Any]]) -> SimulationResult:
+        '''Add up the tallies of all shards into one result.'''
+        colors, draws, replacement, trials, color_names, bag = self._setup(params)
+        seq_rows, inverse = np.unique(
+            np.concatenate([part['seq_rows'] for part in parts]), axis=0, return_inverse=True
+        )
+        seq_counts = np.bincount(
+            inverse.ravel(), weights=np.concatenate([part['seq_counts'] for part in parts]),
+            minlength=len(seq_rows)
+        ).astype(np.int64)
+        tally = {
+            'trials': sum(part['trials'] for part in parts),
+            'position_counts': np.sum([part['position_counts'] for part in parts], axis=0),
+            'seq_rows': seq_rows,
+            'seq_counts': seq_counts,
+            'all_same': sum(part['all_same'] for part in parts),
+            'all_different': sum(part['all_different'] for part in parts)
+        }
+        return self._summarize(colors, color_names, bag, draws, replacement, tally, trials)
+    
+    def shard_total(self, params: Dict[str, Any]) -> int:
+        '''Validate params and return the trial count to split into shards.'''
+        return self._setup(params)[3]
+    
+    def shard_work(self, params: Dict[str, Any]) -> int:
+        '''Validate params and return the items drawn (trials * draws).'''
+        _, draws, _, trials, _, _ = self._setup(params)
+        return trials * draws
+    
+    def _setup(self, params: Dict[str, Any]) -> Tuple:
+        '''
+        Validate parameters and build the integer-coded bag.
+        
+        Returns:
+            (colors, draws, replacement, trials, color_names, bag)
+        '''
         # Extract parameters
         colors = params.get('colors', {'red': 5, 'blue': 3, 'green': 2})
         draws = params.get('draws', 2)
@@ -46,54 +119,145 @@ class BagDrawSimulation(BaseSimulation):
         trials = params.get('trials', 10000)
         
         # Validate
-        if not colors or sum(colors.values()) == 0:
+        if not isinstance(colors, dict) or any(
+            not isinstance(count, int) or isinstance(count, bool) or count < 0
+            for count in colors.values()
+        ):
+            raise ValueError("colors must map each color to a non-negative item count")
+        total_items = sum(colors.values())
+        if total_items == 0:
             raise ValueError("Bag must contain at least one item")
-        if draws <= 0:
-            raise ValueError("Must draw at least one item")
-        if not replacement and draws > sum(colors.values()):
+        if total_items > BAG_DRAW_MAX_ITEMS:
+            raise ValueError(f"Bag can hold at most {BAG_DRAW_MAX_ITEMS} items, got {total_items}")
+        
+        # Validate draws and trials, and the size of the result matrix
+        self.validate_params(
+            {'draws': draws, 'trials': trials},
+            {'draws': (1, BAG_DRAW_MAX_DRAWS),
+             'trials': (1, settings.MAX_SIMULATION_TRIALS)}
+        )
+        if not replacement and draws > total_items:
             raise ValueError("Cannot draw more items than in bag without replacement")
+        if trials * draws > BAG_DRAW_MAX_DRAWN_ITEMS:
+            raise ValueError(
+                f"trials * draws must be at most {BAG_DRAW_MAX_DRAWN_ITEMS}, got {trials * draws}"
+            )
         
-        # Create bag array
-        bag = []
-        for color, count in colors.items():
-            bag.extend([color] * count)
-        bag = np.array(bag)
-        total_items = len(bag)
+        # Integer-coded bag: color i is stored as code i
+        color_names = list(colors.keys())
+        color_counts = np.array([colors[c] for c in color_names], dtype=np.int64)
+        code_dtype = np.min_scalar_type(max(len(color_names) - 1, 0))
+        bag = np.repeat(np.arange(len(color_names), dtype=code_dtype), color_counts)
         
-        # Run simulation trials
-        outcomes = []
-        sequence_counts = Counter()
+        return colors, draws, replacement, trials, color_names, bag
+    
+    def _draw(self, bag: np.ndarray, draws: int, replacement: bool, trials: int) -> np.ndarray:
+        '''
+        Draw all trials as a (trials, draws) matrix of color codes.
         
-        for _ in range(trials):
+        Trials are drawn in chunks that bound the work buffers, stopping
+        early (keeping the rows drawn so far) once the run deadline has
+        passed.
+        '''
+        total_items = len(bag)
+        drawn = np.empty((trials, draws), dtype=bag.dtype)
+        rows_per_chunk = max(1, BAG_DRAW_CHUNK_ELEMENTS // (draws if replacement else total_items))
+        completed = 0
+        for chunk_start in range(0, trials, rows_per_chunk):
+            self.report_progress(chunk_start, trials)
+            # Stop at the deadline, keeping the trials drawn so far
+            if chunk_start > 0 and self.expired():
+                break
+            chunk_end = min(chunk_start + rows_per_chunk, trials)
             if replacement:
-                # Draw with replacement
-                drawn = self.rng.choice(bag, size=draws, replace=True)
+                # Draw with replacement: an index matrix into the bag
+                indices = self.rng.integers(0, total_items, size=(chunk_end - chunk_start, draws))
+                drawn[chunk_start:chunk_end] = bag[indices]
             else:
-                # Draw without replacement
-                drawn = self.rng.choice(bag, size=draws, replace=False)
-            
-            # Record outcome
-            outcome_tuple = tuple(drawn)
-            outcomes.append(outcome_tuple)
-            sequence_counts[outcome_tuple] += 1
-        
-        # Calculate empirical probabilities
-        # Count first draw colors
-        first_draw_counts = Counter(outcome[0] for outcome in outcomes)
-        first_draw_probs = {
-            color: count / trials 
-            for color, count in first_draw_counts.items()
+                # Draw without replacement: partial Fisher-Yates over a
+                # 2D array of bag copies
+                rows = np.arange(chunk_end - chunk_start)
+                bags = np.tile(bag, (len(rows), 1))
+                for j in range(draws):
+                    swap = self.rng.integers(j, total_items, size=len(rows))
+                    picked = bags[rows, swap]
+                    bags[rows, swap] = bags[rows, j]
+                    bags[rows, j] = picked
+                drawn[chunk_start:chunk_end] = bags[:, :draws]
+            completed = chunk_end
+        
+        return drawn[:completed]
+    
+    def _tally(self, drawn: np.ndarray, num_colors: int) -> Dict[str, Any]:
+        '''
+        Reduce a (trials, draws) matrix of color codes to mergeable counts.
+        
+        Returns:
+            Dict with the trial count, (draws, colors) position counts,
+            the distinct sequences (lexicographically sorted rows) with
+            their counts, and the all-same / all-different trial counts
+        '''
+        trials, draws = drawn.shape
+        
+        # Count color frequencies at each position in a single bincount
+        offsets = np.arange(draws, dtype=np.int64) * num_colors
+        position_counts = np.bincount(
+            (drawn + offsets).ravel(), minlength=draws * num_colors
+        ).reshape(draws, num_colors)
+        
+        # Count distinct sequences: mixed-radix encode each row and
+        # bincount when the code space is small, otherwise unique rows
+        if num_colors ** draws <= BAG_DRAW_MAX_ENCODED_SEQUENCES:
+            radix = num_colors ** np.arange(draws - 1, -1, -1, dtype=np.int64)
+            seq_codes = drawn.astype(np.int64) @ radix
+            code_counts = np.bincount(seq_codes, minlength=num_colors ** draws)
+            seen = np.flatnonzero(code_counts)
+            seq_counts = code_counts[seen]
+            seq_rows = ((seen[:, None] // radix) % num_colors).astype(drawn.dtype)
+        else:
+            seq_rows, seq_counts = np.unique(drawn, axis=0, return_counts=True)
+        
+        # All different is only possible if draws <= number of colors
+        if draws <= num_colors:
+            sorted_draws = np.sort(drawn, axis=1)
+            all_different = int(np.count_nonzero((np.diff(sorted_draws, axis=1) != 0).all(axis=1)))
+        else:
+            all_different = 0
+        
+        return {
+            'trials': trials,
+            'position_counts': position_counts,
+            'seq_rows': seq_rows,
+            'seq_counts': seq_counts,
+            'all_same': int(np.count_nonzero((drawn == drawn[:, :1]).all(axis=1))),
+            'all_different': all_different
         }
+    
+    def _summarize(
+        self,
+        colors: Dict[str, int],
+        color_names: List[str],
+        bag: np.ndarray,
+        draws: int,
+        replacement: bool,
+        tally: Dict[str, Any],
+        requested_trials: int
+    ) -> SimulationResult:
+        '''Compute probabilities and top sequences from a draw tally (see _tally).'''
+        total_items = len(bag)
         
-        # Count color frequencies at each position
-        position_probs = []
-        for pos in range(draws):
-            pos_counts = Counter(outcome[pos] for outcome in outcomes if len(outcome) > pos)
-            pos_probs = {
-                color: count / trials 
-                for color, count in pos_counts.items()
-            }
-            position_probs.append(pos_probs)
+        # Probabilities below are over the trials actually completed
+        trials = tally['trials']
+        position_counts = tally['position_counts']
+        seq_rows, seq_counts = tally['seq_rows'], tally['seq_counts']
+        position_probs = [
+            {color: int(position_counts[pos, i]) / trials
+             for i, color in enumerate(color_names)}
+            for pos in range(draws)
+        ]
+        
+        # Empirical probabilities for the first draw
+        first_draw_probs = position_probs[0]
         
         # Calculate theoretical probabilities (for first draw)
         theoretical_first = {
@@ -102,7 +266,11 @@ class BagDrawSimulation(BaseSimulation):
         }
         
         # Find most common sequences
-        top_sequences = sequence_counts.most_common(10)
+        order = np.argsort(-seq_counts, kind='stable')[:10]
+        top_sequences = [
+            (tuple(color_names[c] for c in seq_rows[i]), int(seq_counts[i]))
+            for i in order
+        ]
         top_sequences_formatted = [
             {
                 'sequence': ' → '.join(seq),
@@ -114,22 +282,10 @@ class BagDrawSimulation(BaseSimulation):
         
         # Calculate specific event probabilities
         # Example: P(all same color)
-        all_same_count = sum(
-            count for seq, count in sequence_counts.items() 
-            if len(set(seq)) == 1
-        )
-        p_all_same = all_same_count / trials
+        p_all_same = tally['all_same'] / trials
         
         # Example: P(all different colors) - only if draws <= unique colors
-        unique_colors = len(colors)
-        if draws <= unique_colors:
-            all_different_count = sum(
-                count for seq, count in sequence_counts.items() 
-                if len(set(seq)) == draws
-            )
-            p_all_different = all_different_count / trials
-        else:
-            p_all_different = 0
+        p_all_different = tally['all_different'] / trials if draws <= len(colors) else 0
         
         # Calculate exact probabilities for without replacement
         if not replacement and draws == 2:
@@ -158,7 +314,9 @@ class BagDrawSimulation(BaseSimulation):
                 'total_items': total_items,
                 'draws': draws,
                 'replacement': replacement,
-                'trials': trials
+                'trials': requested_trials,
+                'trials_completed': trials,
+                'partial': trials < requested_trials
             },
             series={
                 'position_probabilities': position_probs,
@@ -174,7 +332,7 @@ class BagDrawSimulation(BaseSimulation):
                     'all_different_colors': round(p_all_different, 4)
                 },
                 'exact_probabilities': exact_probs,
-                'unique_sequences_found': len(sequence_counts),
+                'unique_sequences_found': len(seq_counts),
                 'most_likely_sequence': {
                     'sequence': ' → '.join(top_sequences[0][0]) if top_sequences else None,
                     'probability': round(top_sequences[0][1] / trials, 4) if top_sequences else None
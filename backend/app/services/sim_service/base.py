@@ -4,8 +4,10 @@ Base Simulation Service
 Common functionality for all simulations.
 '''
 
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple, Union
 from abc import ABC, abstractmethod
+import numbers
+import time
 import numpy as np
 from pydantic import BaseModel
 
@@ -28,16 +30,47 @@ class BaseSimulation(ABC):
     
     All simulations should inherit from this class and implement
     the run method.
+    
+    Batched simulations should check expired() between batches and,
+    once the deadline has passed, stop early and return a valid result
+    over the trials completed so far, marked with meta['partial'] = True.
+    They also call report_progress() between batches, so background jobs
+    can show how far a run has got.
+    
+    Simulations that can split their trials across workers also define
+    SHARD_PARAM (the trial-count parameter), shard_total(params),
+    run_shard(params) and merge_shards(params, parts); see parallel.py.
+    Those whose trials are not unit-sized override shard_work(params).
     '''
     
-    def __init__(self, seed: Optional[int] = None):
+    def __init__(
+        self,
+        seed: Union[int, np.random.SeedSequence, None] = None,
+        timeout: Optional[float] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ):
         '''
-        Initialize simulation with optional seed.
+        Initialize simulation with optional seed and time budget.
         
         Args:
-            seed: Random seed for reproducibility
+            seed: Random seed (or SeedSequence, for shards) for reproducibility
+            timeout: Seconds the run may take before it should stop early
+                (None for no deadline)
+            progress: Callback receiving (completed, total) units of work
+                between batches (None to skip progress reporting)
         '''
         self.rng = np.random.default_rng(seed)
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.progress = progress
+    
+    def expired(self) -> bool:
+        '''Check whether the run deadline has passed.'''
+        return self.deadline is not None and time.monotonic() >= self.deadline
+    
+    def report_progress(self, completed: int, total: int) -> None:
+        '''Pass the work done so far to the progress callback, if any.'''
+        if self.progress is not None:
+            self.progress(completed, total)
     
     @abstractmethod
     def run(self, params: Dict[str, Any]) -> SimulationResult:
@@ -52,6 +85,31 @@ class BaseSimulation(ABC):
         '''
         pass
     
+    def iter_run(self, params: Dict[str, Any]) -> Iterator[SimulationResult]:
+        '''
+        Run the simulation, yielding progressively refined results.
+        
+        Simulations that work in batches override this to yield a
+        partial result after each batch. The default yields the single
+        result of run().
+        
+        Args:
+            params: Simulation-specific parameters
+            
+        Yields:
+            SimulationResult snapshots, the last one being final
+        '''
+        yield self.run(params)
+    
+    def shard_work(self, params: Dict[str, Any]) -> int:
+        '''
+        Validate params and return the work units of a shardable run.
+        
+        Decides whether the run is sharded (see parallel.should_shard);
+        the default counts one unit per trial of shard_total().
+        '''
+        return self.shard_total(params)
+    
     def validate_params(self, params: Dict[str, Any], constraints: Dict[str, Tuple]) -> None:
         '''
         Validate parameters against constraints.
@@ -61,12 +119,53 @@ class BaseSimulation(ABC):
             constraints: Dict of parameter_name -> (min, max) tuples
             
         Raises:
-            ValueError: If parameters are invalid
+            ValueError: If parameters are invalid (including non-numeric)
         '''
         for param_name, (min_val, max_val) in constraints.items():
             if param_name in params:
                 value = params[param_name]
+                if isinstance(value, bool) or not isinstance(value, numbers.Real):
+                    raise ValueError(f"{param_name} must be a number, got {value!r}")
                 if value < min_val or value > max_val:
                     raise ValueError(
                         f"{param_name} must be between {min_val} and {max_val}, got {value}"
                     )
+    
+    def broadcast_params(
+        self, params: Dict[str, Any], defaults: Dict[str, Any], max_size: int
+    ) -> Dict[str, np.ndarray]:
+        '''
+        Broadcast scalar-or-array parameters to equal-length float arrays.
+        
+        Used by batch modes, where each parameter may be given once for
+        all rows or as one value per row.
+        
+        Args:
+            params: Parameters to broadcast
+            defaults: Dict of parameter_name -> default (None if required)
+            max_size: Maximum number of rows
+            
+        Returns:
+            Dict of parameter_name -> 1-D float array
+            
+        Raises:
+            ValueError: If a parameter is missing, the shapes do not
+                broadcast, or there are too many rows
+        '''
+        values = {}
+        for name, default in defaults.items():
+            value = params.get(name, default)
+            if value is None:
+                raise ValueError(f"Missing required parameter: {name}")
+            values[name] = np.atleast_1d(np.asarray(value, dtype=float))
+            if values[name].ndim != 1:
+                raise ValueError(f"{name} must be a number or a list of numbers")
+        
+        try:
+            arrays = np.broadcast_arrays(*values.values())
+        except ValueError:
+            raise ValueError("Batch parameters must all have the same length")
+        if arrays[0].size > max_size:
+            raise ValueError(f"Batch size must be at most {max_size}, got {arrays[0].size}")
+        
+        return dict(zip(values, arrays))
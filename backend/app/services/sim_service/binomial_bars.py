@@ -0,0 +1,170 @@
+'''
+Binomial Bars Simulation
+
+Repeats a Binomial(n, p) experiment many times and compares the
+empirical distribution of successes with the exact pmf.
+'''
+
+import numpy as np
+from typing import Dict, Any, List, Tuple
+
+from app.services.sim_service import tables
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, rehistogram
+from app.core.config import settings
+
+
+# Largest number of Bernoulli trials per experiment (output is O(n))
+MAX_BINOMIAL_N = 10000
+
+# Work-buffer bytes per experiment: one int64 success count
+BYTES_PER_EXPERIMENT = 8
+
+
+class BinomialBarsSimulation(BaseSimulation):
+    '''
+    Binomial distribution bar chart.
+
+    Each experiment counts the successes in n independent trials with
+    success probability p; the bars are the empirical frequencies of
+    k = 0..n successes over all experiments.
+
+    Math:
+        - X ~ Binomial(n, p),  P(X = k) = C(n, k) pᵏ (1-p)ⁿ⁻ᵏ
+        - E[X] = np,  Var(X) = np(1-p)
+    '''
+
+    # Trial-count parameter split across shards (see parallel.py)
+    SHARD_PARAM = 'trials'
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run binomial bars simulation.
+
+        Args:
+            params:
+                - n: Bernoulli trials per experiment (default 10)
+                - p: Success probability (default 0.5)
+                - trials: Number of experiments (default 1000)
+                - overlays: {'mean': bool, 'stdBands': bool} lines to add
+                  (both default True)
+                - max_points / max_bytes: Series budget (see downsample.py);
+                  adjacent bars are merged when n + 1 exceeds it
+
+        Returns:
+            SimulationResult with empirical and exact bar heights
+        '''
+        n, p, trials = self._setup(params)
+        counts = self._tally(n, p, trials)
+        return self._result(params, n, p, trials, counts)
+
+    def run_shard(self, params: Dict[str, Any]) -> np.ndarray:
+        '''
+        Tally one shard of a sharded run (see parallel.run_sharded).
+
+        Returns:
+            Counts of k = 0..n successes
+        '''
+        n, p, trials = self._setup(params)
+        return self._tally(n, p, trials)
+
+    def merge_shards(self, params: Dict[str, Any], parts: List[np.ndarray]) -> SimulationResult:
+        '''Add up shard tallies into one result.'''
+        n, p, trials = self._setup(params)
+        return self._result(params, n, p, trials, np.sum(parts, axis=0))
+
+    def shard_total(self, params: Dict[str, Any]) -> int:
+        '''Validate params and return the experiment count to split into shards.'''
+        return self._setup(params)[2]
+
+    def _setup(self, params: Dict[str, Any]) -> Tuple[int, float, int]:
+        '''Extract and validate (n, p, trials).'''
+        n = params.get('n', 10)
+        p = params.get('p', 0.5)
+        trials = params.get('trials', 1000)
+
+        self.validate_params(
+            {'n': n, 'p': p, 'trials': trials},
+            {'n': (1, MAX_BINOMIAL_N),
+             'p': (0, 1),
+             'trials': (1, settings.MAX_SIMULATION_TRIALS)}
+        )
+
+        return int(n), float(p), trials
+
+    def _tally(self, n: int, p: float, trials: int) -> np.ndarray:
+        '''
+        Draw experiments and count how many gave each k.
+
+        Each chunk is one rng.binomial call reduced with np.bincount, so
+        memory is bounded by settings.SIMULATION_MEMORY_BUDGET_BYTES
+        regardless of trials. Stops early (after at least one chunk)
+        once the run deadline has passed.
+        '''
+        chunk = max(1, settings.SIMULATION_MEMORY_BUDGET_BYTES // BYTES_PER_EXPERIMENT)
+        counts = np.zeros(n + 1, dtype=np.int64)
+        for chunk_start in range(0, trials, chunk):
+            self.report_progress(chunk_start, trials)
+            if chunk_start > 0 and self.expired():
+                break
+            successes = self.rng.binomial(n, p, size=min(chunk, trials - chunk_start))
+            counts += np.bincount(successes, minlength=n + 1)
+        return counts
+
+    def _result(
+        self, params: Dict[str, Any], n: int, p: float, trials: int, counts: np.ndarray
+    ) -> SimulationResult:
+        '''Build bars, overlays and metrics from the tallies.'''
+        completed = int(counts.sum())
+        k = np.arange(n + 1)
+        pmf = tables.binom_pmf(n, p)
+
+        # Sample moments straight from the tallies
+        sample_mean = float(k @ counts) / completed
+        sample_var = float(((k - sample_mean) ** 2) @ counts) / completed
+        true_mean = n * p
+        true_std = float(np.sqrt(n * p * (1 - p)))
+        empirical = counts / completed
+
+        # Merge adjacent bars down to the series budget
+        edges = np.arange(n + 2)
+        max_bars = budget_points(params, n + 1, values_per_point=4)
+        bar_counts, bar_edges = rehistogram(counts, edges, max_bars)
+        bar_pmf, _ = rehistogram(pmf, edges, max_bars)
+
+        overlays = params.get('overlays', {})
+        series: Dict[str, Any] = {
+            'k': bar_edges[:-1],  # First k in each bar
+            'counts': bar_counts,
+            'empirical': bar_counts / completed,
+            'pmf': bar_pmf
+        }
+        if overlays.get('mean', True):
+            series['mean'] = {'theoretical': true_mean, 'empirical': sample_mean}
+        if overlays.get('stdBands', True):
+            series['std_bands'] = [
+                {'sd': sd, 'lower': true_mean - sd * true_std, 'upper': true_mean + sd * true_std}
+                for sd in (1, 2)
+            ]
+
+        return SimulationResult(
+            meta={
+                'simulation': 'binomial_bars',
+                'n': n,
+                'p': p,
+                'trials': trials,
+                'trials_completed': completed,
+                'partial': completed < trials,
+                'seed': params.get('seed')
+            },
+            series=series,
+            metrics={
+                'theoretical_mean': round(true_mean, 6),
+                'observed_mean': round(sample_mean, 6),
+                'theoretical_std': round(true_std, 6),
+                'observed_std': round(float(np.sqrt(sample_var)), 6),
+                'most_common_k': int(np.argmax(counts)),
+                # Half the L1 distance between empirical and exact pmf
+                'total_variation_distance': round(float(np.abs(empirical - pmf).sum()) / 2, 6)
+            }
+        )
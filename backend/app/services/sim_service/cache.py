@@ -0,0 +1,167 @@
+'''
+Simulation Result Cache
+
+Caches results of deterministic simulation runs (seeded runs and the
+purely analytic tests) so repeated requests with the same parameters
+cost nothing.
+
+Two tiers:
+    - In-process LRU, evicting by total serialized size
+    - Optional Redis tier (settings.SIMULATION_CACHE_REDIS_ENABLED)
+'''
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.services.sim_service import encoding
+from app.services.sim_service.registry import ANALYTIC_SIM_TYPES
+
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(sim_type: str, params: Dict[str, Any]) -> Optional[str]:
+    '''
+    Build a cache key for a simulation run.
+
+    Args:
+        sim_type: Registry key of the simulation
+        params: Simulation parameters
+
+    Returns:
+        Key derived from sim type + canonicalized params (including the
+        seed), or None if the run is not deterministic
+    '''
+    if params.get('seed') is None and sim_type not in ANALYTIC_SIM_TYPES:
+        return None
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return f"sim:{sim_type}:{digest}"
+
+
+class ResultCache:
+    '''
+    Two-tier cache for simulation results.
+
+    Values are stored as serialized JSON bytes (arrays packed losslessly,
+    see encoding.dumps()), which both gives the size used for eviction
+    and keeps cached results immutable.
+    '''
+
+    def __init__(self, max_bytes: int, ttl_seconds: int, redis_url: Optional[str] = None):
+        '''
+        Args:
+            max_bytes: Max total size of the in-process tier
+            ttl_seconds: Time-to-live for entries in both tiers
+            redis_url: Redis connection string, or None to disable the Redis tier
+        '''
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self._redis = None
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'redis_hits': 0, 'evictions': 0}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        '''Look up a result, checking the local tier before Redis.'''
+        data = self._local_get(key)
+        if data is None and self.redis_url:
+            data = await self._redis_get(key)
+            if data is not None:
+                self.stats['redis_hits'] += 1
+                self._local_set(key, data)
+
+        if data is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return encoding.loads(data)
+
+    async def set(self, key: str, result: Dict[str, Any]) -> None:
+        '''Store a result in both tiers.'''
+        data = encoding.dumps(result)
+        self._local_set(key, data)
+        if self.redis_url:
+            await self._redis_set(key, data)
+
+    def clear(self) -> None:
+        '''Drop all entries from the in-process tier.'''
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def info(self) -> Dict[str, Any]:
+        '''Hit/miss counters and current in-process tier usage.'''
+        with self._lock:
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'redis_enabled': bool(self.redis_url)
+            }
+
+    def _local_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def _local_set(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, data)
+            self._size += len(data)
+            # Evict least recently used entries until under budget
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+
+    def _remove(self, key: str) -> None:
+        _, data = self._entries.pop(key)
+        self._size -= len(data)
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    async def _redis_get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self._get_redis().get(key)
+        except Exception as e:
+            logger.warning(f"Simulation cache Redis get failed: {e}")
+            return None
+
+    async def _redis_set(self, key: str, data: bytes) -> None:
+        try:
+            await self._get_redis().set(key, data, ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Simulation cache Redis set failed: {e}")
+
+
+# Shared cache instance
+result_cache = ResultCache(
+    max_bytes=settings.SIMULATION_CACHE_MAX_BYTES,
+    ttl_seconds=settings.SIMULATION_CACHE_TTL,
+    redis_url=settings.REDIS_URL if settings.SIMULATION_CACHE_REDIS_ENABLED else None
+)
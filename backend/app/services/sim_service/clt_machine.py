@@ -5,10 +5,10 @@ Demonstrates how sample means converge to normal distribution.
 '''
 
 import numpy as np
-from typing import Dict, Any, List
-from scipy import stats
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
 from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, lttb, rehistogram, stride_sample
 from app.core.config import settings
 
 
@@ -26,6 +26,9 @@ class CLTSimulation(BaseSimulation):
         - Standard Error: SE = σ / √n
     '''
     
+    # Trial-count parameter split across shards (see parallel.py)
+    SHARD_PARAM = 'num_samples'
+    
     def run(self, params: Dict[str, Any]) -> SimulationResult:
         '''
         Run CLT simulation.
@@ -36,15 +39,64 @@ class CLTSimulation(BaseSimulation):
                 - sample_size: Size of each sample
                 - num_samples: Number of sample means to generate
                 - dist_params: Distribution-specific parameters
+                - exact_sampler: Draw sample means directly from the
+                  closed-form distribution of the sample sum when the
+                  distribution has one (default False)
+                - max_points / max_bytes: Series budget (see downsample.py)
                 
         Returns:
             SimulationResult with sampling distribution of means
         '''
+        distribution, sample_size, num_samples, dist_params, exact_sampler = self._setup(params)
+        true_mean, true_var, draw, draw_means = self._sampler(distribution, dist_params, sample_size)
+        sample_means, sampler = self._sample_means(
+            draw, draw_means, exact_sampler, num_samples, sample_size
+        )
+        return self._result(params, sample_means, sampler, true_mean, true_var)
+    
+    def run_shard(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        '''
+        Compute one shard of a sharded run (see parallel.run_sharded).
+        
+        Returns:
+            Dict with the shard's sample means and the sampler used
+        '''
+        distribution, sample_size, num_samples, dist_params, exact_sampler = self._setup(params)
+        _, _, draw, draw_means = self._sampler(distribution, dist_params, sample_size)
+        sample_means, sampler = self._sample_means(
+            draw, draw_means, exact_sampler, num_samples, sample_size
+        )
+        return {'sample_means': sample_means, 'sampler': sampler}
+    
+    def merge_shards(self, params: Dict[str, Any], parts: List[Dict[str, Any]]) -> SimulationResult:
+        '''Concatenate shard sample means, in shard order, into one result.'''
+        distribution, sample_size, _, dist_params, _ = self._setup(params)
+        true_mean, true_var, _, _ = self._sampler(distribution, dist_params, sample_size)
+        sample_means = np.concatenate([part['sample_means'] for part in parts])
+        return self._result(params, sample_means, parts[0]['sampler'], true_mean, true_var)
+    
+    def shard_total(self, params: Dict[str, Any]) -> int:
+        '''Validate params and return the sample-mean count to split into shards.'''
+        return self._setup(params)[2]
+    
+    def shard_work(self, params: Dict[str, Any]) -> int:
+        '''Validate params and return the values drawn (num_samples * sample_size).'''
+        _, sample_size, num_samples, _, _ = self._setup(params)
+        return num_samples * sample_size
+    
+    def _setup(self, params: Dict[str, Any]) -> Tuple:
+        '''
+        Extract and validate parameters.
+        
+        Returns:
+            (distribution, sample_size, num_samples, dist_params, exact_sampler)
+        '''
         # Extract parameters
         distribution = params.get('distribution', 'uniform')
         sample_size = params.get('sample_size', 30)
         num_samples = params.get('num_samples', 1000)
         dist_params = params.get('dist_params', {})
+        exact_sampler = params.get('exact_sampler', False)
         
         # Validate
         self.validate_params(
@@ -53,7 +105,22 @@ class CLTSimulation(BaseSimulation):
              'num_samples': (1, settings.MAX_SIMULATION_REPLICATES)}
         )
         
-        # Generate samples based on distribution
+        return distribution, sample_size, num_samples, dist_params, exact_sampler
+    
+    def _sampler(
+        self, distribution: str, dist_params: Dict[str, Any], sample_size: int
+    ) -> Tuple[float, float, Callable, Optional[Callable]]:
+        '''
+        Build the samplers for a distribution.
+        
+        Returns:
+            (true mean, true variance, draw(size) block sampler,
+             draw_means(count) exact sampler or None)
+        '''
+        # Generate samples based on distribution. Distributions whose
+        # sample sum has a closed form also define draw_means(), which
+        # samples means in O(num_samples) instead of O(num_samples * sample_size)
+        draw_means = None
         if distribution == 'uniform':
             # Uniform(a, b)
             a = dist_params.get('a', 0)
@@ -61,8 +128,9 @@ class CLTSimulation(BaseSimulation):
             true_mean = (a + b) / 2
             true_var = (b - a) ** 2 / 12
             
-            # Generate all samples at once for efficiency
-            samples = self.rng.uniform(a, b, size=(num_samples, sample_size))
+            # Sampler for one (rows, sample_size) block
+            def draw(size):
+                return self.rng.uniform(a, b, size=size)
             
         elif distribution == 'exponential':
             # Exponential(λ)
@@ -70,7 +138,12 @@ class CLTSimulation(BaseSimulation):
             true_mean = scale
             true_var = scale ** 2
             
-            samples = self.rng.exponential(scale, size=(num_samples, sample_size))
+            def draw(size):
+                return self.rng.exponential(scale, size=size)
+            
+            # Sum of k Exponential(scale) ~ Gamma(k, scale)
+            def draw_means(count):
+                return self.rng.gamma(sample_size, scale, size=count) / sample_size
             
         elif distribution == 'binomial':
             # Binomial(n, p)
@@ -79,13 +152,70 @@ class CLTSimulation(BaseSimulation):
             true_mean = n * p
             true_var = n * p * (1 - p)
             
-            samples = self.rng.binomial(n, p, size=(num_samples, sample_size))
+            def draw(size):
+                return self.rng.binomial(n, p, size=size)
+            
+            # Sum of k Binomial(n, p) ~ Binomial(n * k, p)
+            def draw_means(count):
+                return self.rng.binomial(n * sample_size, p, size=count) / sample_size
             
         else:
             raise ValueError(f"Unknown distribution: {distribution}")
         
-        # Calculate sample means
-        sample_means = np.mean(samples, axis=1)
+        return true_mean, true_var, draw, draw_means
+    
+    def _sample_means(
+        self,
+        draw: Callable,
+        draw_means: Optional[Callable],
+        exact_sampler: bool,
+        num_samples: int,
+        sample_size: int
+    ) -> Tuple[np.ndarray, str]:
+        '''
+        Generate sample means, stopping early at the run deadline.
+        
+        Returns:
+            (sample means, sampler used: 'exact' or 'matrix')
+        '''
+        # Calculate sample means block by block: each (rows, sample_size)
+        # block is reduced to row means and discarded, so peak memory is
+        # bounded by settings.SIMULATION_MEMORY_BUDGET_BYTES
+        if exact_sampler and draw_means is not None:
+            sampler = 'exact'
+            sample_means = draw_means(num_samples)
+        else:
+            sampler = 'matrix'
+            sample_means = np.empty(num_samples)
+            rows_per_block = max(1, settings.SIMULATION_MEMORY_BUDGET_BYTES // (sample_size * 8))
+            completed = 0
+            for block_start in range(0, num_samples, rows_per_block):
+                self.report_progress(block_start, num_samples)
+                # Stop at the deadline, keeping the means computed so far
+                if block_start > 0 and self.expired():
+                    break
+                block_end = min(block_start + rows_per_block, num_samples)
+                block = draw((block_end - block_start, sample_size))
+                np.mean(block, axis=1, out=sample_means[block_start:block_end])
+                del block
+                completed = block_end
+            sample_means = sample_means[:completed]
+        
+        return sample_means, sampler
+    
+    def _result(
+        self,
+        params: Dict[str, Any],
+        sample_means: np.ndarray,
+        sampler: str,
+        true_mean: float,
+        true_var: float
+    ) -> SimulationResult:
+        '''Compute statistics, histogram and normal curve from the sample means.'''
+        # Imported here so planning sharded runs does not load scipy
+        from scipy import stats
+
+        distribution, sample_size, num_samples, dist_params, _ = self._setup(params)
         
         # Theoretical standard error
         theoretical_se = np.sqrt(true_var / sample_size)
@@ -95,7 +225,7 @@ class CLTSimulation(BaseSimulation):
         observed_se = np.std(sample_means, ddof=1)
         
         # Normality test (Shapiro-Wilk)
-        if num_samples <= 5000:  # Shapiro-Wilk has sample size limit
+        if len(sample_means) <= 5000:  # Shapiro-Wilk has sample size limit
             _, p_value = stats.shapiro(sample_means)
         else:
             # Use Kolmogorov-Smirnov test for large samples
@@ -105,12 +235,19 @@ class CLTSimulation(BaseSimulation):
                 args=(true_mean, theoretical_se)
             )
         
-        # Create histogram bins
+        # Create histogram bins, merged down to the series budget
         hist, bin_edges = np.histogram(sample_means, bins=30, density=True)
+        hist, bin_edges = rehistogram(
+            hist, bin_edges, budget_points(params, len(hist), num_series=3, values_per_point=2),
+            density=True
+        )
         
         # Generate normal curve for comparison
         x_range = np.linspace(sample_means.min(), sample_means.max(), 100)
         normal_pdf = stats.norm.pdf(x_range, true_mean, theoretical_se)
+        keep = lttb(x_range, normal_pdf, budget_points(
+            params, len(x_range), num_series=3, values_per_point=2
+        ))
         
         return SimulationResult(
             meta={
@@ -118,17 +255,23 @@ class CLTSimulation(BaseSimulation):
                 'distribution': distribution,
                 'sample_size': sample_size,
                 'num_samples': num_samples,
-                'dist_params': dist_params
+                'num_samples_completed': len(sample_means),
+                'partial': len(sample_means) < num_samples,
+                'dist_params': dist_params,
+                'sampler': sampler
             },
             series={
-                'sample_means': sample_means.tolist()[:1000],  # Limit for transfer
+                # Evenly strided over the whole run, limited for transfer
+                'sample_means': stride_sample(
+                    sample_means, budget_points(params, 1000, num_series=3)
+                ),
                 'histogram': {
-                    'counts': hist.tolist(),
-                    'bins': bin_edges.tolist()
+                    'counts': hist,
+                    'bins': bin_edges
                 },
                 'normal_curve': {
-                    'x': x_range.tolist(),
-                    'y': normal_pdf.tolist()
+                    'x': x_range[keep],
+                    'y': normal_pdf[keep]
                 }
             },
             metrics={
@@ -139,7 +282,7 @@ class CLTSimulation(BaseSimulation):
                 'se_error_pct': round(abs(observed_se - theoretical_se) / theoretical_se * 100, 2),
                 'normality_test': {
                     'p_value': round(p_value, 6),
-                    'is_normal': p_value > 0.05,
+                    'is_normal': bool(p_value > 0.05),
                     'interpretation': "Normally distributed" if p_value > 0.05 else "Not normally distributed"
                 },
                 'percentiles': {
@@ -0,0 +1,100 @@
+'''
+Coin Flipper Simulation
+
+Flips a (possibly biased) coin many times and tracks the running proportion of heads.
+'''
+
+import numpy as np
+from typing import Dict, Any
+
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import DEFAULT_SERIES_POINTS, budget_points, lttb
+from app.core.config import settings
+
+
+class CoinFlipSimulation(BaseSimulation):
+    '''
+    Coin flip simulation for the law of large numbers.
+
+    Flips a coin with P(heads) = p and records the running proportion
+    of heads after every batch of flips.
+
+    Math:
+        - Each flip is Bernoulli(p)
+        - Running proportion p̂ₙ = (heads after n flips) / n
+        - p̂ₙ → p as n → ∞
+    '''
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run coin flip simulation.
+
+        Args:
+            params:
+                - trials: Number of flips (default 200)
+                - p: Probability of heads (default 0.5)
+                - batch: Flips between running-proportion points (default 20)
+                - max_points / max_bytes: Series budget (see downsample.py);
+                  the running proportion has at most DEFAULT_SERIES_POINTS
+                  points otherwise
+
+        Returns:
+            SimulationResult with running proportion and head/tail counts
+        '''
+        # Extract parameters
+        trials = params.get('trials', 200)
+        p = params.get('p', 0.5)
+        batch = params.get('batch', 20)
+
+        # Validate
+        self.validate_params(
+            {'trials': trials, 'p': p, 'batch': batch},
+            {'trials': (1, settings.MAX_SIMULATION_TRIALS),
+             'p': (0, 1),
+             'batch': (1, settings.MAX_SIMULATION_TRIALS)}
+        )
+
+        # Flip all coins at once (True = heads)
+        flips = self.rng.random(trials) < p
+        cumulative_heads = np.cumsum(flips)
+
+        # Running proportion at the end of each batch
+        checkpoints = np.arange(batch, trials + batch, batch)
+        checkpoints[-1] = trials
+        heads_at = cumulative_heads[checkpoints - 1]
+        running = heads_at / checkpoints
+
+        # Downsample long runs, keeping the shape of the whole path
+        keep = lttb(checkpoints, running, budget_points(
+            params, min(len(checkpoints), DEFAULT_SERIES_POINTS), num_series=2, values_per_point=2
+        ))
+        checkpoints, running = checkpoints[keep], running[keep]
+        first_flips = flips[:budget_points(params, 100, num_series=2)]
+
+        heads = int(cumulative_heads[-1])
+        p_hat = heads / trials
+
+        return SimulationResult(
+            meta={
+                'simulation': 'coin_flipper',
+                'trials': trials,
+                'p': p,
+                'batch': batch,
+                'seed': params.get('seed')
+            },
+            series={
+                'running_proportion': [
+                    {'n': int(n), 'proportion': float(r)}
+                    for n, r in zip(checkpoints, running)
+                ],
+                'first_flips': ['H' if f else 'T' for f in first_flips]
+            },
+            metrics={
+                'heads': heads,
+                'tails': trials - heads,
+                'proportion_heads': round(p_hat, 6),
+                'expected_proportion': p,
+                'absolute_error': round(abs(p_hat - p), 6),
+                'standard_error': round(float(np.sqrt(p * (1 - p) / trials)), 6)
+            }
+        )
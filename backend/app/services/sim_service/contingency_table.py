@@ -0,0 +1,197 @@
+'''
+Contingency Table Simulation
+
+Samples many 2x2 tables of events A and B from a population and shows
+the sampling variability of union, conditional and independence
+statistics.
+'''
+
+import numpy as np
+from typing import Dict, Any, Tuple
+
+from app.services.sim_service import tables
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, stride_sample
+from app.core.config import settings
+
+
+# Bins of the probability histograms over [0, 1] without a series budget
+PROBABILITY_BINS = 40
+
+# Bins of the chi-square histogram over [0, CHI2_HISTOGRAM_MAX)
+CHI2_BINS = 40
+CHI2_HISTOGRAM_MAX = 10
+
+# Sampled tables returned as-is for the table view
+SAMPLE_TABLES = 20
+
+
+class ContingencyTableSimulation(BaseSimulation):
+    '''
+    Sampling distribution of 2x2 table statistics.
+
+    The population is described by the counts a = |A|, b = |B|,
+    ab = |A ∩ B| out of total. Every sampled table draws sample_size
+    people, so its cells (A∩B, A∩Bᶜ, Aᶜ∩B, Aᶜ∩Bᶜ) are one multinomial
+    draw; all tables come from a single rng.multinomial call and every
+    statistic is a vectorized reduction over the batch.
+
+    Math:
+        - P(A ∪ B) = P(A) + P(B) - P(A ∩ B)
+        - P(A | B) = P(A ∩ B) / P(B)
+        - Independence: P(A ∩ B) = P(A)·P(B)
+        - Pearson χ² = n(n₁₁n₂₂ - n₁₂n₂₁)² / (row₁·row₂·col₁·col₂),
+          ~ χ²(1) under independence
+    '''
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run contingency table simulation.
+
+        Args:
+            params:
+                - a: People in A (default 40)
+                - b: People in B (default 50)
+                - ab: People in both A and B (default 25)
+                - total: Population size (default 100)
+                - independent: Replace ab with the value making A and B
+                  independent, total·P(A)·P(B) (default False)
+                - sample_size: People per sampled table (default total)
+                - tables: Number of sampled tables (default 1000)
+                - alpha: Significance level of the χ² test (default 0.05)
+                - max_points / max_bytes: Series budget (see downsample.py)
+
+        Returns:
+            SimulationResult with sampling distributions of the statistics
+        '''
+        # Imported here so importing the engine does not load scipy
+        from scipy import stats
+
+        cell_probs, sample_size, num_tables, alpha, independent = self._setup(params)
+
+        # (tables, 4) cells: A∩B, A∩Bᶜ, Aᶜ∩B, Aᶜ∩Bᶜ
+        cells = self.rng.multinomial(sample_size, cell_probs, size=num_tables)
+        n11, n10, n01, n00 = cells.T
+        row_a = n11 + n10
+        col_b = n11 + n01
+
+        p_union = (n11 + n10 + n01) / sample_size
+        p_both = n11 / sample_size
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # nan for tables without any B (or A) to condition on
+            p_a_given_b = n11 / col_b
+            p_b_given_a = n11 / row_a
+            # nan for tables with an empty row or column; float products
+            # because the margin product overflows int64 for large samples
+            margins = row_a * (sample_size - row_a) * col_b.astype(float) * (sample_size - col_b)
+            chi2 = sample_size * (n11 * n00 - n10 * n01).astype(float) ** 2 / margins
+
+        p11, p10, p01, _ = cell_probs
+        population = {
+            'p_a': p11 + p10,
+            'p_b': p11 + p01,
+            'p_both': p11,
+            'p_union': p11 + p10 + p01,
+            'p_a_given_b': p11 / (p11 + p01) if p11 + p01 > 0 else None,
+            'p_b_given_a': p11 / (p11 + p10) if p11 + p10 > 0 else None
+        }
+
+        bins = budget_points(params, PROBABILITY_BINS, num_series=5, values_per_point=2)
+        probability_edges = np.linspace(0, 1, bins + 1)
+        chi2_edges = np.linspace(0, CHI2_HISTOGRAM_MAX, min(bins, CHI2_BINS) + 1)
+        chi2_finite = chi2[np.isfinite(chi2)]
+        chi2_density = np.histogram(chi2_finite, bins=chi2_edges)[0] / max(len(chi2_finite), 1)
+
+        series = {
+            'p_union': self._histogram(p_union, probability_edges),
+            'p_a_given_b': self._histogram(p_a_given_b, probability_edges),
+            'p_b_given_a': self._histogram(p_b_given_a, probability_edges),
+            'chi_square': {
+                'edges': chi2_edges,
+                'empirical': chi2_density,
+                # χ²(1) probability of each bin, the null distribution
+                'theoretical': np.diff(stats.chi2.cdf(chi2_edges, 1))
+            },
+            'sample_tables': stride_sample(cells, budget_points(params, SAMPLE_TABLES, num_series=5))
+        }
+
+        # χ²(1) is the square of a standard normal, so its critical value is z²
+        rejected = chi2_finite > tables.z_critical(alpha) ** 2
+        return SimulationResult(
+            meta={
+                'simulation': 'contingency_table',
+                'sample_size': sample_size,
+                'tables': num_tables,
+                'independent': independent,
+                'alpha': alpha,
+                'seed': params.get('seed')
+            },
+            series=series,
+            metrics={
+                'population': {key: round(value, 6) if value is not None else None
+                               for key, value in population.items()},
+                'p_union': self._summary(p_union),
+                'p_both': self._summary(p_both),
+                'p_a_given_b': self._summary(p_a_given_b),
+                'p_b_given_a': self._summary(p_b_given_a),
+                'chi_square_mean': round(float(chi2_finite.mean()), 6) if len(chi2_finite) else None,
+                # Share of tables where the χ² test rejects independence
+                'rejection_rate': round(float(rejected.mean()), 6) if len(rejected) else None,
+                'undefined_tables': int(num_tables - len(chi2_finite))
+            }
+        )
+
+    def _setup(self, params: Dict[str, Any]) -> Tuple[np.ndarray, int, int, float, bool]:
+        '''
+        Extract and validate parameters.
+
+        Returns:
+            (cell probabilities, sample_size, tables, alpha, independent)
+        '''
+        a = params.get('a', 40)
+        b = params.get('b', 50)
+        ab = params.get('ab', 25)
+        total = params.get('total', 100)
+        independent = bool(params.get('independent', False))
+        sample_size = params.get('sample_size', total)
+        num_tables = params.get('tables', 1000)
+        alpha = params.get('alpha', 0.05)
+
+        self.validate_params(
+            {'total': total, 'a': a, 'b': b, 'sample_size': sample_size,
+             'tables': num_tables, 'alpha': alpha},
+            {'total': (1, settings.MAX_SIMULATION_TRIALS),
+             'a': (0, total),
+             'b': (0, total),
+             'sample_size': (1, settings.MAX_SIMULATION_TRIALS),
+             'tables': (1, settings.MAX_SIMULATION_REPLICATES),
+             'alpha': (0.001, 0.5)}
+        )
+        if independent:
+            ab = a * b / total
+        else:
+            self.validate_params({'ab': ab}, {'ab': (max(0, a + b - total), min(a, b))})
+
+        p11 = ab / total
+        p10 = (a - ab) / total
+        p01 = (b - ab) / total
+        cell_probs = np.array([p11, p10, p01, max(1 - p11 - p10 - p01, 0.0)])
+        return cell_probs, int(sample_size), int(num_tables), float(alpha), independent
+
+    def _histogram(self, values: np.ndarray, edges: np.ndarray) -> Dict[str, Any]:
+        '''Proportion of the defined (non-nan) values in each bin.'''
+        defined = values[~np.isnan(values)]
+        counts = np.histogram(defined, bins=edges)[0]
+        return {'edges': edges, 'proportions': counts / max(len(defined), 1)}
+
+    def _summary(self, values: np.ndarray) -> Dict[str, Any]:
+        '''Mean, spread and middle 95% of the defined values.'''
+        defined = values[~np.isnan(values)]
+        if not len(defined):
+            return {'mean': None, 'std': None, 'interval_95': None}
+        low, high = np.percentile(defined, [2.5, 97.5])
+        return {
+            'mean': round(float(defined.mean()), 6),
+            'std': round(float(defined.std()), 6),
+            'interval_95': [round(float(low), 6), round(float(high), 6)]
+        }
@@ -0,0 +1,408 @@
+'''
+Uploaded Datasets
+
+Stores uploaded data files for the data-driven simulations and serves
+their numeric columns as memory-mapped float64 arrays.
+
+Layout under settings.UPLOAD_DIR:
+    datasets/<dataset_id>/source<ext>        the uploaded file
+    datasets/<dataset_id>/columns/<key>.npy  numeric columns
+    datasets/<dataset_id>/manifest.json      owner, columns and their summaries
+
+Uploads are ingested once, in chunks of INGEST_CHUNK_ROWS rows: every
+column with numeric values is appended to its own .npy file and
+summarized with mergeable summaries (see summaries.py). Runs then map
+the .npy files (the page cache shares one copy between pool workers) or
+read the summaries without touching the data at all.
+
+Datasets belong to the user who uploaded them (see check_access()) and
+are deleted settings.SIMULATION_DATASET_TTL_SECONDS after upload by a
+purge thread (see start_purger()), or on request (see delete_dataset()).
+
+pandas is imported only when a file is ingested, so serving columns and
+summaries (and importing this module) stays cheap.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.sim_service import summaries
+
+try:
+    import openpyxl
+except ImportError:  # optional dependency
+    openpyxl = None
+
+
+logger = logging.getLogger(__name__)
+
+DATASET_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+# Rows parsed per ingestion chunk
+INGEST_CHUNK_ROWS = 100000
+
+MANIFEST = 'manifest.json'
+
+# Simulation parameters that name a dataset
+DATASET_PARAMS = ('dataset_id', 'dataset_id_b')
+
+# Seconds between purges of expired datasets
+PURGE_INTERVAL_SECONDS = 300.0
+
+_purger: Optional[threading.Thread] = None
+_stop_purger = threading.Event()
+
+
+def datasets_dir() -> Path:
+    '''Root directory of stored datasets.'''
+    return Path(settings.UPLOAD_DIR) / 'datasets'
+
+
+def save_upload(filename: str, content: bytes, owner_id: int) -> Dict[str, Any]:
+    '''
+    Store and ingest an uploaded data file under a new dataset id.
+
+    Args:
+        filename: Client file name (only its extension is used)
+        content: File bytes
+        owner_id: Id of the uploading user, the only one allowed to use it
+
+    Returns:
+        Dict with dataset_id, filename, size, rows and the descriptive
+        statistics of each numeric column
+
+    Raises:
+        ValueError: If the file type is not allowed, the file is too large
+            or it cannot be parsed
+    '''
+    extension = Path(filename or '').suffix.lower()
+    if extension not in settings.ALLOWED_EXTENSIONS:
+        raise ValueError(
+            f"File type must be one of {', '.join(settings.ALLOWED_EXTENSIONS)}, got {extension or 'none'}"
+        )
+    if len(content) > settings.MAX_UPLOAD_SIZE:
+        raise ValueError(f"File must be at most {settings.MAX_UPLOAD_SIZE} bytes")
+
+    dataset_id = uuid.uuid4().hex
+    directory = datasets_dir() / dataset_id
+    directory.mkdir(parents=True)
+    try:
+        (directory / f'source{extension}').write_bytes(content)
+        manifest = _ingest(directory, owner_id)
+    except BaseException:
+        # Never leave a half-ingested dataset behind, whatever went wrong
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    return {
+        'dataset_id': dataset_id,
+        'filename': filename,
+        'size': len(content),
+        'rows': manifest['rows'],
+        'columns': {
+            name: summaries.describe(column['summary'])
+            for name, column in manifest['columns'].items()
+        }
+    }
+
+
+def _dataset_dir(dataset_id: str) -> Path:
+    '''Directory of an existing dataset (ids are validated, never joined raw).'''
+    if not isinstance(dataset_id, str) or not DATASET_ID_PATTERN.fullmatch(dataset_id):
+        raise ValueError(f"Invalid dataset_id: {dataset_id!r}")
+    directory = datasets_dir() / dataset_id
+    if not directory.is_dir():
+        raise ValueError(f"Unknown dataset: {dataset_id}")
+    return directory
+
+
+def _source_path(directory: Path) -> Path:
+    for path in directory.glob('source.*'):
+        return path
+    raise ValueError(f"Dataset {directory.name} has no source file")
+
+
+def _header(names: Iterator[Any]) -> List[str]:
+    '''
+    Column names of a header row, with blanks and duplicates renamed as
+    read_csv() does. A renamed duplicate takes the first name.1, name.2,
+    ... that no other column uses, so no two columns share a .npy file.
+    '''
+    header: List[str] = []
+    used = set()
+    for i, name in enumerate(names):
+        base = f'Unnamed: {i}' if name is None else str(name)
+        name, copy = base, 0
+        while name in used:
+            copy += 1
+            name = f'{base}.{copy}'
+        used.add(name)
+        header.append(name)
+    return header
+
+
+def _iter_chunks(source: Path) -> Iterator[Any]:
+    '''
+    Parse the source file as DataFrames of at most INGEST_CHUNK_ROWS rows.
+
+    CSV and XLSX are streamed; JSON has no streaming reader and is parsed
+    whole (it is bounded by settings.MAX_UPLOAD_SIZE).
+
+    Raises:
+        ValueError: If the file cannot be parsed, whatever the reader raised
+    '''
+    import pandas as pd
+
+    if source.suffix == '.xlsx' and openpyxl is None:
+        raise ValueError("Excel uploads need the optional openpyxl package")
+    try:
+        if source.suffix == '.csv':
+            yield from pd.read_csv(source, chunksize=INGEST_CHUNK_ROWS)
+        elif source.suffix == '.json':
+            yield pd.read_json(source)
+        elif source.suffix == '.xlsx':
+            workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = _header(next(rows, ()))
+                chunk = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) == INGEST_CHUNK_ROWS:
+                        yield pd.DataFrame(chunk, columns=header)
+                        chunk = []
+                if chunk:
+                    yield pd.DataFrame(chunk, columns=header)
+            finally:
+                workbook.close()
+        else:
+            raise ValueError("Unsupported file type")
+    except Exception as e:
+        # Readers fail in many ways (TypeError, KeyError, zipfile errors, ...)
+        # on malformed files; all of them are bad uploads
+        raise ValueError(f"Could not parse {source.suffix} file: {e}") from e
+
+
+def _column_key(column: str) -> str:
+    # Column names can be any text, so files are keyed by their hash
+    return hashlib.sha256(column.encode('utf-8')).hexdigest()[:32]
+
+
+def _ingest(directory: Path, owner_id: int) -> Dict[str, Any]:
+    '''
+    Split the source file into per-column .npy files plus summaries.
+
+    Each chunk's numeric values (non-numeric cells count as missing) are
+    appended to a raw float64 file per column and summarized; chunk
+    summaries are merged. At the end the raw files are wrapped into .npy
+    files and the manifest is written, each by write-then-rename so
+    concurrent readers never see a partial file.
+
+    Returns:
+        Manifest dict: {'owner_id', 'created_at', 'rows',
+        'columns': {name: {'file', 'summary', 'missing'}}}
+    '''
+    import pandas as pd
+
+    columns_dir = directory / 'columns'
+    columns_dir.mkdir(exist_ok=True)
+    suffix = f'.{os.getpid()}.tmp'
+
+    raw_files: Dict[str, Any] = {}
+    column_summaries: Dict[str, Dict[str, Any]] = {}
+    missing: Dict[str, int] = {}
+    rows = 0
+    try:
+        for chunk in _iter_chunks(_source_path(directory)):
+            rows += len(chunk)
+            for name in chunk.columns:
+                values = pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=np.float64)
+                values = values[np.isfinite(values)]
+                name = str(name)
+                if name not in raw_files:
+                    raw_files[name] = open(columns_dir / f'{_column_key(name)}.f8{suffix}', 'wb')
+                    column_summaries[name] = summaries.summarize(np.empty(0))
+                    missing[name] = rows - len(chunk)
+                raw_files[name].write(values.tobytes())
+                column_summaries[name] = summaries.merge(column_summaries[name], summaries.summarize(values))
+                missing[name] += len(chunk) - len(values)
+    finally:
+        for f in raw_files.values():
+            f.close()
+
+    manifest: Dict[str, Any] = {
+        'owner_id': owner_id, 'created_at': time.time(), 'rows': rows, 'columns': {}
+    }
+    for name, summary in column_summaries.items():
+        raw = columns_dir / f'{_column_key(name)}.f8{suffix}'
+        if summary['count'] == 0:
+            # Text-only columns are not numeric data
+            raw.unlink()
+            continue
+        path = columns_dir / f'{_column_key(name)}.npy'
+        partial = path.with_suffix(f'.npy{suffix}')
+        with open(partial, 'wb') as out, open(raw, 'rb') as data:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': '<f8', 'fortran_order': False, 'shape': (summary['count'],)}
+            )
+            while block := data.read(1 << 20):
+                out.write(block)
+        os.replace(partial, path)
+        raw.unlink()
+        manifest['columns'][name] = {'file': path.name, 'summary': summary, 'missing': missing[name]}
+
+    partial = directory / f'{MANIFEST}{suffix}'
+    partial.write_text(json.dumps(manifest))
+    os.replace(partial, directory / MANIFEST)
+    return manifest
+
+
+def _manifest(directory: Path) -> Dict[str, Any]:
+    '''
+    Dataset manifest, written by save_upload() once ingestion finished.
+
+    Raises:
+        ValueError: If the dataset has no manifest (it is still being
+            ingested, or its ingestion failed)
+    '''
+    path = directory / MANIFEST
+    if not path.exists():
+        raise ValueError(f"Dataset {directory.name} is not ready")
+    return json.loads(path.read_text())
+
+
+def _column_entry(dataset_id: str, column: str) -> Dict[str, Any]:
+    if not isinstance(column, str) or not column:
+        raise ValueError("column must be a column name")
+    directory = _dataset_dir(dataset_id)
+    entry = _manifest(directory)['columns'].get(column)
+    if entry is None:
+        raise ValueError(f"Column {column!r} not found in dataset or has no numeric values")
+    return {**entry, 'path': directory / 'columns' / entry['file']}
+
+
+def load_column(dataset_id: str, column: str) -> np.ndarray:
+    '''
+    Numeric column of a dataset as a read-only memory-mapped float64 array.
+
+    Args:
+        dataset_id: Id returned by save_upload()
+        column: Column name in the uploaded file
+
+    Raises:
+        ValueError: If the dataset or column does not exist or the column
+            has no numeric values
+    '''
+    return np.load(_column_entry(dataset_id, column)['path'], mmap_mode='r')
+
+
+def column_summary(dataset_id: str, column: str) -> Dict[str, Any]:
+    '''
+    Mergeable summary of a dataset column, computed at ingest time.
+
+    Same arguments and errors as load_column(); see summaries.py for the
+    summary fields.
+    '''
+    return _column_entry(dataset_id, column)['summary']
+
+
+def check_access(params: Dict[str, Any], user_id: int) -> None:
+    '''
+    Check that every dataset named in simulation params belongs to user_id.
+
+    Raises:
+        ValueError: If a dataset does not exist or belongs to another user
+            (reported alike, so ids of other users' datasets are not revealed)
+    '''
+    for name in DATASET_PARAMS:
+        dataset_id = params.get(name)
+        if dataset_id is not None:
+            _owned_dir(dataset_id, user_id)
+
+
+def _owned_dir(dataset_id: str, user_id: int) -> Path:
+    '''Directory of a dataset owned by user_id (see check_access()).'''
+    directory = _dataset_dir(dataset_id)
+    if _manifest(directory).get('owner_id') != user_id:
+        raise ValueError(f"Unknown dataset: {dataset_id}")
+    return directory
+
+
+def delete_dataset(dataset_id: str, user_id: int) -> None:
+    '''
+    Delete a dataset owned by user_id.
+
+    Raises:
+        ValueError: As check_access()
+    '''
+    shutil.rmtree(_owned_dir(dataset_id, user_id), ignore_errors=True)
+
+
+def purge_expired() -> int:
+    '''
+    Delete datasets uploaded more than settings.SIMULATION_DATASET_TTL_SECONDS ago.
+
+    Datasets without a manifest (failed or abandoned ingests) expire by
+    their directory's modification time.
+
+    Returns:
+        Number of datasets deleted
+    '''
+    root = datasets_dir()
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - settings.SIMULATION_DATASET_TTL_SECONDS
+    purged = 0
+    for directory in root.iterdir():
+        try:
+            manifest_path = directory / MANIFEST
+            if manifest_path.exists():
+                created = json.loads(manifest_path.read_text())['created_at']
+            else:
+                created = directory.stat().st_mtime
+        except (OSError, ValueError, KeyError):
+            # Deleted meanwhile, or a manifest without created_at: skip it
+            continue
+        if created <= cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            purged += 1
+    return purged
+
+
+def _purge_periodically() -> None:
+    '''Purge expired datasets every PURGE_INTERVAL_SECONDS until stop_purger().'''
+    while True:
+        try:
+            purge_expired()
+        except OSError as e:
+            logger.warning(f"Dataset purge failed: {e!r}")
+        if _stop_purger.wait(PURGE_INTERVAL_SECONDS):
+            return
+
+
+def start_purger() -> None:
+    '''Start the dataset purge thread (called on application startup).'''
+    global _purger
+    if _purger is None:
+        _stop_purger.clear()
+        _purger = threading.Thread(target=_purge_periodically, name='sim-dataset-purge', daemon=True)
+        _purger.start()
+
+
+def stop_purger() -> None:
+    '''Stop the dataset purge thread (called on application shutdown).'''
+    global _purger
+    _stop_purger.set()
+    _purger = None
@@ -0,0 +1,62 @@
+'''
+Discrete Distribution Sampling
+
+Draws from arbitrary finite distributions given as {x, p} rows. Draws
+use Walker alias tables (tables.alias_table), built once in O(k) per
+distinct row set and cached, after which every draw is O(1): one
+uniform column and one uniform threshold. Unlike rng.choice(p=...),
+no cumulative distribution is rebuilt and searched on each call.
+'''
+
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from app.services.sim_service import tables
+
+
+# Max rows (outcomes) of a distribution
+MAX_ROWS = 1000
+
+# Allowed distance of sum(p) from 1 before rows are rejected
+PROBABILITY_TOLERANCE = 1e-6
+
+
+def parse_rows(rows: List[Any]) -> Tuple[np.ndarray, Tuple[float, ...]]:
+    '''
+    Validate {x, p} rows.
+
+    Args:
+        rows: List of {'x': value, 'p': probability} dicts
+
+    Returns:
+        (values array, probabilities tuple rescaled to sum to exactly 1)
+
+    Raises:
+        ValueError: If rows are empty, too many, or not a distribution
+    '''
+    if not rows:
+        raise ValueError("rows must contain at least one {x, p} row")
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"rows must have at most {MAX_ROWS} entries, got {len(rows)}")
+    try:
+        values = np.array([float(row['x']) for row in rows])
+        probs = np.array([float(row['p']) for row in rows])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Each row must be an object with numeric x and p")
+
+    if not (np.isfinite(values).all() and np.isfinite(probs).all()):
+        raise ValueError("Row values and probabilities must be finite")
+    if (probs < 0).any():
+        raise ValueError("Probabilities must be non-negative")
+    if abs(probs.sum() - 1) > PROBABILITY_TOLERANCE:
+        raise ValueError(f"Probabilities must sum to 1, got {probs.sum():g}")
+
+    return values, tuple(probs / probs.sum())
+
+
+def sample_indices(rng: np.random.Generator, probs: Tuple[float, ...], size: int) -> np.ndarray:
+    '''Draw size outcome indices with probabilities probs via the cached alias table.'''
+    accept, alias = tables.alias_table(probs)
+    columns = rng.integers(0, len(accept), size=size)
+    return np.where(rng.random(size) < accept[columns], columns, alias[columns])
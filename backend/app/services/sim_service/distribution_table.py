@@ -0,0 +1,165 @@
+'''
+Distribution Table Simulation
+
+Draws many outcomes of a discrete random variable given as {x, p} rows
+and tracks how the running mean converges to the expected value (EMV).
+'''
+
+import numpy as np
+from typing import Dict, Any, Tuple
+
+from app.services.sim_service import discrete
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, lttb
+from app.core.config import settings
+
+
+# Max checkpoints of the running-mean path before downsampling
+PATH_POINTS = 1000
+
+# Points of the running-mean series without a series budget
+RUNNING_MEAN_POINTS = 200
+
+# Work-buffer bytes per draw: alias column, uniform, index, value and
+# running sum (8 bytes each) plus the acceptance mask
+BYTES_PER_DRAW = 48
+
+
+class DistributionTableSimulation(BaseSimulation):
+    '''
+    Expected value of a discrete random variable by simulation.
+
+    Outcomes are drawn with the alias method (see discrete.py) in chunks
+    bounded by settings.SIMULATION_MEMORY_BUDGET_BYTES; only outcome
+    counts, the running sum and the running-mean checkpoints are kept
+    between chunks.
+
+    Math:
+        - E[X] = Σ xᵢ pᵢ  (the expected monetary value)
+        - Var(X) = Σ (xᵢ - E[X])² pᵢ
+        - Sample mean X̄ₙ → E[X], with standard error √(Var(X) / n)
+    '''
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run distribution table simulation.
+
+        Args:
+            params:
+                - rows: Outcomes as [{'x': value, 'p': probability}, ...]
+                  (default [{x: 0, p: 0.2}, {x: 1, p: 0.5}, {x: 2, p: 0.3}])
+                - trials: Number of draws (default 1000)
+                - max_points / max_bytes: Series budget (see downsample.py)
+
+        Returns:
+            SimulationResult with outcome frequencies and running mean
+        '''
+        values, probs, trials = self._setup(params)
+        counts, total, path_n, path_sum = self._draw(values, probs, trials)
+        return self._result(params, values, probs, trials, counts, total, path_n, path_sum)
+
+    def _setup(self, params: Dict[str, Any]) -> Tuple[np.ndarray, Tuple[float, ...], int]:
+        '''Extract and validate (values, probabilities, trials).'''
+        rows = params.get('rows', [{'x': 0, 'p': 0.2}, {'x': 1, 'p': 0.5}, {'x': 2, 'p': 0.3}])
+        trials = params.get('trials', 1000)
+
+        self.validate_params(
+            {'trials': trials},
+            {'trials': (1, settings.MAX_SIMULATION_TRIALS)}
+        )
+        values, probs = discrete.parse_rows(rows)
+
+        return values, probs, int(trials)
+
+    def _draw(
+        self, values: np.ndarray, probs: Tuple[float, ...], trials: int
+    ) -> Tuple[np.ndarray, float, np.ndarray, np.ndarray]:
+        '''
+        Draw outcomes chunk by chunk.
+
+        Stops early (after at least one chunk) once the run deadline has
+        passed.
+
+        Returns:
+            (count per row, sum of drawn values, checkpoint draw counts,
+             running sums at the checkpoints)
+        '''
+        checkpoints = np.unique(np.round(np.geomspace(1, trials, min(PATH_POINTS, trials))).astype(np.int64))
+        chunk = max(1, settings.SIMULATION_MEMORY_BUDGET_BYTES // BYTES_PER_DRAW)
+
+        counts = np.zeros(len(values), dtype=np.int64)
+        total = 0.0
+        path_sums = []
+        for start in range(0, trials, chunk):
+            self.report_progress(start, trials)
+            if start > 0 and self.expired():
+                break
+            size = min(chunk, trials - start)
+            indices = discrete.sample_indices(self.rng, probs, size)
+            counts += np.bincount(indices, minlength=len(values))
+
+            running = total + np.cumsum(values[indices])
+            in_chunk = checkpoints[(checkpoints > start) & (checkpoints <= start + size)]
+            path_sums.append(running[in_chunk - start - 1])
+            total = float(running[-1])
+
+        path_sum = np.concatenate(path_sums)
+        return counts, total, checkpoints[:len(path_sum)], path_sum
+
+    def _result(
+        self,
+        params: Dict[str, Any],
+        values: np.ndarray,
+        probs: Tuple[float, ...],
+        trials: int,
+        counts: np.ndarray,
+        total: float,
+        path_n: np.ndarray,
+        path_sum: np.ndarray
+    ) -> SimulationResult:
+        '''Build frequencies, running mean and metrics from the tallies.'''
+        completed = int(counts.sum())
+        p = np.asarray(probs)
+        expected = float(values @ p)
+        variance = float(((values - expected) ** 2) @ p)
+        sample_mean = total / completed
+        sample_var = float(((values - sample_mean) ** 2) @ counts) / completed
+
+        # A run stopped at the deadline ends between checkpoints
+        if len(path_n) == 0 or path_n[-1] != completed:
+            path_n = np.append(path_n, completed)
+            path_sum = np.append(path_sum, total)
+        running_mean = path_sum / path_n
+        keep = lttb(np.log(path_n), running_mean, budget_points(
+            params, RUNNING_MEAN_POINTS, num_series=2, values_per_point=2
+        ))
+
+        return SimulationResult(
+            meta={
+                'simulation': 'distribution_table',
+                'trials': trials,
+                'trials_completed': completed,
+                'partial': completed < trials,
+                'seed': params.get('seed')
+            },
+            series={
+                'distribution': {
+                    'x': values,
+                    'p': p,
+                    'empirical': counts / completed
+                },
+                'running_mean': {
+                    'n': path_n[keep],
+                    'mean': running_mean[keep]
+                }
+            },
+            metrics={
+                'expected_value': round(expected, 6),
+                'sample_mean': round(sample_mean, 6),
+                'error': round(abs(sample_mean - expected), 6),
+                'theoretical_std': round(float(np.sqrt(variance)), 6),
+                'sample_std': round(float(np.sqrt(sample_var)), 6),
+                'standard_error': round(float(np.sqrt(variance / completed)), 6),
+                'most_likely_x': float(values[int(np.argmax(p))])
+            }
+        )
@@ -0,0 +1,154 @@
+'''
+Series Downsampling
+
+Shrinks result series to a point budget while staying faithful to the
+whole run:
+    - lttb(): Largest-Triangle-Three-Buckets for paths (convergence
+      curves, running proportions, pdf curves)
+    - rehistogram(): merges adjacent histogram bins
+    - stride_sample(): evenly spaced subsample of i.i.d. draws
+
+Every simulation accepts two optional budget parameters, applied to
+each series through budget_points():
+    - max_points: Max points per series
+    - max_bytes: Approximate JSON size of all series together
+'''
+
+import math
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+
+# Points a path series is downsampled to when the request sets no budget
+DEFAULT_SERIES_POINTS = 1000
+
+# Upper bound for the max_points parameter
+MAX_SERIES_POINTS = 100000
+
+# Smallest accepted max_bytes
+MIN_SERIES_BYTES = 256
+
+# Rough JSON size of one full-precision float plus separator; packed
+# encodings are smaller, so a max_bytes budget is conservative for them
+JSON_BYTES_PER_VALUE = 20
+
+
+def budget_points(
+    params: Dict[str, Any],
+    default: int,
+    num_series: int = 1,
+    values_per_point: int = 1
+) -> int:
+    '''
+    Points a series may have under the request's budget.
+
+    Args:
+        params: Simulation parameters (max_points, max_bytes are read)
+        default: Points the series has without a budget
+        num_series: Number of series in the result sharing max_bytes
+        values_per_point: Numbers per point (e.g. 2 for an (x, y) curve)
+
+    Raises:
+        ValueError: If a budget parameter is out of range
+    '''
+    points = default
+    max_points = params.get('max_points')
+    if max_points is not None:
+        if not 2 <= max_points <= MAX_SERIES_POINTS:
+            raise ValueError(
+                f"max_points must be between 2 and {MAX_SERIES_POINTS}, got {max_points}"
+            )
+        points = min(points, int(max_points))
+
+    max_bytes = params.get('max_bytes')
+    if max_bytes is not None:
+        if max_bytes < MIN_SERIES_BYTES:
+            raise ValueError(f"max_bytes must be at least {MIN_SERIES_BYTES}, got {max_bytes}")
+        per_series = max_bytes / num_series
+        points = min(points, max(2, int(per_series // (values_per_point * JSON_BYTES_PER_VALUE))))
+
+    return points
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of threshold - 2
+    equal-size buckets in between, the point forming the largest
+    triangle with the previously kept point and the mean of the next
+    bucket. Peaks and turns of the path survive, unlike plain striding.
+
+    Args:
+        x: Increasing x values
+        y: y values
+        threshold: Number of points to keep
+
+    Returns:
+        Sorted indices of the kept points
+    '''
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold <= 2:
+        return np.array([0, n - 1])
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i spans [edges[i], edges[i + 1]); the final "bucket" is the last point
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = x[end:edges[i + 2]].mean()
+        next_y = y[end:edges[i + 2]].mean()
+        # Twice the triangle area (a, candidate, next-bucket mean)
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def rehistogram(
+    counts: np.ndarray, edges: np.ndarray, max_bins: int, density: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Merge adjacent histogram bins so there are at most max_bins.
+
+    Args:
+        counts: Bin counts (or densities if density=True)
+        edges: Bin edges (len(counts) + 1)
+        max_bins: Max number of bins to return
+        density: Whether counts are densities, which are re-weighted
+            by bin width instead of summed
+
+    Returns:
+        (counts, edges) of the merged histogram
+    '''
+    num_bins = len(counts)
+    if num_bins <= max_bins:
+        return counts, edges
+
+    group = math.ceil(num_bins / max_bins)
+    starts = np.arange(0, num_bins, group)
+    new_edges = np.append(edges[starts], edges[-1])
+    if density:
+        mass = np.add.reduceat(counts * np.diff(edges), starts)
+        return mass / np.diff(new_edges), new_edges
+    return np.add.reduceat(counts, starts), new_edges
+
+
+def stride_sample(values: np.ndarray, max_points: int) -> np.ndarray:
+    '''Evenly strided subsample of at most max_points values from the whole array.'''
+    if len(values) <= max_points:
+        return values
+    return values[::math.ceil(len(values) / max_points)]
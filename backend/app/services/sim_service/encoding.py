@@ -0,0 +1,203 @@
+'''
+Simulation Result Encoding
+
+Serializes SimulationResult dicts whose series hold NumPy arrays,
+straight from the arrays (no intermediate Python lists except for the
+plain JSON encoding).
+
+Encodings:
+    - json:    arrays as JSON number lists (default)
+    - base64:  arrays packed as little-endian binary inside JSON
+    - msgpack: the same packed arrays as raw msgpack bytes (requires the
+               optional msgpack package)
+
+A packed array is an object
+    {"__ndarray__": <data>, "dtype": "<f4", "shape": [200]}
+where <data> is the base64 string (base64) or raw bytes (msgpack) of the
+array in C order. Float arrays are sent as float32, integer arrays as
+int32 (int64 if out of range) and boolean arrays as uint8.
+
+JSON has no NaN or Infinity, so non-finite floats outside packed arrays
+are sent as null (packed arrays keep them in their binary data).
+'''
+
+import base64
+import json
+import math
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+ENCODINGS = ('json', 'base64', 'msgpack')
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'base64': 'application/json',
+    'msgpack': 'application/msgpack',
+}
+
+ARRAY_KEY = '__ndarray__'
+
+
+def negotiate_encoding(accept: Optional[str] = None, requested: Optional[str] = None) -> str:
+    '''
+    Pick the response encoding.
+
+    An explicit `requested` encoding (e.g. an ?encoding= query value)
+    wins; otherwise msgpack is used when the Accept header asks for it
+    and the msgpack package is installed, and JSON in all other cases.
+
+    Raises:
+        ValueError: If the requested encoding is unknown or unavailable
+    '''
+    if requested is not None:
+        if requested not in ENCODINGS:
+            raise ValueError(f"Encoding must be one of {', '.join(ENCODINGS)}")
+        if requested == 'msgpack' and msgpack is None:
+            raise ValueError("msgpack encoding is not available")
+        return requested
+    if accept and msgpack is not None and (
+        'application/msgpack' in accept or 'application/x-msgpack' in accept
+    ):
+        return 'msgpack'
+    return 'json'
+
+
+def _wire_dtype(array: np.ndarray) -> np.dtype:
+    '''Compact little-endian dtype used for a packed array.'''
+    kind = array.dtype.kind
+    if kind == 'f':
+        return np.dtype('<f4')
+    if kind == 'b':
+        return np.dtype('u1')
+    if kind in 'iu':
+        info = np.iinfo(np.int32)
+        if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+            return np.dtype('<i4')
+        return np.dtype('<i8')
+    raise TypeError(f"Cannot pack array of dtype {array.dtype}")
+
+
+def pack_array(array: np.ndarray, lossless: bool = False) -> Dict[str, Any]:
+    '''
+    Pack an array as {ARRAY_KEY: bytes, dtype, shape}.
+
+    Args:
+        array: Array to pack
+        lossless: Keep the array's own precision instead of the compact
+            wire dtype (used by the result cache)
+    '''
+    dtype = array.dtype.newbyteorder('<') if lossless else _wire_dtype(array)
+    data = np.ascontiguousarray(array, dtype=dtype).tobytes()
+    return {ARRAY_KEY: data, 'dtype': dtype.str, 'shape': list(array.shape)}
+
+
+def unpack_array(packed: Dict[str, Any]) -> np.ndarray:
+    '''Inverse of pack_array() (accepts base64 or raw bytes).'''
+    data = packed[ARRAY_KEY]
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    return np.frombuffer(data, dtype=packed['dtype']).reshape(packed['shape'])
+
+
+def _packed_b64(array: np.ndarray, lossless: bool = False) -> Dict[str, Any]:
+    packed = pack_array(array, lossless)
+    packed[ARRAY_KEY] = base64.b64encode(packed[ARRAY_KEY]).decode('ascii')
+    return packed
+
+
+def _finite(obj: Any) -> Any:
+    '''Copy of a plain container tree with non-finite floats replaced by None.'''
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def _json_dumps(result: Dict[str, Any], default: Any) -> str:
+    '''
+    json.dumps() rejecting NaN/Infinity, which are not valid JSON.
+
+    The default hooks already map non-finite NumPy values to None; plain
+    Python floats never reach them, so a result holding a non-finite one
+    is re-encoded with those replaced by None.
+    '''
+    try:
+        return json.dumps(
+            result, default=default, ensure_ascii=False, separators=(',', ':'), allow_nan=False
+        )
+    except ValueError:
+        return json.dumps(
+            _finite(result), default=default, ensure_ascii=False, separators=(',', ':'),
+            allow_nan=False
+        )
+
+
+def _default_json(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in 'fc' and not np.isfinite(obj).all():
+            values = obj.astype(object)
+            values[~np.isfinite(obj)] = None
+            return values.tolist()
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _default_base64(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return _packed_b64(obj)
+    return _default_json(obj)
+
+
+def _default_lossless(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return _packed_b64(obj, lossless=True)
+    return _default_json(obj)
+
+
+def _default_msgpack(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return pack_array(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+def encode_result(result: Dict[str, Any], encoding: str = 'json') -> bytes:
+    '''
+    Serialize a result dict for a response body.
+
+    Args:
+        result: Result dict, possibly holding NumPy arrays
+        encoding: One of ENCODINGS (see negotiate_encoding())
+    '''
+    if encoding == 'msgpack':
+        return msgpack.packb(result, default=_default_msgpack)
+    default = _default_base64 if encoding == 'base64' else _default_json
+    return _json_dumps(result, default).encode('utf-8')
+
+
+def dumps(result: Dict[str, Any]) -> bytes:
+    '''Serialize a result dict losslessly (arrays keep their dtype).'''
+    return _json_dumps(result, _default_lossless).encode('utf-8')
+
+
+def _revive(obj: Dict[str, Any]) -> Any:
+    return unpack_array(obj) if ARRAY_KEY in obj else obj
+
+
+def loads(data: bytes) -> Dict[str, Any]:
+    '''Inverse of dumps(), restoring packed arrays as read-only NumPy arrays.'''
+    return json.loads(data, object_hook=_revive)
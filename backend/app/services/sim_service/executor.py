@@ -0,0 +1,371 @@
+'''
+Simulation Executor
+
+Runs simulations in a bounded process pool so CPU-heavy work never
+blocks the asyncio event loop.
+
+Workers report when they pick up a run (over a multiprocessing queue
+read by a thread in the web process), so the hard timeout of a run is
+measured from the moment it starts, not while it waits behind others.
+Streamed runs send their snapshots back over the same queue.
+'''
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, AsyncIterator, Callable, Optional
+
+from app.core.config import settings
+from app.services.sim_service.parallel import merge_shards, plan_shards, run_shard, should_shard
+from app.services.sim_service.registry import create_simulation, run_simulation, warm_up
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between hard-timeout checks of a run in flight
+WATCH_INTERVAL_SECONDS = 0.25
+
+# Retry-After suggested when the pool broke twice under a run
+POOL_RETRY_AFTER_SECONDS = 1.0
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Reentrant: runs are submitted under the lock (see _run_watched)
+_executor_lock = threading.RLock()
+
+# Pool -> the queue its workers send run updates on
+_update_queues: Dict[ProcessPoolExecutor, Any] = {}
+
+# Run id -> (time.monotonic() when a worker started it, worker pid), or
+# None while the run is queued
+_runs: Dict[str, Optional[tuple]] = {}
+
+# Stream id -> callback receiving the snapshots of a streamed run
+_sinks: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+_runs_lock = threading.Lock()
+
+# Update queue of the pool this worker belongs to (see _init_worker)
+_updates: Any = None
+
+
+class SimulationUnavailableError(Exception):
+    '''
+    The pool broke under a run twice (e.g. a worker was killed), so it
+    could not be completed.
+
+    Attributes:
+        retry_after: Seconds after which a retry is likely to succeed
+    '''
+
+    def __init__(self, message: str, retry_after: float = POOL_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _init_worker(updates: Any) -> None:
+    '''Pool worker initializer: keep the queue for run updates.'''
+    global _updates
+    _updates = updates
+
+
+def _run_task(run_id: str, fn: Callable, *args: Any) -> Any:
+    '''Report the start of a run, then run it; executed inside pool workers.'''
+    _updates.put((run_id, 'started', os.getpid()))
+    return fn(*args)
+
+
+def stream_simulation(stream_id: str, sim_type: str, params: Dict[str, Any], timeout: float) -> int:
+    '''
+    Run a simulation's iter_run(), sending each snapshot to the web
+    process; executed inside pool workers (see stream_in_pool).
+
+    Returns:
+        Number of snapshots sent
+    '''
+    simulation = create_simulation(sim_type, seed=params.get('seed'), timeout=timeout)
+    sent = 0
+    for result in simulation.iter_run(params):
+        _updates.put((stream_id, 'snapshot', result.model_dump()))
+        sent += 1
+    return sent
+
+
+def _read_updates(updates: Any) -> None:
+    '''Apply run updates until the pool is discarded (None sentinel).'''
+    while True:
+        item = updates.get()
+        if item is None:
+            return
+        key, kind, payload = item
+        with _runs_lock:
+            # Runs and streams that already finished are no longer tracked
+            if kind == 'started' and key in _runs:
+                _runs[key] = (time.monotonic(), payload)
+            sink = _sinks.get(key) if kind == 'snapshot' else None
+        if sink is not None:
+            sink(payload)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    '''Get (creating on first use) the shared simulation process pool.'''
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                updates = multiprocessing.Queue()
+                _executor = ProcessPoolExecutor(
+                    max_workers=max(1, settings.SIMULATION_MAX_WORKERS),
+                    initializer=_init_worker,
+                    initargs=(updates,)
+                )
+                _update_queues[_executor] = updates
+                threading.Thread(
+                    target=_read_updates, args=(updates,), name='sim-run-updates', daemon=True
+                ).start()
+    return _executor
+
+
+async def warm_up_executor() -> None:
+    '''
+    Start every pool worker and warm it up (called on application startup).
+
+    Submits one registry.warm_up() task per worker: the pool forks all its
+    workers up front, and since each task takes a while (importing scipy
+    and the engines), the tasks spread over the workers. Scipy is thus
+    imported in the workers only, never in the web process. Failures are
+    logged, not raised: a cold worker still serves requests, just slower.
+    '''
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    started = time.monotonic()
+    futures = [
+        loop.run_in_executor(executor, warm_up)
+        for _ in range(max(1, settings.SIMULATION_MAX_WORKERS))
+    ]
+    try:
+        reports = await asyncio.wait_for(
+            asyncio.gather(*futures), timeout=settings.SIMULATION_HARD_TIMEOUT_SECONDS
+        )
+    except Exception as e:
+        logger.warning(f"Simulation worker warm-up failed: {e!r}")
+        return
+    logger.info(
+        f"Warmed up {len({report['pid'] for report in reports})} simulation workers "
+        f"({len(reports[0]['sim_types'])} simulations) in {time.monotonic() - started:.2f}s"
+    )
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    '''
+    Drop a (broken) pool so the next run creates a new one.
+
+    Pending runs are not cancelled: they fail with BrokenProcessPool and
+    are retried on the new pool by _run_watched.
+    '''
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+    executor.shutdown(wait=False)
+    _update_queues.pop(executor).put(None)
+
+
+def shutdown_executor() -> None:
+    '''Shut down the process pool (called on application shutdown).'''
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        _update_queues.pop(executor).put(None)
+
+
+def kill_worker(executor: ProcessPoolExecutor, pid: int) -> None:
+    '''
+    Terminate one pool worker and discard the pool.
+
+    Last resort for a simulation that ignores its cooperative deadline.
+    A dead worker breaks a ProcessPoolExecutor, so the other runs in
+    flight on the pool fail with BrokenProcessPool and are retried on a
+    new pool.
+    '''
+    # ProcessPoolExecutor has no public API to kill a running worker
+    process = executor._processes.get(pid)
+    if process is not None:
+        process.terminate()
+    _discard_executor(executor)
+
+
+async def _run_watched(label: str, fn: Callable, *args: Any, retry: bool = True) -> Any:
+    '''
+    Run fn(*args) in the pool under the hard timeout.
+
+    A run still going SIMULATION_HARD_TIMEOUT_SECONDS after a worker
+    picked it up gets that worker killed. Runs that fail only because the
+    pool broke under them (another run's worker was killed) are retried
+    once on a new pool, unless `retry` is False.
+
+    Raises:
+        TimeoutError: If this run exceeded the hard timeout
+        SimulationUnavailableError: If the pool broke under the (last) try
+    '''
+    attempts = 2 if retry else 1
+    for attempt in range(attempts):
+        run_id = uuid.uuid4().hex
+        with _runs_lock:
+            _runs[run_id] = None
+        try:
+            # Submit under the pool lock, so the pool cannot be discarded in between
+            with _executor_lock:
+                executor = get_executor()
+                future = asyncio.wrap_future(executor.submit(_run_task, run_id, fn, *args))
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=WATCH_INTERVAL_SECONDS)
+                if done:
+                    return future.result()
+                with _runs_lock:
+                    started = _runs.get(run_id)
+                if started is None:
+                    continue
+                started_at, pid = started
+                if time.monotonic() - started_at > settings.SIMULATION_HARD_TIMEOUT_SECONDS:
+                    logger.error(f"Simulation {label} exceeded hard timeout; killing its pool worker")
+                    kill_worker(executor, pid)
+                    # Drop the BrokenProcessPool the killed run will end with
+                    future.cancel()
+                    raise TimeoutError(f"Simulation {label} timed out")
+        except asyncio.CancelledError:
+            # Withdraw the run if it has not started yet
+            future.cancel()
+            raise
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            if attempt == attempts - 1:
+                raise SimulationUnavailableError(
+                    f"Simulation {label} was interrupted by a worker failure; try again"
+                )
+            logger.warning(f"Simulation pool broke under {label}; retrying on a new pool")
+        finally:
+            with _runs_lock:
+                _runs.pop(run_id, None)
+
+
+async def run_in_pool(
+    sim_type: str, params: Dict[str, Any], method: str = 'run'
+) -> Dict[str, Any]:
+    '''
+    Run a simulation in the process pool without blocking the event loop.
+
+    The simulation gets settings.SIMULATION_TIMEOUT_SECONDS as its
+    cooperative deadline and returns a partial result when it runs out.
+    If it still has not finished SIMULATION_HARD_TIMEOUT_SECONDS after a
+    worker picked it up, that worker is killed (see _run_watched). Large
+    runs of shardable simulations are split across the workers (see
+    parallel.should_shard).
+
+    Args:
+        sim_type: Registry key of the simulation to run
+        params: Simulation parameters
+        method: Simulation method to call ('run' or 'run_batch')
+
+    Returns:
+        SimulationResult as a plain dict
+
+    Raises:
+        TimeoutError: If the hard timeout expired
+        SimulationUnavailableError: If worker failures kept the run from
+            completing
+    '''
+    if method == 'run' and should_shard(sim_type, params):
+        return await _run_sharded_in_pool(sim_type, params)
+
+    return await _run_watched(
+        sim_type, run_simulation, sim_type, params, settings.SIMULATION_TIMEOUT_SECONDS, method
+    )
+
+
+async def _run_sharded_in_pool(sim_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Run a simulation as shards spread over the pool workers.
+
+    All shards share one cooperative deadline; each shard has its own
+    hard timeout. The merge runs in the pool too, since building the
+    result needs the engine's scipy-backed statistics.
+    '''
+    shards = plan_shards(sim_type, params)
+    deadline = time.monotonic() + settings.SIMULATION_TIMEOUT_SECONDS
+    tasks = [
+        asyncio.ensure_future(_run_watched(sim_type, run_shard, sim_type, shard, seed, deadline))
+        for shard, seed in shards
+    ]
+    try:
+        parts = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed shard fails the run: withdraw the shards not yet started
+        for task in tasks:
+            task.cancel()
+        raise
+    return await _run_watched(sim_type, merge_shards, sim_type, params, parts)
+
+
+async def stream_in_pool(sim_type: str, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    '''
+    Run a simulation's iter_run() in the process pool, yielding its
+    snapshots as they arrive.
+
+    The run gets the same cooperative deadline and hard timeout as
+    run_in_pool(); only simulations with an incremental iter_run() should
+    be streamed (see registry.supports_streaming).
+
+    Yields:
+        SimulationResult snapshots as plain dicts
+
+    Raises:
+        ValueError: If the parameters are invalid
+        TimeoutError: If the hard timeout expired
+        SimulationUnavailableError: If a worker failure interrupted the run
+    '''
+    loop = asyncio.get_running_loop()
+    snapshots: asyncio.Queue = asyncio.Queue()
+    stream_id = uuid.uuid4().hex
+    with _runs_lock:
+        _sinks[stream_id] = lambda snapshot: loop.call_soon_threadsafe(snapshots.put_nowait, snapshot)
+
+    # Not retried on a broken pool: snapshots may have been sent already
+    run = asyncio.ensure_future(_run_watched(
+        sim_type, stream_simulation, stream_id, sim_type, params,
+        settings.SIMULATION_TIMEOUT_SECONDS, retry=False
+    ))
+    received = 0
+    try:
+        while not run.done():
+            snapshot = asyncio.ensure_future(snapshots.get())
+            await asyncio.wait({snapshot, run}, return_when=asyncio.FIRST_COMPLETED)
+            if not snapshot.done():
+                snapshot.cancel()
+                break
+            received += 1
+            yield snapshot.result()
+        # The run result can overtake its last snapshots: they travel on
+        # the update queue, so drain up to the count the worker sent
+        sent = run.result()
+        while received < sent:
+            try:
+                snapshot = await asyncio.wait_for(
+                    snapshots.get(), timeout=settings.SIMULATION_HARD_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Lost {sent - received} streamed snapshots of {sim_type}")
+                return
+            received += 1
+            yield snapshot
+    finally:
+        run.cancel()
+        with _runs_lock:
+            _sinks.pop(stream_id, None)
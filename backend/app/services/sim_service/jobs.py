@@ -0,0 +1,370 @@
+'''
+Background Simulation Jobs
+
+Runs large simulations as jobs on their own process pool, separate from
+the interactive pool in executor.py, so long runs never hold up
+interactive requests:
+    - submit() returns a job id at once; the run gets
+      settings.SIMULATION_JOB_TIMEOUT_SECONDS as its cooperative deadline
+    - workers send progress (units completed / total, from the engines'
+      report_progress() calls) back over a multiprocessing queue, at most
+      once per PROGRESS_INTERVAL_SECONDS
+    - every status change and progress update is published to the
+      owner's SSE stream (/progress/events) as a JOB_EVENT event, and can
+      be polled with get()
+    - finished jobs, results included, are dropped
+      settings.SIMULATION_JOB_TTL_SECONDS after they finish, by a purge
+      thread running every PURGE_INTERVAL_SECONDS
+    - jobs that did no useful work (invalid parameters, cancelled or
+      timed out) get their admission cost refunded
+
+Job state lives in the web process, like the pools and the result cache.
+'''
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Set
+
+from app.core.config import settings
+from app.core.events import emit_user_event
+from app.services.sim_service.admission import AdmissionError, admission
+from app.services.sim_service.registry import create_simulation
+
+
+logger = logging.getLogger(__name__)
+
+# Min seconds between progress updates of a running job
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# Seconds between hard-timeout checks of a running job
+WATCH_INTERVAL_SECONDS = 1.0
+
+# Retry-After when the job queue is full
+QUEUE_FULL_RETRY_SECONDS = 5.0
+
+# Seconds between purges of expired jobs
+PURGE_INTERVAL_SECONDS = 30.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+# SSE event type of job updates
+JOB_EVENT = 'simJobUpdated'
+
+# Update queue of the job pool this worker belongs to (see _init_worker)
+_updates: Any = None
+
+
+def _init_worker(updates: Any) -> None:
+    '''Job pool worker initializer: keep the queue for progress updates.'''
+    global _updates
+    _updates = updates
+
+
+def run_job(job_id: str, sim_type: str, params: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    '''
+    Run a job's simulation; executed inside job pool workers.
+
+    Returns:
+        SimulationResult as a plain dict
+    '''
+    last_sent = 0.0
+
+    def progress(completed: int, total: int) -> None:
+        nonlocal last_sent
+        now = time.monotonic()
+        if now - last_sent >= PROGRESS_INTERVAL_SECONDS:
+            last_sent = now
+            _updates.put((job_id, {'completed': int(completed), 'total': int(total)}))
+
+    _updates.put((job_id, None))  # started
+    simulation = create_simulation(sim_type, seed=params.get('seed'), timeout=timeout, progress=progress)
+    return simulation.run(params).model_dump()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _view(job: Dict[str, Any]) -> Dict[str, Any]:
+    '''Public, JSON-serializable status of a job (without its result).'''
+    return {
+        'job_id': job['job_id'],
+        'sim_type': job['sim_type'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
+
+class JobManager:
+    '''
+    Queue, run and track background simulation jobs.
+
+    Job records are shared between the event loop and the thread reading
+    worker updates, so every access holds the lock.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._updates: Any = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._purger: Optional[threading.Thread] = None
+        self._stop_purger = threading.Event()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        '''Get (creating on first use) the job pool and its update reader.'''
+        with self._lock:
+            if self._pool is None:
+                self._updates = multiprocessing.Queue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=max(1, settings.SIMULATION_JOB_WORKERS),
+                    initializer=_init_worker,
+                    initargs=(self._updates,)
+                )
+                threading.Thread(
+                    target=self._read_updates, args=(self._updates,),
+                    name='sim-job-updates', daemon=True
+                ).start()
+            return self._pool
+
+    def _read_updates(self, updates: Any) -> None:
+        '''Apply worker updates until the pool is shut down (None sentinel).'''
+        while True:
+            item = updates.get()
+            if item is None:
+                return
+            job_id, progress = item
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] in FINISHED:
+                    continue
+                if progress is None:
+                    job['status'] = RUNNING
+                    job['started_at'] = _now()
+                    job['started'] = time.monotonic()
+                else:
+                    job['progress'] = {
+                        **progress,
+                        'fraction': round(progress['completed'] / max(1, progress['total']), 4)
+                    }
+                view = _view(job)
+            self._publish(job['user_id'], view)
+
+    def _publish(self, user_id: int, view: Dict[str, Any]) -> None:
+        '''Send a job update to the owner's SSE stream (from any thread).'''
+        if self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(emit_user_event(user_id, JOB_EVENT, view), self._loop)
+
+    def _purge(self) -> None:
+        '''Drop finished jobs past their TTL (caller holds the lock).'''
+        now = time.monotonic()
+        for job_id in [k for k, job in self._jobs.items() if job['expires'] is not None and job['expires'] <= now]:
+            del self._jobs[job_id]
+
+    def _purge_periodically(self) -> None:
+        '''Purge expired jobs every PURGE_INTERVAL_SECONDS until shutdown().'''
+        while not self._stop_purger.wait(PURGE_INTERVAL_SECONDS):
+            with self._lock:
+                self._purge()
+
+    def _start_purger(self) -> None:
+        '''Start the purge thread on first use (caller holds the lock).'''
+        if self._purger is None:
+            self._stop_purger.clear()
+            self._purger = threading.Thread(
+                target=self._purge_periodically, name='sim-job-purge', daemon=True
+            )
+            self._purger.start()
+
+    async def submit(
+        self, user_id: int, sim_type: str, params: Dict[str, Any], cost: float = 0.0
+    ) -> Dict[str, Any]:
+        '''
+        Queue a simulation job.
+
+        Args:
+            user_id: Owner of the job
+            sim_type: Registry key of the simulation
+            params: Simulation parameters (validated when the job runs)
+            cost: Admission cost charged for the job (job pool budget),
+                refunded if the job does no useful work
+
+        Returns:
+            Job status (see get())
+
+        Raises:
+            AdmissionError: If the user (429) or the whole queue (503) has
+                too many unfinished jobs
+        '''
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._start_purger()
+            self._purge()
+            active = [job for job in self._jobs.values() if job['status'] not in FINISHED]
+            if len(active) >= settings.SIMULATION_MAX_QUEUED_JOBS:
+                raise AdmissionError(
+                    "Too many simulation jobs are queued", QUEUE_FULL_RETRY_SECONDS, overloaded=True
+                )
+            if sum(job['user_id'] == user_id for job in active) >= settings.SIMULATION_MAX_JOBS_PER_USER:
+                raise AdmissionError(
+                    f"At most {settings.SIMULATION_MAX_JOBS_PER_USER} unfinished jobs per user",
+                    QUEUE_FULL_RETRY_SECONDS, overloaded=False
+                )
+            job = {
+                'job_id': uuid.uuid4().hex,
+                'user_id': user_id,
+                'sim_type': sim_type,
+                'status': QUEUED,
+                'progress': None,
+                'error': None,
+                'result': None,
+                'created_at': _now(),
+                'started_at': None,
+                'finished_at': None,
+                'started': None,
+                'expires': None,
+                'cost': cost
+            }
+            self._jobs[job['job_id']] = job
+            view = _view(job)
+
+        future = self._loop.run_in_executor(
+            self._get_pool(), run_job, job['job_id'], sim_type, params,
+            settings.SIMULATION_JOB_TIMEOUT_SECONDS
+        )
+        task = asyncio.create_task(self._watch(job['job_id'], future))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._publish(user_id, view)
+        return view
+
+    async def _watch(self, job_id: str, future: asyncio.Future) -> None:
+        '''
+        Wait for a job and record its outcome.
+
+        A job still running SIMULATION_HARD_TIMEOUT_SECONDS past its
+        cooperative deadline gets the job pool killed (other jobs on
+        the pool fail as well).
+        '''
+        limit = settings.SIMULATION_JOB_TIMEOUT_SECONDS + settings.SIMULATION_HARD_TIMEOUT_SECONDS
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=WATCH_INTERVAL_SECONDS)
+            if done:
+                break
+            with self._lock:
+                started = self._jobs.get(job_id, {}).get('started')
+            if started is not None and time.monotonic() - started > limit:
+                logger.error(f"Simulation job {job_id} exceeded hard timeout; killing job workers")
+                self._kill_pool()
+                self._finish(job_id, error="Job timed out", refund=True)
+                return
+
+        if future.cancelled():
+            # Queued jobs are cancelled when the job pool is killed or shut down
+            self._finish(job_id, error="Job was cancelled", refund=True)
+            return
+        try:
+            self._finish(job_id, result=future.result())
+        except (ValueError, TimeoutError) as e:
+            self._finish(job_id, error=str(e), refund=True)
+        except Exception as e:
+            logger.error(f"Simulation job {job_id} failed: {e!r}")
+            self._finish(job_id, error="Job failed")
+
+    def _finish(
+        self,
+        job_id: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        refund: bool = False
+    ) -> None:
+        '''Record a job's outcome, refunding its admission cost if asked to.'''
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return
+            job['status'] = FAILED if error is not None else SUCCEEDED
+            # Progress updates are throttled, so a full run may end short of 100%
+            if job['progress'] is not None and result is not None and not result['meta'].get('partial'):
+                total = job['progress']['total']
+                job['progress'] = {'completed': total, 'total': total, 'fraction': 1.0}
+            job['result'] = result
+            job['error'] = error
+            job['finished_at'] = _now()
+            job['expires'] = time.monotonic() + settings.SIMULATION_JOB_TTL_SECONDS
+            view = _view(job)
+        if refund:
+            admission.refund(job['user_id'], job['cost'], shared_pool=False)
+        self._publish(job['user_id'], view)
+
+    def get(self, job_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        '''
+        Status of a job owned by user_id.
+
+        Returns:
+            Dict with job_id, sim_type, status ('queued', 'running',
+            'succeeded' or 'failed'), progress ({completed, total,
+            fraction} of the engine's work units, or None before the
+            first update), error and timestamps; None if the job does
+            not exist, has expired or belongs to another user
+        '''
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is None or job['user_id'] != user_id:
+                return None
+            return _view(job)
+
+    def result(self, job_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        '''Result dict of a succeeded job (None if not available, see get()).'''
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is None or job['user_id'] != user_id:
+                return None
+            return job['result']
+
+    def list(self, user_id: int) -> List[Dict[str, Any]]:
+        '''Statuses of the user's jobs, oldest first.'''
+        with self._lock:
+            self._purge()
+            return [_view(job) for job in self._jobs.values() if job['user_id'] == user_id]
+
+    def _kill_pool(self) -> None:
+        '''Terminate the job workers and discard the pool.'''
+        with self._lock:
+            if self._pool is None:
+                return
+            # ProcessPoolExecutor has no public API to kill a running worker
+            for process in list(self._pool._processes.values()):
+                process.terminate()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._updates.put(None)
+            self._pool = None
+
+    def shutdown(self) -> None:
+        '''Shut down the job pool and the purge thread (called on application shutdown).'''
+        self._stop_purger.set()
+        with self._lock:
+            self._purger = None
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._updates.put(None)
+                self._pool = None
+
+
+job_manager = JobManager()
@@ -0,0 +1,286 @@
+'''
+Outcome Tree
+
+Counting-principles tree of multi-step outcomes. Counts come from closed
+forms and tree levels are paged lazily, so the outcome space is never
+materialized.
+'''
+
+import itertools
+import math
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.services.sim_service import tables
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+
+
+# Max steps (tree depth)
+MAX_STEPS = 64
+
+# Max options per step (or in the shared pool)
+MAX_CHOICES = 1000
+
+# Nodes per page when page_size is not given, and the largest allowed page
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# Counts above this are not exact as JSON numbers (2^53)
+MAX_EXACT_COUNT = 2 ** 53
+
+# Counting rule per (orderMatters, noRepeats)
+MODES = {
+    (True, False): 'product',
+    (True, True): 'permutation',
+    (False, True): 'combination',
+    (False, False): 'multiset',
+}
+
+
+class Tree(NamedTuple):
+    '''Validated tree shape.'''
+    steps: int
+    choices: List[int]  # Options per step
+    pool: int  # Shared pool size, max(choices)
+    mode: str  # One of MODES.values()
+
+
+def _json_count(count: int) -> Any:
+    '''Exact int while JSON clients can represent it, float beyond.'''
+    return count if count <= MAX_EXACT_COUNT else float(count)
+
+
+class OutcomeTreeSimulation(BaseSimulation):
+    '''
+    Tree of the outcomes of a multi-step choice.
+
+    A node at depth d is the sequence of options picked in the first d
+    steps; the leaves are the outcomes. Nodes of a level are ordered
+    lexicographically, so any node can be found from its rank (unranking)
+    and a page is the run of nodes after a cursor rank.
+
+    Counting rules (n = shared pool size, k = steps):
+        - order matters, repeats allowed:  product rule  c₁ · c₂ · … · cₖ
+        - order matters, no repeats:       permutations  P(n, k) = n! / (n-k)!
+        - order ignored, no repeats:       combinations  C(n, k)
+        - order ignored, repeats allowed:  multisets     C(n+k-1, k)
+
+    Only the product rule uses choicesPerStep step by step; the other
+    rules draw every step from one shared pool of max(choicesPerStep)
+    options. Unordered outcomes are listed in increasing (combinations)
+    or non-decreasing (multisets) order, and the tree only holds nodes
+    that lead to at least one outcome.
+    '''
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Count outcomes and page through one tree level.
+
+        Args:
+            params:
+                - steps: Number of steps (default 3)
+                - choicesPerStep: Options per step, a list with one entry
+                  per step or a single int for all steps (default 2)
+                - orderMatters: Whether option order distinguishes outcomes
+                  (default True)
+                - noRepeats: Whether an option may be picked only once
+                  (default False)
+                - parent: Path of option indices whose descendants are
+                  listed (default [] - the root)
+                - level: Depth of the listed nodes (default one below parent)
+                - cursor: next_cursor of the previous page (default start)
+                - page_size: Nodes per page (default DEFAULT_PAGE_SIZE)
+
+        Returns:
+            SimulationResult with level counts and one page of nodes
+        '''
+        tree = self._setup(params)
+
+        parent = [int(option) for option in params.get('parent', [])]
+        level = params.get('level', min(len(parent) + 1, tree.steps))
+        page_size = params.get('page_size', DEFAULT_PAGE_SIZE)
+        self._check_path(parent, tree)
+        self.validate_params(
+            {'level': level, 'page_size': page_size},
+            {'level': (len(parent), tree.steps), 'page_size': (1, MAX_PAGE_SIZE)}
+        )
+        cursor = self._parse_cursor(params.get('cursor'))
+
+        in_level = self._completions(parent, level, tree)
+        nodes = []
+        if cursor < in_level:
+            first = self._unrank(parent, level, cursor, tree)
+            for path in itertools.islice(self._walk(first, len(parent), tree), page_size):
+                nodes.append({
+                    'path': path,
+                    'outcomes': _json_count(self._completions(path, tree.steps, tree))
+                })
+        end = cursor + len(nodes)
+
+        level_counts = [self._completions([], depth, tree) for depth in range(tree.steps + 1)]
+        total = level_counts[-1]
+
+        return SimulationResult(
+            meta={
+                'simulation': 'outcome_tree',
+                'mode': tree.mode,
+                'steps': tree.steps,
+                'choices_per_step': tree.choices,
+                'parent': parent,
+                'level': level,
+                'cursor': str(cursor),
+                'next_cursor': str(end) if end < in_level else None,
+                'nodes_in_level': _json_count(in_level)
+            },
+            series={
+                'level_counts': np.array(level_counts, dtype=float),
+                'nodes': nodes
+            },
+            metrics={
+                'total_outcomes': _json_count(total),
+                'total_outcomes_exact': str(total),
+                'log10_total_outcomes': round(self._log10_count(tree), 6),
+                'formula': self._formula(tree),
+                'probability_each_outcome': 1 / total
+            }
+        )
+
+    def _setup(self, params: Dict[str, Any]) -> Tree:
+        '''Extract and validate the tree shape.'''
+        steps = params.get('steps', 3)
+        self.validate_params({'steps': steps}, {'steps': (1, MAX_STEPS)})
+        steps = int(steps)
+
+        choices = params.get('choicesPerStep', 2)
+        if isinstance(choices, (int, float)):
+            choices = [choices] * steps
+        if not isinstance(choices, list):
+            raise ValueError("choicesPerStep must be a number or a list with one entry per step")
+        if len(choices) != steps:
+            raise ValueError(f"choicesPerStep must have one entry per step ({steps}), got {len(choices)}")
+        for count in choices:
+            self.validate_params({'choicesPerStep': count}, {'choicesPerStep': (1, MAX_CHOICES)})
+        choices = [int(count) for count in choices]
+
+        mode = MODES[(bool(params.get('orderMatters', True)), bool(params.get('noRepeats', False)))]
+        if mode in ('permutation', 'combination') and steps > max(choices):
+            raise ValueError(
+                f"Without repeats steps cannot exceed the {max(choices)} available options, got {steps}"
+            )
+
+        return Tree(steps, choices, max(choices), mode)
+
+    def _parse_cursor(self, cursor: Any) -> int:
+        '''Rank of the first node of the page (cursors are decimal strings).'''
+        if cursor is None:
+            return 0
+        try:
+            rank = int(cursor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        if rank < 0:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        return rank
+
+    def _options(self, path: List[int], tree: Tree) -> Iterator[int]:
+        '''Options for the step after path that lead to an outcome, in increasing order.'''
+        if tree.mode == 'product':
+            return iter(range(tree.choices[len(path)]))
+        if tree.mode == 'permutation':
+            used = set(path)
+            return (option for option in range(tree.pool) if option not in used)
+        if tree.mode == 'combination':
+            # Leave enough larger options for the remaining steps
+            return iter(range(path[-1] + 1 if path else 0, tree.pool - (tree.steps - len(path) - 1)))
+        return iter(range(path[-1] if path else 0, tree.pool))
+
+    def _completions(self, path: List[int], depth: int, tree: Tree) -> int:
+        '''Number of nodes at depth below path (closed form).'''
+        remaining = depth - len(path)
+        if tree.mode == 'product':
+            return math.prod(tree.choices[len(path):depth])
+        if tree.mode == 'permutation':
+            return math.perm(tree.pool - len(path), remaining)
+        if tree.mode == 'combination':
+            # Nodes at depth must leave steps - depth larger options unused
+            largest = tree.pool - 1 - (tree.steps - depth)
+            return math.comb(max(largest - (path[-1] if path else -1), 0), remaining)
+        return math.comb(tree.pool - (path[-1] if path else 0) + remaining - 1, remaining)
+
+    def _check_path(self, path: List[int], tree: Tree) -> None:
+        '''Raise ValueError unless path is a node of the tree.'''
+        if len(path) > tree.steps:
+            raise ValueError(f"parent cannot be deeper than steps ({tree.steps})")
+        for depth, option in enumerate(path):
+            if option not in self._options(path[:depth], tree):
+                raise ValueError(f"parent is not a node of the tree: {path}")
+
+    def _unrank(self, prefix: List[int], depth: int, rank: int, tree: Tree) -> List[int]:
+        '''
+        Node at depth with the given rank among the descendants of prefix.
+
+        Under the product and permutation rules every option of a step has
+        the same number of completions, so each step is one division;
+        otherwise options are skipped by their completion counts.
+        '''
+        path = list(prefix)
+        while len(path) < depth:
+            options = self._options(path, tree)
+            if tree.mode in ('product', 'permutation'):
+                first = next(options)
+                index, rank = divmod(rank, self._completions(path + [first], depth, tree))
+                path.append(first if index == 0 else next(itertools.islice(options, index - 1, None)))
+                continue
+            for option in options:
+                block = self._completions(path + [option], depth, tree)
+                if rank < block:
+                    path.append(option)
+                    break
+                rank -= block
+        return path
+
+    def _walk(self, path: List[int], fixed: int, tree: Tree) -> Iterator[List[int]]:
+        '''
+        Yield path and the nodes after it at the same depth, in order.
+
+        The first `fixed` options (the parent) are kept; each successor
+        advances the deepest step that has a larger option and restarts
+        the steps below it at their first node.
+        '''
+        depth = len(path)
+        next_path: Optional[List[int]] = path
+        while next_path is not None:
+            path, next_path = next_path, None
+            yield path
+            for position in range(depth - 1, fixed - 1, -1):
+                head = path[:position]
+                option = next((o for o in self._options(head, tree) if o > path[position]), None)
+                if option is not None:
+                    next_path = self._unrank(head + [option], depth, 0, tree)
+                    break
+
+    def _log10_count(self, tree: Tree) -> float:
+        '''log10 of the outcome count from the log-factorial table.'''
+        n, k = tree.pool, tree.steps
+        if tree.mode == 'product':
+            return float(np.log10(tree.choices).sum())
+        log_fact = tables.log_factorials(n + k)
+        if tree.mode == 'permutation':
+            ln_count = log_fact[n] - log_fact[n - k]
+        elif tree.mode == 'combination':
+            ln_count = log_fact[n] - log_fact[k] - log_fact[n - k]
+        else:
+            ln_count = log_fact[n + k - 1] - log_fact[k] - log_fact[n - 1]
+        return float(ln_count / np.log(10))
+
+    def _formula(self, tree: Tree) -> str:
+        '''Human-readable counting rule.'''
+        n, k = tree.pool, tree.steps
+        if tree.mode == 'product':
+            return ' × '.join(str(count) for count in tree.choices)
+        if tree.mode == 'permutation':
+            return f'P({n}, {k}) = {n}! / {n - k}!'
+        if tree.mode == 'combination':
+            return f'C({n}, {k}) = {n}! / ({k}! · {n - k}!)'
+        return f'C({n + k - 1}, {k}) = {n + k - 1}! / ({k}! · {n - 1}!)'
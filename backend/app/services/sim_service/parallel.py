@@ -0,0 +1,132 @@
+'''
+Sharded Simulation Runs
+
+Splits a large run into settings.SIMULATION_SHARDS shards, each with its
+own child of np.random.SeedSequence(seed), and merges the shard results
+in shard order.
+
+The shard count and shard seeds depend only on the parameters, never on
+how many workers execute them, so a seeded run gives the same result on
+one core or many.
+'''
+
+import time
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.sim_service.registry import (
+    create_simulation,
+    resolve_sim_type,
+    supports_sharding,
+)
+
+
+def split_trials(total: int, shards: int) -> List[int]:
+    '''Split total into at most `shards` near-equal, positive parts.'''
+    shards = max(1, min(shards, total))
+    base, extra = divmod(total, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def should_shard(sim_type: str, params: Dict[str, Any]) -> bool:
+    '''
+    Decide whether a run is split into shards.
+
+    An explicit `parallel` parameter wins; otherwise runs with at least
+    settings.SIMULATION_PARALLEL_MIN_TRIALS work units are sharded, as
+    counted by the engine's shard_work() (e.g. num_samples * sample_size
+    for clt, trials * draws for bag_draw). shard_total() only decides
+    how the run is split.
+    '''
+    key = resolve_sim_type(sim_type)
+    if key is None or not supports_sharding(key):
+        return False
+    if params.get('parallel') is not None:
+        return bool(params['parallel'])
+    try:
+        work = create_simulation(key).shard_work(params)
+    except (ValueError, TypeError):
+        # Invalid parameters are reported by the regular run
+        return False
+    return work >= settings.SIMULATION_PARALLEL_MIN_TRIALS
+
+
+def plan_shards(
+    sim_type: str, params: Dict[str, Any]
+) -> List[Tuple[Dict[str, Any], np.random.SeedSequence]]:
+    '''
+    Build the (shard params, shard seed) pairs for a run.
+
+    Raises:
+        ValueError: If the parameters are invalid
+    '''
+    simulation = create_simulation(sim_type)
+    sizes = split_trials(simulation.shard_total(params), settings.SIMULATION_SHARDS)
+    seeds = np.random.SeedSequence(params.get('seed')).spawn(len(sizes))
+    return [
+        ({**params, simulation.SHARD_PARAM: size}, seed)
+        for size, seed in zip(sizes, seeds)
+    ]
+
+
+def run_shard(
+    sim_type: str,
+    params: Dict[str, Any],
+    seed: np.random.SeedSequence,
+    deadline: Optional[float] = None
+) -> Any:
+    '''
+    Run one shard.
+
+    This is the entry point executed inside pool workers, so it must
+    stay a module-level function with picklable arguments and result.
+
+    Args:
+        sim_type: Registry key of the simulation
+        params: Shard parameters (from plan_shards)
+        seed: Shard seed (from plan_shards)
+        deadline: time.monotonic() value at which the shard should stop
+            early, shared by all shards of the run (None for no deadline)
+    '''
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    return create_simulation(sim_type, seed=seed, timeout=timeout).run_shard(params)
+
+
+def merge_shards(sim_type: str, params: Dict[str, Any], parts: List[Any]) -> Dict[str, Any]:
+    '''Merge shard results, in shard order, into a SimulationResult dict.'''
+    return create_simulation(sim_type).merge_shards(params, parts).model_dump()
+
+
+def run_sharded(
+    sim_type: str,
+    params: Dict[str, Any],
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    '''
+    Run a simulation as shards, on an executor or serially.
+
+    Args:
+        sim_type: Registry key or content simType alias
+        params: Simulation parameters
+        executor: Executor to run the shards on (None to run in-process)
+        timeout: Cooperative time budget in seconds for the whole run
+
+    Returns:
+        SimulationResult as a plain dict
+    '''
+    key = resolve_sim_type(sim_type)
+    if key is None or not supports_sharding(key):
+        raise KeyError(f"Sharding not available for: {sim_type}")
+
+    shards = plan_shards(key, params)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if executor is None:
+        parts = [run_shard(key, shard, seed, deadline) for shard, seed in shards]
+    else:
+        futures = [executor.submit(run_shard, key, shard, seed, deadline) for shard, seed in shards]
+        parts = [future.result() for future in futures]
+    return merge_shards(key, params, parts)
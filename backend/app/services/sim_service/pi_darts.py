@@ -5,12 +5,26 @@ Estimates π by throwing random darts at a square containing a circle.
 '''
 
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, lttb
 from app.core.config import settings
 
 
+# Default batch size in streaming mode (one partial result per batch)
+STREAM_BATCH_SIZE = 10000
+
+# Work-buffer bytes per dart: float32 x + float32 y + bool mask
+BYTES_PER_DART = 4 + 4 + 1
+
+# Log-spaced checkpoints recorded along the convergence path
+PATH_POINTS = 1000
+
+# Default points in series.running_estimates (downsampled with LTTB)
+RUNNING_ESTIMATE_POINTS = 200
+
+
 class PiDartsSimulation(BaseSimulation):
     '''
     Monte Carlo simulation to estimate π.
@@ -25,6 +39,9 @@ class PiDartsSimulation(BaseSimulation):
         - Therefore: π ≈ 4 * (points inside / total points)
     '''
     
+    # Trial-count parameter split across shards (see parallel.py)
+    SHARD_PARAM = 'trials'
+    
     def run(self, params: Dict[str, Any]) -> SimulationResult:
         '''
         Run Pi estimation simulation.
@@ -33,64 +50,315 @@ class PiDartsSimulation(BaseSimulation):
             params:
                 - trials: Number of darts to throw (default 10000)
                 - batch_size: Process in batches for memory efficiency
-                
+                - max_points / max_bytes: Series budget (see downsample.py)
+        
         Returns:
             SimulationResult with:
                 - meta: Simulation parameters
-                - series: Running estimates over time
+                - series: Running estimates over the whole run
                 - metrics: Final π estimate and statistics
         '''
-        # Extract and validate parameters
+        trials, batch_size = self._setup(params)
+        thrown = self._throw(trials, batch_size)
+        running_estimates = self._running_estimates(
+            params, thrown['path_n'], thrown['path_inside'], thrown['completed'], thrown['inside']
+        )
+        return self._result(
+            params, trials, thrown['completed'], thrown['inside'],
+            running_estimates, thrown['sample_points']
+        )
+    
+    def run_shard(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        '''
+        Throw one shard of a sharded run (see parallel.run_sharded).
+        
+        Returns:
+            Dict with the shard's dart and inside counts, its convergence
+            path checkpoints and the sample points of its first batch
+        '''
+        return self._throw(*self._setup(params))
+    
+    def merge_shards(self, params: Dict[str, Any], parts: List[Dict[str, Any]]) -> SimulationResult:
+        '''Add up shard counts, in shard order, into one result.'''
+        trials = self.shard_total(params)
+        
+        inside_count = 0
+        completed = 0
+        path_n, path_inside = [], []
+        for part in parts:
+            # Shard paths are relative to the shard; offset by the shards before it
+            path_n.append(completed + part['path_n'])
+            path_inside.append(inside_count + part['path_inside'])
+            completed += part['completed']
+            inside_count += part['inside']
+        
+        running_estimates = self._running_estimates(
+            params, np.concatenate(path_n), np.concatenate(path_inside), completed, inside_count
+        )
+        return self._result(
+            params, trials, completed, inside_count, running_estimates, parts[0]['sample_points']
+        )
+    
+    def shard_total(self, params: Dict[str, Any]) -> int:
+        '''Validate params and return the trial count to split into shards.'''
+        return self._setup(params)[0]
+    
+    def iter_run(self, params: Dict[str, Any]) -> Iterator[SimulationResult]:
+        '''
+        Run Pi estimation, yielding a partial result after every batch.
+        
+        Only the running counts are kept between batches, so memory use
+        does not grow with the number of trials.
+        
+        Args:
+            params: Same as run(); batch_size defaults to STREAM_BATCH_SIZE
+        
+        Yields:
+            SimulationResult with the estimate and CI after each batch.
+            If the deadline stops the run early, a last snapshot repeats
+            the final estimate with meta.done and meta.partial set.
+        '''
         trials = params.get('trials', 10000)
-        batch_size = params.get('batch_size', min(trials, 100000))
+        batch_size = params.get('batch_size')
+        self._validate(trials, batch_size)
+        if batch_size is None:
+            batch_size = min(trials, STREAM_BATCH_SIZE)
         
-        # Validate
-        self.validate_params(
-            {'trials': trials},
-            {'trials': (1, settings.MAX_SIMULATION_TRIALS)}
+        inside_count = 0
+        completed = 0
+        for batch_end, batch_inside, points, _ in self._throw_batches(trials, batch_size):
+            inside_count += batch_inside
+            completed = batch_end
+            yield self._snapshot(params, trials, completed, inside_count, points, batch_end == trials)
+        
+        # Stopped at the deadline: mark the stream finished, as run() would
+        if completed < trials:
+            yield self._snapshot(params, trials, completed, inside_count, [], True)
+    
+    def _snapshot(
+        self,
+        params: Dict[str, Any],
+        trials: int,
+        completed: int,
+        inside_count: int,
+        sample_points: List[Dict[str, Any]],
+        done: bool
+    ) -> SimulationResult:
+        '''Build one streamed partial result from the running counts'''
+        pi_estimate = 4.0 * inside_count / completed
+        return SimulationResult(
+            meta={
+                'simulation': 'pi_darts',
+                'trials': trials,
+                'trials_completed': completed,
+                'partial': done and completed < trials,
+                'seed': params.get('seed'),
+                'done': done
+            },
+            series={
+                'estimate_point': {
+                    'n': completed,
+                    'estimate': pi_estimate,
+                    'error': abs(pi_estimate - np.pi)
+                },
+                'sample_points': sample_points
+            },
+            metrics=self._metrics(inside_count, completed)
+        )
+    
+    def _path_points(self, trials: int) -> np.ndarray:
+        '''Log-spaced dart counts at which the convergence path is recorded'''
+        return np.unique(np.round(np.geomspace(1, trials, min(PATH_POINTS, trials))).astype(np.int64))
+    
+    def _running_estimates(
+        self,
+        params: Dict[str, Any],
+        path_n: np.ndarray,
+        path_inside: np.ndarray,
+        completed: int,
+        inside_count: int
+    ) -> List[Dict[str, Any]]:
+        '''
+        Downsample the convergence path to the series budget.
+        
+        LTTB runs on log(n), so the early, fast-moving part of the path
+        keeps as much detail as the long tail.
+        '''
+        # A run stopped at the deadline ends between checkpoints
+        if len(path_n) == 0 or path_n[-1] != completed:
+            path_n = np.append(path_n, completed)
+            path_inside = np.append(path_inside, inside_count)
+        
+        estimates = 4.0 * path_inside / path_n
+        keep = lttb(np.log(path_n), estimates, budget_points(
+            params, RUNNING_ESTIMATE_POINTS, num_series=2, values_per_point=3
+        ))
+        return [
+            {'n': int(path_n[i]), 'estimate': float(estimates[i]), 'error': float(abs(estimates[i] - np.pi))}
+            for i in keep
+        ]
+    
+    def _result(
+        self,
+        params: Dict[str, Any],
+        trials: int,
+        completed: int,
+        inside_count: int,
+        running_estimates: List[Dict[str, Any]],
+        sample_points: List[Dict[str, Any]]
+    ) -> SimulationResult:
+        '''Build the final result from the dart counts'''
+        return SimulationResult(
+            meta={
+                'simulation': 'pi_darts',
+                'trials': trials,
+                'trials_completed': completed,
+                'partial': completed < trials,
+                'seed': params.get('seed')
+            },
+            series={
+                'running_estimates': running_estimates,
+                'sample_points': sample_points[:budget_points(  # For scatter plot
+                    params, len(sample_points), num_series=2, values_per_point=3
+                )]
+            },
+            metrics=self._metrics(inside_count, completed)
         )
+    
+    def _setup(self, params: Dict[str, Any]) -> Tuple[int, int]:
+        '''
+        Extract and validate parameters.
+        
+        Returns:
+            (trials, batch_size)
+        '''
+        trials = params.get('trials', 10000)
+        batch_size = params.get('batch_size')
+        self._validate(trials, batch_size)
+        if batch_size is None:
+            batch_size = min(trials, 100000)
+        return trials, batch_size
+    
+    def _throw(self, trials: int, batch_size: int) -> Dict[str, Any]:
+        '''
+        Throw all darts, recording the convergence path.
         
-        # Initialize results
+        Returns:
+            Dict with the darts thrown ('completed', fewer than trials if
+            the deadline passed), the darts inside, the path checkpoints
+            ('path_n', 'path_inside') and the sample points of the first
+            batch
+        '''
         inside_count = 0
-        running_estimates = []
-        sample_points = []  # Store some points for visualization
+        completed = 0
+        path_n, path_inside = [], []  # Convergence path checkpoints
+        sample_points: List[Dict[str, Any]] = []  # Store some points for visualization
+        
+        batches = self._throw_batches(trials, batch_size, self._path_points(trials))
+        for batch_end, batch_inside, points, (batch_path_n, batch_path_inside) in batches:
+            path_n.append(batch_path_n)
+            path_inside.append(inside_count + batch_path_inside)
+            inside_count += batch_inside
+            completed = batch_end
+            if points:
+                sample_points = points
+        
+        return {
+            'completed': completed,
+            'inside': inside_count,
+            'path_n': np.concatenate(path_n),
+            'path_inside': np.concatenate(path_inside),
+            'sample_points': sample_points
+        }
+    
+    def _validate(self, trials: int, batch_size: Optional[int] = None) -> None:
+        '''Validate trial and batch counts (None for the default batch size)'''
+        values = {'trials': trials} if batch_size is None else {'trials': trials, 'batch_size': batch_size}
+        self.validate_params(
+            values,
+            {'trials': (1, settings.MAX_SIMULATION_TRIALS),
+             'batch_size': (1, settings.MAX_SIMULATION_TRIALS)}
+        )
+    
+    def _throw_batches(
+        self, trials: int, batch_size: int, path: Optional[np.ndarray] = None
+    ) -> Iterator[Tuple[int, int, List[Dict[str, Any]], Tuple[np.ndarray, np.ndarray]]]:
+        '''
+        Throw darts in batches for memory efficiency.
+        
+        Work buffers are allocated once per run and reused for every
+        batch, so peak memory is fixed by the batch size, which is capped
+        by settings.SIMULATION_MEMORY_BUDGET_BYTES. Stops early (after at
+        least one batch) once the run deadline has passed.
+        
+        Args:
+            trials: Number of darts to throw
+            batch_size: Darts per batch
+            path: Sorted dart counts at which to record the inside count
+        
+        Yields:
+            (darts thrown so far, darts inside in this batch,
+             sample points for the first batch or an empty list,
+             (path dart counts in this batch, inside count within this
+              batch at each of them))
+        '''
+        path = np.empty(0, dtype=np.int64) if path is None else path
+        
+        max_batch = max(1, settings.SIMULATION_MEMORY_BUDGET_BYTES // BYTES_PER_DART)
+        batch_size = min(batch_size, max_batch, trials)
+        
+        # Preallocate work buffers once per run
+        x_buf = np.empty(batch_size, dtype=np.float32)
+        y_buf = np.empty(batch_size, dtype=np.float32)
+        mask_buf = np.empty(batch_size, dtype=bool)
         
-        # Process in batches for memory efficiency
         for batch_start in range(0, trials, batch_size):
+            self.report_progress(batch_start, trials)
+            if batch_start > 0 and self.expired():
+                return
             batch_end = min(batch_start + batch_size, trials)
             batch_trials = batch_end - batch_start
+            x = x_buf[:batch_trials]
+            y = y_buf[:batch_trials]
+            mask = mask_buf[:batch_trials]
             
-            # Generate random points in unit square
-            # Using single allocation and in-place operations
-            x = self.rng.random(batch_trials, dtype=np.float32)
-            y = self.rng.random(batch_trials, dtype=np.float32)
-            
-            # Calculate distance from origin (in-place for memory efficiency)
-            # r² = x² + y²
-            r_squared = x * x + y * y
-            
-            # Count points inside unit circle (r² ≤ 1)
-            batch_inside = np.sum(r_squared <= 1.0)
-            inside_count += batch_inside
+            # Generate random points in unit square directly into the buffers
+            self.rng.random(out=x, dtype=np.float32)
+            self.rng.random(out=y, dtype=np.float32)
             
             # Store sample points for visualization (first batch only)
+            sample_points = []
             if batch_start == 0 and batch_trials <= 1000:
                 sample_points = [
-                    {'x': float(x[i]), 'y': float(y[i]), 
-                     'inside': bool(r_squared[i] <= 1.0)}
+                    {'x': float(x[i]), 'y': float(y[i]),
+                     'inside': bool(x[i] * x[i] + y[i] * y[i] <= 1.0)}
                     for i in range(min(100, batch_trials))
                 ]
             
-            # Calculate running estimate every 1000 points
-            if (batch_end % 1000 == 0) or (batch_end == trials):
-                pi_estimate = 4.0 * inside_count / batch_end
-                running_estimates.append({
-                    'n': batch_end,
-                    'estimate': pi_estimate,
-                    'error': abs(pi_estimate - np.pi)
-                })
-        
-        # Final calculation
+            # r² = x² + y², computed in place in x
+            np.multiply(x, x, out=x)
+            np.multiply(y, y, out=y)
+            np.add(x, y, out=x)
+            
+            # Count points inside unit circle (r² ≤ 1)
+            np.less_equal(x, 1.0, out=mask)
+            batch_inside = int(np.count_nonzero(mask))
+            
+            # Inside counts at the path checkpoints falling in this batch
+            lo, hi = np.searchsorted(path, [batch_start + 1, batch_end + 1])
+            batch_path = path[lo:hi]
+            batch_path_inside = np.empty(0, dtype=np.int64)
+            if len(batch_path):
+                offsets = batch_path - batch_start
+                segments = np.add.reduceat(
+                    mask[:offsets[-1]], np.r_[0, offsets[:-1]], dtype=np.int64
+                )
+                batch_path_inside = np.cumsum(segments)
+            
+            yield batch_end, batch_inside, sample_points, (batch_path, batch_path_inside)
+    
+    def _metrics(self, inside_count: int, trials: int) -> Dict[str, Any]:
+        '''Compute π estimate, error and 95% CI from the dart counts'''
         final_pi = 4.0 * inside_count / trials
         error = abs(final_pi - np.pi)
         relative_error = error / np.pi * 100
@@ -101,27 +369,16 @@ class PiDartsSimulation(BaseSimulation):
         se = np.sqrt(p * (1 - p) / trials)
         ci_95 = (4 * (p - 1.96 * se), 4 * (p + 1.96 * se))
         
-        return SimulationResult(
-            meta={
-                'simulation': 'pi_darts',
-                'trials': trials,
-                'seed': params.get('seed')
-            },
-            series={
-                'running_estimates': running_estimates[-50:],  # Last 50 points
-                'sample_points': sample_points  # For scatter plot
-            },
-            metrics={
-                'pi_estimate': round(final_pi, 6),
-                'actual_pi': round(np.pi, 6),
-                'absolute_error': round(error, 6),
-                'relative_error_pct': round(relative_error, 4),
-                'points_inside': inside_count,
-                'points_total': trials,
-                'proportion_inside': round(inside_count / trials, 6),
-                'confidence_interval_95': {
-                    'lower': round(ci_95[0], 6),
-                    'upper': round(ci_95[1], 6)
-                }
+        return {
+            'pi_estimate': round(final_pi, 6),
+            'actual_pi': round(np.pi, 6),
+            'absolute_error': round(error, 6),
+            'relative_error_pct': round(relative_error, 4),
+            'points_inside': inside_count,
+            'points_total': trials,
+            'proportion_inside': round(inside_count / trials, 6),
+            'confidence_interval_95': {
+                'lower': round(ci_95[0], 6),
+                'upper': round(ci_95[1], 6)
             }
-        )
+        }
@@ -0,0 +1,186 @@
+'''
+Simulation Registry
+
+Maps simulation type names to their BaseSimulation implementations.
+'''
+
+import importlib
+import os
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional, Type, Union
+
+import numpy as np
+
+from app.services.sim_service.base import BaseSimulation
+
+
+# Simulation type -> 'module:Class' of its implementation. Engines are
+# imported on first use (see get_simulation_class), so importing the
+# registry does not pull scipy, pandas and every engine into the web
+# process; the pool workers import them during warm_up().
+SIMULATIONS: Dict[str, str] = {
+    'coin_flipper': 'app.services.sim_service.coin_flip:CoinFlipSimulation',
+    'pi_darts': 'app.services.sim_service.pi_darts:PiDartsSimulation',
+    'clt': 'app.services.sim_service.clt_machine:CLTSimulation',
+    'bag_draw': 'app.services.sim_service.bag_draw:BagDrawSimulation',
+    'binomial_bars': 'app.services.sim_service.binomial_bars:BinomialBarsSimulation',
+    'arrival_simulator': 'app.services.sim_service.arrival_simulator:PoissonArrivalSimulation',
+    'outcome_tree': 'app.services.sim_service.outcome_tree:OutcomeTreeSimulation',
+    'contingency_table': 'app.services.sim_service.contingency_table:ContingencyTableSimulation',
+    'distribution_table': 'app.services.sim_service.distribution_table:DistributionTableSimulation',
+    'resampling': 'app.services.sim_service.resampling:ResamplingSimulation',
+    't_test_one_sample': 'app.services.sim_service.t_test_one_sample:OneSampleTTestSimulation',
+    'z_test_prop': 'app.services.sim_service.z_test_prop:ZTestProportionSimulation',
+    'power_planner': 'app.services.sim_service.power_planner:PowerPlanner',
+}
+
+# Simulations implementing run_batch() / run_shard() / an incremental
+# iter_run(); kept here so the web process can route requests without
+# importing the engines
+BATCH_SIM_TYPES = {'t_test_one_sample', 'z_test_prop'}
+SHARDED_SIM_TYPES = {'pi_darts', 'clt', 'bag_draw', 'binomial_bars'}
+STREAM_SIM_TYPES = {'pi_darts', 'arrival_simulator'}
+
+# Simulations whose output depends only on their parameters (no RNG)
+ANALYTIC_SIM_TYPES = {'t_test_one_sample', 'z_test_prop', 'power_planner', 'outcome_tree'}
+
+# simType names used in content SimConfig.json / sim-hub.registry.json
+SIM_TYPE_ALIASES: Dict[str, str] = {
+    'coinFlipper': 'coin_flipper',
+    'bagDraw': 'bag_draw',
+    'binomialBars': 'binomial_bars',
+    'arrivalSimulator': 'arrival_simulator',
+    'outcomeTree': 'outcome_tree',
+    'contingencyPlayground': 'contingency_table',
+    'twoByTwoToggle': 'contingency_table',
+    'distributionTable': 'distribution_table',
+}
+
+
+# Parameters of the tiny warm-up run of each simulation; types not listed
+# run with their defaults (plus a seed), None only imports the engine
+WARM_UP_PARAMS: Dict[str, Optional[Dict[str, Any]]] = {
+    't_test_one_sample': {'data': [1.0, 2.0, 3.0, 4.0]},
+    # Needs an uploaded dataset
+    'resampling': None,
+}
+
+
+def resolve_sim_type(sim_type: str) -> Optional[str]:
+    '''
+    Normalize a simulation type name.
+
+    Args:
+        sim_type: Registry key or content simType alias
+
+    Returns:
+        Registry key, or None if the type is unknown
+    '''
+    sim_type = SIM_TYPE_ALIASES.get(sim_type, sim_type)
+    return sim_type if sim_type in SIMULATIONS else None
+
+
+def available_sim_types() -> List[str]:
+    '''List all registered simulation types.'''
+    return list(SIMULATIONS)
+
+
+@lru_cache(maxsize=None)
+def get_simulation_class(sim_type: str) -> Type[BaseSimulation]:
+    '''
+    Import (once) and return the implementation of a simulation type.
+
+    Args:
+        sim_type: Registry key or content simType alias
+
+    Raises:
+        KeyError: If the simulation type is unknown
+    '''
+    key = resolve_sim_type(sim_type)
+    if key is None:
+        raise KeyError(f"Unknown simulation type: {sim_type}")
+    module_name, class_name = SIMULATIONS[key].split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_simulation(
+    sim_type: str,
+    seed: Union[int, np.random.SeedSequence, None] = None,
+    timeout: Optional[float] = None,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> BaseSimulation:
+    '''
+    Build a simulation instance for the given type.
+
+    Args:
+        sim_type: Registry key or content simType alias
+        seed: Random seed (or SeedSequence) for reproducibility
+        timeout: Cooperative time budget in seconds (None for no deadline)
+        progress: Callback receiving (completed, total) between batches
+
+    Raises:
+        KeyError: If the simulation type is unknown
+    '''
+    return get_simulation_class(sim_type)(seed=seed, timeout=timeout, progress=progress)
+
+
+def run_simulation(
+    sim_type: str,
+    params: Dict[str, Any],
+    timeout: Optional[float] = None,
+    method: str = 'run'
+) -> Dict[str, Any]:
+    '''
+    Build and run a simulation, returning a plain dict.
+
+    This is the entry point executed inside pool workers, so it must
+    stay a module-level function with picklable arguments and result.
+
+    Args:
+        sim_type: Registry key or content simType alias
+        params: Simulation parameters
+        timeout: Cooperative time budget in seconds
+        method: Simulation method to call ('run' or 'run_batch')
+    '''
+    simulation = create_simulation(sim_type, seed=params.get('seed'), timeout=timeout)
+    return getattr(simulation, method)(params).model_dump()
+
+
+def supports_batch(sim_type: str) -> bool:
+    '''Check whether a simulation type implements run_batch().'''
+    key = resolve_sim_type(sim_type)
+    return key in BATCH_SIM_TYPES
+
+
+def supports_streaming(sim_type: str) -> bool:
+    '''Check whether a simulation type yields partial results from iter_run().'''
+    key = resolve_sim_type(sim_type)
+    return key in STREAM_SIM_TYPES
+
+
+def supports_sharding(sim_type: str) -> bool:
+    '''Check whether a simulation type can split its trials into shards.'''
+    key = resolve_sim_type(sim_type)
+    return key in SHARDED_SIM_TYPES
+
+
+def warm_up() -> Dict[str, Any]:
+    '''
+    Import every engine and run each simulation once with tiny parameters.
+
+    Executed inside each pool worker at startup, so the first real request
+    does not pay for importing scipy, building lru_cached tables or numpy
+    first-call setup.
+
+    Returns:
+        Dict with the worker pid and the simulation types that ran
+    '''
+    ran = []
+    for sim_type in SIMULATIONS:
+        get_simulation_class(sim_type)
+        params = WARM_UP_PARAMS.get(sim_type, {})
+        if params is None:
+            continue
+        run_simulation(sim_type, {**params, 'seed': 0})
+        ran.append(sim_type)
+    return {'pid': os.getpid(), 'sim_types': ran}
@@ -0,0 +1,222 @@
+'''
+Resampling Simulation
+
+Bootstrap and permutation distributions of a statistic over uploaded
+dataset columns.
+'''
+
+import numpy as np
+from typing import Dict, Any, Tuple
+
+from app.services.sim_service import datasets
+from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points
+from app.core.config import settings
+
+
+METHODS = ('bootstrap', 'permutation')
+STATISTICS = ('mean', 'median', 'std')
+
+# Bins of the resampling distribution without a series budget
+HISTOGRAM_BINS = 50
+
+# Work-buffer bytes per resampled element: int32 index, gathered float64
+# value and the float64 copy np.median partitions
+BYTES_PER_ELEMENT = 20
+
+
+def _statistic(values: np.ndarray, statistic: str) -> np.ndarray:
+    '''Statistic of each row of a (resamples, n) matrix (or of a 1-D sample).'''
+    if statistic == 'mean':
+        return values.mean(axis=-1)
+    if statistic == 'median':
+        return np.median(values, axis=-1)
+    return values.std(axis=-1, ddof=1)
+
+
+class ResamplingSimulation(BaseSimulation):
+    '''
+    Bootstrap and permutation tests on dataset columns.
+
+    Columns are memory-mapped float64 arrays (see datasets.py). Resamples
+    are generated as batched index matrices, gathered from the column and
+    reduced row-wise to one statistic each, with the batch size chosen so
+    a batch stays within settings.SIMULATION_MEMORY_BUDGET_BYTES (at
+    least one resample per batch). Only the statistics are kept, so
+    memory does not grow with the number of resamples.
+
+    Math:
+        - Bootstrap: θ*ᵦ = θ(x[I]) with I ~ Uniform{0..n-1}ⁿ;
+          percentile CI from the quantiles of θ*, SE = sd(θ*)
+        - Permutation: pool x and y, shuffle, split into sizes nₓ, nᵧ;
+          p = (1 + #{|θ*ᵦ| ≥ |θ_obs|}) / (1 + B)
+    '''
+
+    def run(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run resampling simulation.
+
+        Args:
+            params:
+                - dataset_id: Uploaded dataset (see datasets.save_upload)
+                - column: Numeric column to resample
+                - method: 'bootstrap' (default) or 'permutation'
+                - column_b: Second group's column (permutation only)
+                - dataset_id_b: Dataset of column_b (default dataset_id)
+                - statistic: 'mean' (default), 'median' or 'std'; the
+                  permutation test compares statistic(x) - statistic(y)
+                - resamples: Number of resamples B (default 1000)
+                - confidence: Bootstrap interval level (default 0.95)
+                - max_points / max_bytes: Series budget (see downsample.py)
+
+        Returns:
+            SimulationResult with the resampling distribution
+        '''
+        method, statistic, resamples, confidence = self._setup(params)
+        x = datasets.load_column(params.get('dataset_id'), params.get('column'))
+
+        if method == 'bootstrap':
+            self._check_size(len(x))
+            observed = float(_statistic(np.asarray(x), statistic))
+            replicates = self._bootstrap(x, statistic, resamples)
+            y = None
+        else:
+            y = datasets.load_column(params.get('dataset_id_b', params.get('dataset_id')), params.get('column_b'))
+            self._check_size(len(x) + len(y))
+            observed = float(_statistic(np.asarray(x), statistic) - _statistic(np.asarray(y), statistic))
+            replicates = self._permutation(x, y, statistic, resamples)
+
+        return self._result(params, method, statistic, resamples, confidence, x, y, observed, replicates)
+
+    def _setup(self, params: Dict[str, Any]) -> Tuple[str, str, int, float]:
+        '''Extract and validate (method, statistic, resamples, confidence).'''
+        method = params.get('method', 'bootstrap')
+        statistic = params.get('statistic', 'mean')
+        resamples = params.get('resamples', 1000)
+        confidence = params.get('confidence', 0.95)
+
+        if method not in METHODS:
+            raise ValueError(f"Method must be one of {', '.join(METHODS)}")
+        if statistic not in STATISTICS:
+            raise ValueError(f"Statistic must be one of {', '.join(STATISTICS)}")
+        self.validate_params(
+            {'resamples': resamples, 'confidence': confidence},
+            {'resamples': (1, settings.MAX_SIMULATION_REPLICATES),
+             'confidence': (0.5, 0.999)}
+        )
+        if method == 'permutation' and not params.get('column_b'):
+            raise ValueError("Permutation tests need column_b for the second group")
+
+        return method, statistic, int(resamples), float(confidence)
+
+    def _check_size(self, n: int) -> None:
+        if n < 2:
+            raise ValueError("Resampling needs at least 2 values")
+        if n > settings.MAX_SIMULATION_TRIALS:
+            raise ValueError(f"Resampling supports at most {settings.MAX_SIMULATION_TRIALS} values, got {n}")
+
+    def _batch_size(self, n: int, resamples: int) -> int:
+        '''Resamples per batch that fit the memory budget.'''
+        return min(resamples, max(1, settings.SIMULATION_MEMORY_BUDGET_BYTES // (n * BYTES_PER_ELEMENT)))
+
+    def _bootstrap(self, x: np.ndarray, statistic: str, resamples: int) -> np.ndarray:
+        '''
+        Bootstrap replicates of the statistic.
+
+        Stops early (after at least one batch) once the run deadline has
+        passed; the returned array then holds fewer than resamples values.
+        '''
+        n = len(x)
+        batch = self._batch_size(n, resamples)
+        replicates = []
+        for start in range(0, resamples, batch):
+            self.report_progress(start, resamples)
+            if start > 0 and self.expired():
+                break
+            indices = self.rng.integers(0, n, size=(min(batch, resamples - start), n), dtype=np.int32)
+            replicates.append(_statistic(x[indices], statistic))
+        return np.concatenate(replicates)
+
+    def _permutation(self, x: np.ndarray, y: np.ndarray, statistic: str, resamples: int) -> np.ndarray:
+        '''
+        Permutation replicates of statistic(x) - statistic(y).
+
+        Each row of the index matrix is an independent shuffle of the
+        pooled sample (rng.permuted along axis 1, in place); its first
+        len(x) entries form the first group. Same deadline behaviour as
+        _bootstrap().
+        '''
+        pooled = np.concatenate([x, y])
+        n, split = len(pooled), len(x)
+        batch = self._batch_size(n, resamples)
+        replicates = []
+        for start in range(0, resamples, batch):
+            self.report_progress(start, resamples)
+            if start > 0 and self.expired():
+                break
+            indices = np.tile(np.arange(n, dtype=np.int32), (min(batch, resamples - start), 1))
+            self.rng.permuted(indices, axis=1, out=indices)
+            values = pooled[indices]
+            replicates.append(
+                _statistic(values[:, :split], statistic) - _statistic(values[:, split:], statistic)
+            )
+        return np.concatenate(replicates)
+
+    def _result(
+        self,
+        params: Dict[str, Any],
+        method: str,
+        statistic: str,
+        resamples: int,
+        confidence: float,
+        x: np.ndarray,
+        y: Any,
+        observed: float,
+        replicates: np.ndarray
+    ) -> SimulationResult:
+        '''Build the resampling distribution and metrics.'''
+        completed = len(replicates)
+        bins = budget_points(params, HISTOGRAM_BINS, values_per_point=2)
+        counts, edges = np.histogram(replicates, bins=bins)
+
+        if method == 'bootstrap':
+            tail = (1 - confidence) / 2
+            low, high = np.quantile(replicates, [tail, 1 - tail])
+            metrics = {
+                'observed': round(observed, 6),
+                'standard_error': round(float(replicates.std(ddof=1)), 6) if completed > 1 else None,
+                'bias': round(float(replicates.mean()) - observed, 6),
+                'confidence_interval': [round(float(low), 6), round(float(high), 6)],
+                'confidence': confidence
+            }
+        else:
+            extreme = int(np.count_nonzero(np.abs(replicates) >= abs(observed)))
+            metrics = {
+                'observed_difference': round(observed, 6),
+                'p_value': round((1 + extreme) / (1 + completed), 6),
+                'null_std': round(float(replicates.std(ddof=1)), 6) if completed > 1 else None
+            }
+
+        return SimulationResult(
+            meta={
+                'simulation': 'resampling',
+                'method': method,
+                'statistic': statistic,
+                'dataset_id': params.get('dataset_id'),
+                'column': params.get('column'),
+                'column_b': params.get('column_b'),
+                'n': len(x),
+                'n_b': len(y) if y is not None else None,
+                'resamples': resamples,
+                'resamples_completed': completed,
+                'partial': completed < resamples,
+                'seed': params.get('seed')
+            },
+            series={
+                'distribution': {
+                    'edges': edges,
+                    'proportions': counts / completed
+                }
+            },
+            metrics=metrics
+        )
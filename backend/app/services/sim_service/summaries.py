@@ -0,0 +1,130 @@
+'''
+Mergeable Column Summaries
+
+Summaries of numeric columns that are computed chunk by chunk and
+merged, so a dataset is summarized in one streaming pass:
+    - count, mean and M2 (sum of squared deviations), merged with
+      Chan et al.'s parallel update
+    - min and max
+    - a quantile sketch of at most SKETCH_CENTROIDS weighted centroids;
+      merging concatenates centroids and regroups them into buckets of
+      equal weight, so quantile rank error stays around 1 / SKETCH_CENTROIDS
+
+Summaries are plain JSON-serializable dicts.
+'''
+
+import math
+from typing import Dict, Any, Iterable, Tuple
+
+import numpy as np
+
+
+# Max centroids kept by the quantile sketch
+SKETCH_CENTROIDS = 200
+
+
+def _compress(means: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''Group sorted centroids into at most SKETCH_CENTROIDS buckets of equal weight.'''
+    if len(means) <= SKETCH_CENTROIDS:
+        return means, weights
+    cumulative = np.cumsum(weights)
+    # Bucket of each centroid by the position of its midpoint
+    bucket = ((cumulative - weights / 2) / cumulative[-1] * SKETCH_CENTROIDS).astype(np.int64)
+    bucket = np.minimum(bucket, SKETCH_CENTROIDS - 1)
+    bucket_weights = np.bincount(bucket, weights=weights, minlength=SKETCH_CENTROIDS)
+    bucket_sums = np.bincount(bucket, weights=means * weights, minlength=SKETCH_CENTROIDS)
+    filled = bucket_weights > 0
+    return bucket_sums[filled] / bucket_weights[filled], bucket_weights[filled]
+
+
+def summarize(values: np.ndarray) -> Dict[str, Any]:
+    '''Summary of one chunk of finite values.'''
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    if len(values) == 0:
+        return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': None, 'max': None,
+                'sketch': {'means': [], 'weights': []}}
+
+    mean = float(values.mean())
+    means, weights = _compress(values, np.ones(len(values)))
+    return {
+        'count': len(values),
+        'mean': mean,
+        'm2': float(((values - mean) ** 2).sum()),
+        'min': float(values[0]),
+        'max': float(values[-1]),
+        'sketch': {'means': means.tolist(), 'weights': weights.tolist()}
+    }
+
+
+def merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    '''Summary of the union of the values summarized by a and b.'''
+    if a['count'] == 0:
+        return b
+    if b['count'] == 0:
+        return a
+
+    count = a['count'] + b['count']
+    delta = b['mean'] - a['mean']
+    means = np.concatenate([a['sketch']['means'], b['sketch']['means']])
+    weights = np.concatenate([a['sketch']['weights'], b['sketch']['weights']])
+    order = np.argsort(means, kind='stable')
+    means, weights = _compress(means[order], weights[order])
+
+    return {
+        'count': count,
+        'mean': a['mean'] + delta * b['count'] / count,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['count'] * b['count'] / count,
+        'min': min(a['min'], b['min']),
+        'max': max(a['max'], b['max']),
+        'sketch': {'means': means.tolist(), 'weights': weights.tolist()}
+    }
+
+
+def merge_all(summaries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    '''Merge any number of summaries (empty input gives an empty summary).'''
+    total = summarize(np.empty(0))
+    for summary in summaries:
+        total = merge(total, summary)
+    return total
+
+
+def std(summary: Dict[str, Any]) -> float:
+    '''Sample standard deviation (ddof=1); 0 for fewer than 2 values.'''
+    if summary['count'] < 2:
+        return 0.0
+    return math.sqrt(summary['m2'] / (summary['count'] - 1))
+
+
+def quantile(summary: Dict[str, Any], q: float) -> float:
+    '''
+    Approximate q-quantile from the sketch.
+
+    Each centroid sits at the middle of its weight on the rank axis;
+    ranks between centroids (and out to min and max) are interpolated.
+    '''
+    if summary['count'] == 0:
+        raise ValueError("Cannot take a quantile of an empty summary")
+    means = np.asarray(summary['sketch']['means'])
+    weights = np.asarray(summary['sketch']['weights'])
+    ranks = np.cumsum(weights) - weights / 2
+    return float(np.interp(
+        q * summary['count'],
+        np.concatenate([[0], ranks, [summary['count']]]),
+        np.concatenate([[summary['min']], means, [summary['max']]])
+    ))
+
+
+def describe(summary: Dict[str, Any]) -> Dict[str, Any]:
+    '''Descriptive statistics of a summary, without the sketch.'''
+    if summary['count'] == 0:
+        return {'count': 0}
+    return {
+        'count': summary['count'],
+        'mean': summary['mean'],
+        'std': std(summary),
+        'min': summary['min'],
+        'q1': quantile(summary, 0.25),
+        'median': quantile(summary, 0.5),
+        'q3': quantile(summary, 0.75),
+        'max': summary['max']
+    }
@@ -6,9 +6,11 @@ Tests if a sample mean differs from a hypothesized value.
 
 import numpy as np
 from typing import Dict, Any, Optional, List
-from scipy import stats
 
+from app.services.sim_service import datasets, summaries, tables
 from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, lttb, stride_sample
+from app.core.config import settings
 
 
 class OneSampleTTestSimulation(BaseSimulation):
@@ -39,16 +41,22 @@ class OneSampleTTestSimulation(BaseSimulation):
         Args:
             params:
                 - data: List of sample values OR
+                - dataset_id, column: Uploaded dataset column, tested from
+                  its ingest-time summary (see datasets.py) OR
                 - sample_mean: Pre-calculated mean
                 - sample_std: Pre-calculated standard deviation
                 - n: Sample size (if using summary stats)
                 - mu0: Hypothesized population mean
                 - alternative: 'two-sided', 'greater', or 'less'
                 - alpha: Significance level
+                - max_points / max_bytes: Series budget (see downsample.py)
                 
         Returns:
             SimulationResult with test statistics and decision
         '''
+        # Imported here so importing the engine does not load scipy
+        from scipy import stats
+
         # Extract parameters
         alpha = params.get('alpha', 0.05)
         mu0 = params.get('mu0', 0)
@@ -66,6 +74,16 @@ class OneSampleTTestSimulation(BaseSimulation):
             sample_median = np.median(data)
             q1, q3 = np.percentile(data, [25, 75])
             iqr = q3 - q1
+        elif 'dataset_id' in params:
+            # Summary computed at upload, so the data is not read at all
+            summary = datasets.column_summary(params['dataset_id'], params.get('column'))
+            n = summary['count']
+            sample_mean = summary['mean']
+            sample_std = summaries.std(summary)
+
+            sample_median = summaries.quantile(summary, 0.5)
+            q1, q3 = summaries.quantile(summary, 0.25), summaries.quantile(summary, 0.75)
+            iqr = q3 - q1
         else:
             # Use provided summary statistics
             sample_mean = params.get('sample_mean')
@@ -73,19 +91,22 @@ class OneSampleTTestSimulation(BaseSimulation):
             n = params.get('n')
             
             if None in [sample_mean, sample_std, n]:
-                raise ValueError("Must provide either 'data' or all of: sample_mean, sample_std, n")
+                raise ValueError(
+                    "Must provide 'data', 'dataset_id' and 'column', or all of: sample_mean, sample_std, n"
+                )
             
             sample_median = None
             q1 = q3 = iqr = None
         
         # Validate inputs
+        self.validate_params({'alpha': alpha}, {'alpha': (1e-6, 0.5)})
         if n <= 1:
             raise ValueError("Sample size must be greater than 1")
         if sample_std < 0:
             raise ValueError("Standard deviation cannot be negative")
         
         # Calculate degrees of freedom
-        df = n - 1
+        df = int(n - 1)
         
         # Calculate standard error
         se = sample_std / np.sqrt(n)
@@ -100,24 +121,24 @@ class OneSampleTTestSimulation(BaseSimulation):
         # Calculate p-value
         if alternative == 'two-sided':
             p_value = 2 * (1 - stats.t.cdf(abs(t_stat), df))
-            t_critical = stats.t.ppf(1 - alpha/2, df)
+            t_critical = tables.t_critical(df, alpha, 'two-sided')
             reject_region = f"|t| > {t_critical:.3f}"
         elif alternative == 'greater':
             p_value = 1 - stats.t.cdf(t_stat, df)
-            t_critical = stats.t.ppf(1 - alpha, df)
+            t_critical = tables.t_critical(df, alpha, 'greater')
             reject_region = f"t > {t_critical:.3f}"
         elif alternative == 'less':
             p_value = stats.t.cdf(t_stat, df)
-            t_critical = stats.t.ppf(alpha, df)
+            t_critical = tables.t_critical(df, alpha, 'less')
             reject_region = f"t < {t_critical:.3f}"
         else:
             raise ValueError("Alternative must be 'two-sided', 'greater', or 'less'")
         
         # Make decision
-        reject_null = p_value < alpha
+        reject_null = bool(p_value < alpha)
         
         # Calculate confidence interval
-        t_critical_ci = stats.t.ppf(1 - alpha/2, df)
+        t_critical_ci = tables.t_critical(df, alpha)
         margin_of_error = t_critical_ci * se
         ci_lower = sample_mean - margin_of_error
         ci_upper = sample_mean + margin_of_error
@@ -138,12 +159,17 @@ class OneSampleTTestSimulation(BaseSimulation):
         
         # Generate visualization data
         # T-distribution under null hypothesis
-        x_range = np.linspace(-4, 4, 200)
-        null_dist = stats.t.pdf(x_range, df)
+        x_range = tables.REFERENCE_X
+        null_dist = tables.t_null_curve(df)
         
         # Alternative distribution (for power visualization)
         alt_dist = stats.t.pdf(x_range, df, loc=t_stat)
         
+        # Downsample both curves to the series budget
+        points = budget_points(params, len(x_range), num_series=2, values_per_point=2)
+        null_keep = lttb(x_range, null_dist, points)
+        alt_keep = lttb(x_range, alt_dist, points)
+        
         return SimulationResult(
             meta={
                 'test': 'one_sample_t_test',
@@ -153,12 +179,12 @@ class OneSampleTTestSimulation(BaseSimulation):
             },
             series={
                 'null_distribution': {
-                    'x': x_range.tolist(),
-                    'y': null_dist.tolist()
+                    'x': x_range[null_keep],
+                    'y': null_dist[null_keep]
                 },
                 'alternative_distribution': {
-                    'x': x_range.tolist(),
-                    'y': alt_dist.tolist()
+                    'x': x_range[alt_keep],
+                    'y': alt_dist[alt_keep]
                 },
                 'test_statistic_position': t_stat,
                 'critical_values': {
@@ -198,6 +224,122 @@ class OneSampleTTestSimulation(BaseSimulation):
             }
         )
     
+    def run_batch(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run many one-sample t-tests from summary statistics at once.
+        
+        Every statistic is computed as one vectorized pass over the
+        arrays; reference curves are only generated on request.
+        
+        Args:
+            params:
+                - sample_mean, sample_std, n, mu0: Numbers or equal-length
+                  lists (scalars apply to every row; mu0 defaults to 0)
+                - alternative: 'two-sided', 'greater', or 'less'
+                - alpha: Significance level (default 0.05)
+                - include_curves: Add null t-distribution curves, one per
+                  distinct degrees of freedom
+                - max_points / max_bytes: Curve budget (see downsample.py)
+                
+        Returns:
+            SimulationResult with one list entry per test in metrics
+        '''
+        from scipy import stats
+
+        alpha = params.get('alpha', 0.05)
+        alternative = params.get('alternative', 'two-sided')
+        include_curves = params.get('include_curves', False)
+        
+        values = self.broadcast_params(
+            params,
+            {'sample_mean': None, 'sample_std': None, 'n': None, 'mu0': 0},
+            settings.MAX_SIMULATION_BATCH_SIZE
+        )
+        sample_mean, sample_std = values['sample_mean'], values['sample_std']
+        n, mu0 = values['n'], values['mu0']
+        
+        # Validate inputs
+        self.validate_params({'alpha': alpha}, {'alpha': (1e-6, 0.5)})
+        if np.any(n <= 1):
+            raise ValueError("Sample size must be greater than 1")
+        if np.any(n != np.round(n)):
+            raise ValueError("Sample size must be a whole number")
+        if np.any(sample_std < 0):
+            raise ValueError("Standard deviation cannot be negative")
+        
+        df = n - 1
+        se = sample_std / np.sqrt(n)
+        diff = sample_mean - mu0
+        
+        # t-statistics (identical values give t = ±inf or 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_stat = np.where(se > 0, diff / se, np.where(diff != 0, np.inf * np.sign(diff), 0.0))
+        
+        # p-values and critical values
+        if alternative == 'two-sided':
+            p_value = 2 * stats.t.sf(np.abs(t_stat), df)
+        elif alternative == 'greater':
+            p_value = stats.t.sf(t_stat, df)
+        elif alternative == 'less':
+            p_value = stats.t.cdf(t_stat, df)
+        else:
+            raise ValueError("Alternative must be 'two-sided', 'greater', or 'less'")
+        t_critical = tables.t_critical_array(df, alpha, alternative)
+        
+        # Confidence intervals
+        margin_of_error = tables.t_critical_array(df, alpha) * se
+        
+        # Cohen's d and post-hoc power
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cohens_d = np.where(sample_std > 0, diff / sample_std, 0.0)
+            ncp = np.where(se > 0, np.abs(diff) / se, 0.0)
+        if alternative == 'two-sided':
+            power = stats.nct.sf(t_critical, df, ncp) + stats.nct.cdf(-t_critical, df, ncp)
+        elif alternative == 'greater':
+            power = stats.nct.sf(t_critical, df, ncp)
+        else:  # less
+            power = stats.nct.cdf(t_critical, df, -ncp)
+        
+        series = None
+        if include_curves:
+            # Curves share one x grid, so they are strided rather than LTTB'd
+            unique_df = np.unique(df.astype(int)).tolist()
+            keep = stride_sample(np.arange(len(tables.REFERENCE_X)), budget_points(
+                params, len(tables.REFERENCE_X), num_series=len(unique_df) + 1
+            ))
+            series = {
+                'x': tables.REFERENCE_X[keep],
+                'null_distributions': {
+                    str(d): tables.t_null_curve(d)[keep]
+                    for d in unique_df
+                }
+            }
+        
+        return SimulationResult(
+            meta={
+                'test': 'one_sample_t_test',
+                'alternative': alternative,
+                'alpha': alpha,
+                'batch_size': int(t_stat.size)
+            },
+            series=series,
+            metrics={
+                't_statistic': np.round(t_stat, 4).tolist(),
+                'degrees_of_freedom': df.astype(int).tolist(),
+                'standard_error': np.round(se, 6).tolist(),
+                'p_value': np.round(p_value, 6).tolist(),
+                'reject_null': (p_value < alpha).tolist(),
+                'critical_value': np.round(t_critical, 4).tolist(),
+                'confidence_interval': {
+                    'level': f"{(1-alpha)*100:.0f}%",
+                    'lower': np.round(sample_mean - margin_of_error, 4).tolist(),
+                    'upper': np.round(sample_mean + margin_of_error, 4).tolist()
+                },
+                'cohens_d': np.round(cohens_d, 4).tolist(),
+                'power': np.round(power, 4).tolist()
+            }
+        )
+    
     def _interpret_cohens_d(self, d: float) -> str:
         '''Interpret Cohen's d effect size'''
         if d < 0.2:
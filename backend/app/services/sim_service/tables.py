@@ -0,0 +1,180 @@
+'''
+Reference Tables
+
+Memoized critical values and null-distribution curves for the hypothesis
+tests, pmf tables for the discrete distributions, log-factorial tables
+for the counting rules and alias tables for discrete sampling. These
+depend only on their parameters, so repeated runs only pay for the
+data-dependent arithmetic.
+
+scipy is only imported on first use (see _stats()).
+'''
+
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+
+# Shared x-grid for reference curves (standardized test statistic)
+REFERENCE_X = np.linspace(-4, 4, 200)
+REFERENCE_X.flags.writeable = False
+
+TABLE_CACHE_SIZE = 1024
+
+# pmf tables hold n + 1 values each, so keep fewer of them
+PMF_CACHE_SIZE = 128
+
+
+def _stats() -> Any:
+    '''
+    scipy.stats, imported on first use.
+
+    Engines that only use these tables can then be imported (e.g. by the
+    web process to plan sharded runs) without loading scipy.
+    '''
+    from scipy import stats
+
+    return stats
+
+
+def _special() -> Any:
+    '''scipy.special, imported on first use (see _stats()).'''
+    from scipy import special
+
+    return special
+
+
+def _check_alternative(alternative: str) -> None:
+    if alternative not in ('two-sided', 'greater', 'less'):
+        raise ValueError("Alternative must be 'two-sided', 'greater', or 'less'")
+
+
+def _quantile(alpha: float, alternative: str) -> float:
+    '''Quantile of the critical value: 1-α/2, 1-α or α (see z_critical()).'''
+    _check_alternative(alternative)
+    if alternative == 'two-sided':
+        return 1 - alpha/2
+    if alternative == 'greater':
+        return 1 - alpha
+    return alpha
+
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def z_critical(alpha: float, alternative: str = 'two-sided') -> float:
+    '''
+    Critical value of the standard normal.
+
+    Returns z(1-α/2) for two-sided tests, z(1-α) for 'greater'
+    and z(α) for 'less'.
+    '''
+    return float(_stats().norm.ppf(_quantile(alpha, alternative)))
+
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def t_critical(df: int, alpha: float, alternative: str = 'two-sided') -> float:
+    '''
+    Critical value of Student's t with df degrees of freedom.
+
+    Same conventions as z_critical().
+    '''
+    return float(_stats().t.ppf(_quantile(alpha, alternative), df))
+
+
+def t_critical_array(df: np.ndarray, alpha: float, alternative: str = 'two-sided') -> np.ndarray:
+    '''
+    Vectorized t_critical() over an array of df (not necessarily integer).
+
+    One ppf call over the distinct df, so pass the smallest array that
+    broadcasts to the shape needed.
+    '''
+    unique_df, inverse = np.unique(df, return_inverse=True)
+    values = _stats().t.ppf(_quantile(alpha, alternative), unique_df)
+    return values[inverse].reshape(np.shape(df))
+
+
+@lru_cache(maxsize=1)
+def z_null_curve() -> np.ndarray:
+    '''Standard normal pdf over REFERENCE_X (read-only).'''
+    curve = _stats().norm.pdf(REFERENCE_X, 0, 1)
+    curve.flags.writeable = False
+    return curve
+
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def t_null_curve(df: int) -> np.ndarray:
+    '''Student's t pdf with df degrees of freedom over REFERENCE_X (read-only).'''
+    curve = _stats().t.pdf(REFERENCE_X, df)
+    curve.flags.writeable = False
+    return curve
+
+
+@lru_cache(maxsize=PMF_CACHE_SIZE)
+def binom_pmf(n: int, p: float) -> np.ndarray:
+    '''Binomial(n, p) pmf over k = 0..n (read-only).'''
+    pmf = _stats().binom.pmf(np.arange(n + 1), n, p)
+    pmf.flags.writeable = False
+    return pmf
+
+
+@lru_cache(maxsize=PMF_CACHE_SIZE)
+def poisson_pmf(rate: float, k_max: int) -> np.ndarray:
+    '''Poisson(rate) pmf over k = 0..k_max (read-only).'''
+    pmf = _stats().poisson.pmf(np.arange(k_max + 1), rate)
+    pmf.flags.writeable = False
+    return pmf
+
+
+@lru_cache(maxsize=PMF_CACHE_SIZE)
+def log_factorials(n_max: int) -> np.ndarray:
+    '''ln(k!) for k = 0..n_max via log-gamma (read-only).'''
+    table = _special().gammaln(np.arange(n_max + 1) + 1.0)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=PMF_CACHE_SIZE)
+def alias_table(probs: Tuple[float, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Walker alias table of a discrete distribution (Vose's method).
+
+    Column i is kept with probability accept[i] and otherwise replaced
+    by alias[i], so a draw is one uniform column plus one uniform
+    threshold. Built in O(k); arrays are read-only.
+
+    Args:
+        probs: Probabilities of the k outcomes (summing to 1), as a tuple
+            so the table is cached per distinct distribution
+
+    Returns:
+        (accept, alias) arrays of length k
+    '''
+    k = len(probs)
+    scaled = np.asarray(probs, dtype=float) * k
+    accept = np.ones(k)
+    alias = np.arange(k)
+
+    small = [i for i in range(k) if scaled[i] < 1]
+    large = [i for i in range(k) if scaled[i] >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        accept[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    # Leftovers are 1 up to rounding error and keep accept = 1
+
+    accept.flags.writeable = False
+    alias.flags.writeable = False
+    return accept, alias
+
+
+def cache_info() -> Dict[str, Any]:
+    '''lru_cache statistics for each table.'''
+    return {
+        table.__name__: table.cache_info()._asdict()
+        for table in (
+            z_critical, t_critical, z_null_curve, t_null_curve, binom_pmf, poisson_pmf,
+            log_factorials, alias_table
+        )
+    }
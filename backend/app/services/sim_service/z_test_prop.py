@@ -6,9 +6,11 @@ Tests if a sample proportion differs from a hypothesized value.
 
 import numpy as np
 from typing import Dict, Any
-from scipy import stats
 
+from app.services.sim_service import tables
 from app.services.sim_service.base import BaseSimulation, SimulationResult
+from app.services.sim_service.downsample import budget_points, lttb
+from app.core.config import settings
 
 
 class ZTestProportionSimulation(BaseSimulation):
@@ -41,10 +43,14 @@ class ZTestProportionSimulation(BaseSimulation):
                 - p0: Hypothesized proportion (default 0.5)
                 - alternative: 'two-sided', 'greater', or 'less'
                 - alpha: Significance level (default 0.05)
+                - max_points / max_bytes: Series budget (see downsample.py)
                 
         Returns:
             SimulationResult with test statistics and decision
         '''
+        # Imported here so importing the engine does not load scipy
+        from scipy import stats
+
         # Extract parameters
         successes = params.get('successes', 50)
         n = params.get('n', 100)
@@ -53,6 +59,11 @@ class ZTestProportionSimulation(BaseSimulation):
         alpha = params.get('alpha', 0.05)
         
         # Validate inputs
+        self.validate_params(
+            {'successes': successes, 'n': n, 'p0': p0, 'alpha': alpha},
+            {'successes': (0, float('inf')), 'n': (1, float('inf')),
+             'p0': (0, 1), 'alpha': (1e-6, 0.5)}
+        )
         if n <= 0:
             raise ValueError("Sample size must be positive")
         if successes < 0 or successes > n:
@@ -81,24 +92,24 @@ class ZTestProportionSimulation(BaseSimulation):
         if alternative == 'two-sided':
             p_value = 2 * (1 - stats.norm.cdf(abs(z_stat)))
             # Critical values for two-sided test
-            z_critical = stats.norm.ppf(1 - alpha/2)
+            z_critical = tables.z_critical(alpha, 'two-sided')
             reject_region = f"|z| > {z_critical:.3f}"
         elif alternative == 'greater':
             p_value = 1 - stats.norm.cdf(z_stat)
-            z_critical = stats.norm.ppf(1 - alpha)
+            z_critical = tables.z_critical(alpha, 'greater')
             reject_region = f"z > {z_critical:.3f}"
         elif alternative == 'less':
             p_value = stats.norm.cdf(z_stat)
-            z_critical = stats.norm.ppf(alpha)
+            z_critical = tables.z_critical(alpha, 'less')
             reject_region = f"z < {z_critical:.3f}"
         else:
             raise ValueError("Alternative must be 'two-sided', 'greater', or 'less'")
         
         # Make decision
-        reject_null = p_value < alpha
+        reject_null = bool(p_value < alpha)
         
         # Calculate confidence interval (Wilson score interval for better coverage)
-        z_alpha = stats.norm.ppf(1 - alpha/2)
+        z_alpha = tables.z_critical(alpha)
         denominator = 1 + z_alpha**2 / n
         center = (p_hat + z_alpha**2 / (2*n)) / denominator
         margin = z_alpha * np.sqrt(p_hat*(1-p_hat)/n + z_alpha**2/(4*n**2)) / denominator
@@ -119,8 +130,9 @@ class ZTestProportionSimulation(BaseSimulation):
         
         # Generate visualization data
         # Normal curve for null hypothesis
-        x_range = np.linspace(-4, 4, 200)
-        null_dist = stats.norm.pdf(x_range, 0, 1)
+        x_range = tables.REFERENCE_X
+        null_dist = tables.z_null_curve()
+        keep = lttb(x_range, null_dist, budget_points(params, len(x_range), values_per_point=2))
         
         return SimulationResult(
             meta={
@@ -130,8 +142,8 @@ class ZTestProportionSimulation(BaseSimulation):
             },
             series={
                 'null_distribution': {
-                    'x': x_range.tolist(),
-                    'y': null_dist.tolist()
+                    'x': x_range[keep],
+                    'y': null_dist[keep]
                 },
                 'test_statistic_position': z_stat,
                 'critical_values': {
@@ -169,6 +181,130 @@ class ZTestProportionSimulation(BaseSimulation):
             }
         )
     
+    def run_batch(self, params: Dict[str, Any]) -> SimulationResult:
+        '''
+        Run many one-proportion z-tests at once.
+        
+        Every statistic is computed as one vectorized pass over the
+        arrays; reference curves are only generated on request.
+        
+        Args:
+            params:
+                - successes, n, p0: Numbers or equal-length lists
+                  (scalars apply to every row; p0 defaults to 0.5)
+                - alternative: 'two-sided', 'greater', or 'less'
+                - alpha: Significance level (default 0.05)
+                - include_curves: Add the null distribution curve
+                - max_points / max_bytes: Curve budget (see downsample.py)
+                
+        Returns:
+            SimulationResult with one list entry per test in metrics
+        '''
+        from scipy import stats
+
+        alternative = params.get('alternative', 'two-sided')
+        alpha = params.get('alpha', 0.05)
+        include_curves = params.get('include_curves', False)
+        
+        values = self.broadcast_params(
+            params,
+            {'successes': None, 'n': None, 'p0': 0.5},
+            settings.MAX_SIMULATION_BATCH_SIZE
+        )
+        successes, n, p0 = values['successes'], values['n'], values['p0']
+        
+        # Validate inputs
+        self.validate_params({'alpha': alpha}, {'alpha': (1e-6, 0.5)})
+        if np.any(n <= 0):
+            raise ValueError("Sample size must be positive")
+        if np.any(n != np.round(n)) or np.any(successes != np.round(successes)):
+            raise ValueError("Sample size and successes must be whole numbers")
+        if np.any((successes < 0) | (successes > n)):
+            raise ValueError("Successes must be between 0 and n")
+        if np.any((p0 <= 0) | (p0 >= 1)):
+            raise ValueError("Hypothesized proportion must be between 0 and 1")
+        
+        p_hat = successes / n
+        conditions_met = (n * p0 >= 10) & (n * (1 - p0) >= 10)
+        
+        # z-statistics
+        epsilon = 1e-12
+        se = np.sqrt(np.maximum(p0 * (1 - p0) / n, epsilon))
+        z_stat = (p_hat - p0) / se
+        
+        # p-values and critical values
+        if alternative == 'two-sided':
+            p_value = 2 * stats.norm.sf(np.abs(z_stat))
+            z_critical = tables.z_critical(alpha, 'two-sided')
+        elif alternative == 'greater':
+            p_value = stats.norm.sf(z_stat)
+            z_critical = tables.z_critical(alpha, 'greater')
+        elif alternative == 'less':
+            p_value = stats.norm.cdf(z_stat)
+            z_critical = tables.z_critical(alpha, 'less')
+        else:
+            raise ValueError("Alternative must be 'two-sided', 'greater', or 'less'")
+        
+        # Wilson score interval
+        z_alpha = tables.z_critical(alpha)
+        denominator = 1 + z_alpha**2 / n
+        center = (p_hat + z_alpha**2 / (2*n)) / denominator
+        margin = z_alpha * np.sqrt(p_hat*(1-p_hat)/n + z_alpha**2/(4*n**2)) / denominator
+        ci_lower = np.maximum(0, center - margin)
+        ci_upper = np.minimum(1, center + margin)
+        
+        # Cohen's h
+        cohens_h = 2 * (np.arcsin(np.sqrt(p_hat)) - np.arcsin(np.sqrt(p0)))
+        
+        # Post-hoc power
+        if alternative == 'two-sided':
+            power = stats.norm.cdf(np.abs(z_stat) - z_critical) + stats.norm.cdf(-np.abs(z_stat) - z_critical)
+        elif alternative == 'greater':
+            power = stats.norm.sf(z_critical - z_stat)
+        else:  # less
+            power = stats.norm.cdf(z_critical - z_stat)
+        
+        series = None
+        if include_curves:
+            keep = lttb(tables.REFERENCE_X, tables.z_null_curve(), budget_points(
+                params, len(tables.REFERENCE_X), values_per_point=2
+            ))
+            series = {
+                'null_distribution': {
+                    'x': tables.REFERENCE_X[keep],
+                    'y': tables.z_null_curve()[keep]
+                },
+                'critical_values': {
+                    'lower': -z_critical if alternative == 'two-sided' else None,
+                    'upper': z_critical if alternative != 'less' else None
+                }
+            }
+        
+        return SimulationResult(
+            meta={
+                'test': 'one_proportion_z_test',
+                'alternative': alternative,
+                'alpha': alpha,
+                'batch_size': int(z_stat.size)
+            },
+            series=series,
+            metrics={
+                'sample_proportion': np.round(p_hat, 4).tolist(),
+                'z_statistic': np.round(z_stat, 4).tolist(),
+                'p_value': np.round(p_value, 6).tolist(),
+                'standard_error': np.round(se, 6).tolist(),
+                'reject_null': (p_value < alpha).tolist(),
+                'confidence_interval': {
+                    'level': f"{(1-alpha)*100:.0f}%",
+                    'lower': np.round(ci_lower, 4).tolist(),
+                    'upper': np.round(ci_upper, 4).tolist()
+                },
+                'cohens_h': np.round(cohens_h, 4).tolist(),
+                'power': np.round(power, 4).tolist(),
+                'conditions_met': conditions_met.tolist()
+            }
+        )
+    
     def _interpret_cohens_h(self, h: float) -> str:
         '''Interpret Cohen's h effect size'''
         if h < 0.2:
@@ -0,0 +1,285 @@
+"""Benchmark harness for the sim_service engines.
+
+Runs every registered simulation across a parameter matrix and records wall
+time, throughput (trials/second), peak RSS and payload size (plain JSON and
+with series arrays packed as base64 float32). Results can be saved as a
+baseline and later compared against, failing when throughput regresses past
+a threshold.
+
+Resampling cases run on a generated dataset, uploaded into a temporary
+UPLOAD_DIR for the length of the run.
+
+Usage:
+    python scripts/bench_sims.py --output baseline.json
+    python scripts/bench_sims.py --compare baseline.json --threshold 0.2
+    python scripts/bench_sims.py --quick --only pi_darts clt
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+Case = Tuple[str, str, Dict[str, Any], int]  # (case id, sim type, params, work units)
+
+# Each timed repeat loops a case until it has run at least this long
+MIN_MEASURE_S = 0.2
+
+# Rows in the generated dataset used by the resampling cases
+DATASET_ROWS = 10_000
+
+
+def build_cases(quick: bool, seeds: List[int], dataset_id: Optional[str] = None) -> List[Case]:
+    """Build the benchmark parameter matrix.
+
+    Work units are what "trials" means for each sim (darts, flips,
+    draws x trials, sample_size x num_samples, expected arrivals, tables,
+    tests, grid points, tree nodes listed, rows x resamples). Resampling
+    cases are only built when a dataset_id (see make_dataset) is given.
+    """
+    trials = [10_000, 100_000] if quick else [10_000, 1_000_000, 2_000_000]
+    replicates = [1_000] if quick else [1_000, 10_000]
+    sample_sizes = [30, 1000]
+
+    cases: List[Case] = []
+    for seed in seeds:
+        for n in trials:
+            cases.append((f"coin_flipper/trials={n}/seed={seed}", "coin_flipper",
+                          {"trials": n, "seed": seed}, n))
+            cases.append((f"pi_darts/trials={n}/seed={seed}", "pi_darts",
+                          {"trials": n, "seed": seed}, n))
+
+        for dist, k, m in itertools.product(["uniform", "exponential", "binomial"], sample_sizes, replicates):
+            for exact in ([False, True] if dist != "uniform" else [False]):
+                cases.append((
+                    f"clt/{dist}/sample_size={k}/num_samples={m}/exact={exact}/seed={seed}", "clt",
+                    {"distribution": dist, "sample_size": k, "num_samples": m,
+                     "exact_sampler": exact, "seed": seed},
+                    k * m,
+                ))
+
+        for n, replacement, draws in itertools.product(trials[:2], [True, False], [2, 5]):
+            cases.append((
+                f"bag_draw/trials={n}/replacement={replacement}/draws={draws}/seed={seed}", "bag_draw",
+                {"trials": n, "replacement": replacement, "draws": draws, "seed": seed},
+                n * draws,
+            ))
+
+        for n, k in itertools.product(trials, [10, 1000]):
+            cases.append((f"binomial_bars/trials={n}/n={k}/seed={seed}", "binomial_bars",
+                          {"trials": n, "n": k, "p": 0.3, "seed": seed}, n))
+
+        for windows, rate in itertools.product([1_000, 100_000], [6, 20]):
+            cases.append((f"arrival_simulator/windows={windows}/lambda={rate}/seed={seed}",
+                          "arrival_simulator",
+                          {"lambda": rate, "window": "30m", "windows": windows, "seed": seed},
+                          windows * rate))
+
+        for tables in replicates:
+            cases.append((f"contingency_table/tables={tables}/seed={seed}", "contingency_table",
+                          {"a": 40, "b": 50, "ab": 25, "total": 100, "tables": tables, "seed": seed},
+                          tables))
+
+        for n in trials:
+            cases.append((f"distribution_table/trials={n}/seed={seed}", "distribution_table",
+                          {"rows": [{"x": -100, "p": 0.1}, {"x": 50, "p": 0.6}, {"x": 200, "p": 0.3}],
+                           "trials": n, "seed": seed}, n))
+
+        if dataset_id is not None:
+            for method, statistic, resamples in itertools.product(
+                ["bootstrap", "permutation"], ["mean", "median"], replicates
+            ):
+                cases.append((
+                    f"resampling/{method}/{statistic}/resamples={resamples}/seed={seed}", "resampling",
+                    {"dataset_id": dataset_id, "column": "x", "column_b": "y", "method": method,
+                     "statistic": statistic, "resamples": resamples, "seed": seed},
+                    DATASET_ROWS * resamples,
+                ))
+
+    # Analytic tests do not use the RNG, so they are not repeated per seed
+    cases.append(("t_test_one_sample/summary", "t_test_one_sample",
+                  {"sample_mean": 72, "sample_std": 8, "n": 25, "mu0": 70}, 1))
+    cases.append(("t_test_one_sample/data=10000", "t_test_one_sample",
+                  {"data": [float(i % 97) for i in range(10_000)], "mu0": 48}, 1))
+    cases.append(("z_test_prop/default", "z_test_prop", {}, 1))
+    for test in ["z_test_prop", "t_test_one_sample"]:
+        grid = {"min": 2, "max": 1000, "points": 100 if quick else 300}
+        effects = {"min": 0.05, "max": 1.5, "points": 100 if quick else 300}
+        cases.append((f"power_planner/{test}/grid={grid['points']}", "power_planner",
+                      {"test": test, "n_values": grid, "effect_sizes": effects, "target_power": 0.8},
+                      grid["points"] * effects["points"]))
+    page_size = 100 if quick else 1000
+    for order_matters, no_repeats in itertools.product([True, False], [False, True]):
+        cases.append((f"outcome_tree/order={order_matters}/no_repeats={no_repeats}/page={page_size}",
+                      "outcome_tree",
+                      {"steps": 10, "choicesPerStep": 20, "orderMatters": order_matters,
+                       "noRepeats": no_repeats, "level": 10, "cursor": "1000", "page_size": page_size},
+                      page_size))
+    return cases
+
+
+def make_dataset(upload_dir: Path) -> str:
+    """Upload a generated two-column CSV into upload_dir and return its id.
+
+    Sets UPLOAD_DIR in the environment first, so the settings of this
+    process and of the spawned benchmark workers both point at it.
+    """
+    os.environ["UPLOAD_DIR"] = str(upload_dir)
+    from app.services.sim_service import datasets
+
+    rows = "\n".join(f"{i % 89 * 0.5},{i % 97 * 0.4}" for i in range(DATASET_ROWS))
+    return datasets.save_upload("bench.csv", f"x,y\n{rows}\n".encode(), owner_id=0)["dataset_id"]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(
+    sim_type: str, params: Dict[str, Any], work: int, repeat: int, min_time: float
+) -> Dict[str, Any]:
+    """Run one case (in a fresh worker process) and measure it.
+
+    An untimed warm-up run pays for imports and table caches first. Each
+    of the `repeat` timed repeats then runs the case until at least
+    `min_time` seconds have passed, so fast cases are not timed at clock
+    resolution; the median time per run is kept.
+    """
+    from app.services.sim_service.encoding import encode_result
+    from app.services.sim_service.registry import create_simulation
+
+    result = create_simulation(sim_type, seed=params.get("seed")).run(params)
+    payload_bytes = len(encode_result(result.model_dump(), "json"))
+    packed_bytes = len(encode_result(result.model_dump(), "base64"))
+
+    timings = []
+    for _ in range(repeat):
+        runs = 0
+        elapsed = 0.0
+        while elapsed < min_time:
+            simulation = create_simulation(sim_type, seed=params.get("seed"))
+            start = time.perf_counter()
+            simulation.run(params)
+            elapsed += time.perf_counter() - start
+            runs += 1
+        timings.append(elapsed / runs)
+
+    wall = statistics.median(timings)
+    return {
+        "wall_s": round(wall, 6),
+        "trials_per_s": round(work / wall, 1) if wall > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "payload_bytes": payload_bytes,
+        "packed_bytes": packed_bytes,
+        "work": work,
+    }
+
+
+def run_benchmarks(cases: List[Case], repeat: int, min_time: float) -> Dict[str, Any]:
+    """Run all cases, each in its own process so peak RSS is per case."""
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        for case_id, sim_type, params, work in cases:
+            results[case_id] = pool.apply(run_case, (sim_type, params, work, repeat, min_time))
+            r = results[case_id]
+            print(f"{case_id:<80} {r['wall_s'] * 1000:>10.2f} ms {r['trials_per_s'] or 0:>16,.0f}/s "
+                  f"{r['peak_rss_mb'] or 0:>8.1f} MB {r['payload_bytes']:>10,} B")
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a description of each case whose throughput regressed past threshold."""
+    regressions = []
+    for case_id, base in baseline["results"].items():
+        now = current["results"].get(case_id)
+        if not now or not base.get("trials_per_s") or not now.get("trials_per_s"):
+            continue
+        ratio = now["trials_per_s"] / base["trials_per_s"]
+        if ratio < 1 - threshold:
+            regressions.append(
+                f"{case_id}: {now['trials_per_s']:,.0f}/s vs baseline "
+                f"{base['trials_per_s']:,.0f}/s ({(ratio - 1) * 100:+.1f}%)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark sim_service simulations")
+    parser.add_argument("--output", type=Path, help="Write results JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed throughput drop before failing (default 0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Timed repeats per case; the median is kept")
+    parser.add_argument("--min-time", type=float, default=MIN_MEASURE_S,
+                        help=f"Minimum seconds per timed repeat (default {MIN_MEASURE_S})")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="Seeds in the matrix")
+    parser.add_argument("--only", nargs="+", help="Only run these simulation types")
+    parser.add_argument("--quick", action="store_true", help="Smaller parameter matrix")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        dataset_id = None
+        if not args.only or "resampling" in args.only:
+            dataset_id = make_dataset(Path(upload_dir))
+        cases = build_cases(args.quick, args.seeds, dataset_id)
+        if args.only:
+            cases = [c for c in cases if c[1] in args.only]
+        results = run_benchmarks(cases, args.repeat, args.min_time)
+
+    import numpy
+    current = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "repeat": args.repeat,
+            "min_time_s": args.min_time,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+        print(f"Wrote {len(current['results'])} results to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} throughput regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo throughput regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+'''
+Seeded tests for the sim_service engines: sharded runs, batch tests,
+alias tables and mergeable column summaries.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services.sim_service import parallel, summaries, tables
+from app.services.sim_service.discrete import sample_indices
+from app.services.sim_service.encoding import encode_result
+from app.services.sim_service.registry import create_simulation
+
+
+# Small parameters for each simulation that supports sharding
+SHARDED_PARAMS = {
+    'pi_darts': {'trials': 20000},
+    'clt': {'distribution': 'exponential', 'sample_size': 10, 'num_samples': 2000},
+    'bag_draw': {'trials': 5000, 'draws': 3},
+    'binomial_bars': {'trials': 5000, 'n': 20, 'p': 0.3},
+}
+
+
+def _encoded(result):
+    '''JSON bytes of a result (or result dict), for exact comparison.'''
+    if not isinstance(result, dict):
+        result = result.model_dump()
+    return encode_result(result, 'json')
+
+
+@pytest.mark.parametrize('sim_type', sorted(SHARDED_PARAMS))
+def test_single_shard_matches_unsharded_run(sim_type):
+    params = SHARDED_PARAMS[sim_type]
+    part = parallel.run_shard(sim_type, params, np.random.SeedSequence(7))
+    merged = create_simulation(sim_type).merge_shards(params, [part])
+
+    unsharded = create_simulation(sim_type, seed=np.random.SeedSequence(7)).run(params)
+
+    assert _encoded(merged) == _encoded(unsharded)
+
+
+@pytest.mark.parametrize('sim_type', sorted(SHARDED_PARAMS))
+def test_sharded_run_same_on_executor_and_serially(sim_type):
+    params = {**SHARDED_PARAMS[sim_type], 'seed': 3}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pooled = parallel.run_sharded(sim_type, params, executor)
+    serial = parallel.run_sharded(sim_type, params)
+
+    assert _encoded(pooled) == _encoded(serial)
+
+
+@pytest.mark.parametrize('replacement', [True, False])
+def test_bag_draw_merged_tallies_match_one_tally(replacement):
+    params = {'colors': {'red': 5, 'blue': 3, 'green': 2}, 'draws': 4,
+              'replacement': replacement, 'trials': 3000}
+    simulation = create_simulation('bag_draw', seed=11)
+    colors, draws, _, trials, color_names, bag = simulation._setup(params)
+    drawn = simulation._draw(bag, draws, replacement, trials)
+
+    parts = [simulation._tally(rows, len(color_names)) for rows in np.array_split(drawn, 3)]
+    merged = simulation.merge_shards(params, parts)
+    whole = simulation._summarize(
+        colors, color_names, bag, draws, replacement,
+        simulation._tally(drawn, len(color_names)), trials
+    )
+
+    assert _encoded(merged) == _encoded(whole)
+
+
+def test_t_test_batch_matches_single_runs():
+    rows = [
+        {'sample_mean': 72, 'sample_std': 8, 'n': 25, 'mu0': 70},
+        {'sample_mean': 4.1, 'sample_std': 1.5, 'n': 12, 'mu0': 5},
+        {'sample_mean': 100, 'sample_std': 0.5, 'n': 400, 'mu0': 100},
+    ]
+    simulation = create_simulation('t_test_one_sample')
+    for alternative in ('two-sided', 'greater', 'less'):
+        batch = simulation.run_batch({
+            **{key: [row[key] for row in rows] for key in rows[0]},
+            'alternative': alternative, 'alpha': 0.01
+        }).metrics
+
+        for i, row in enumerate(rows):
+            single = simulation.run({**row, 'alternative': alternative, 'alpha': 0.01}).metrics
+            for key in ('t_statistic', 'p_value', 'power', 'standard_error',
+                        'degrees_of_freedom', 'reject_null'):
+                assert batch[key][i] == pytest.approx(single[key]), key
+            assert batch['cohens_d'][i] == pytest.approx(single['effect_size']['cohens_d'])
+            for bound in ('lower', 'upper'):
+                assert batch['confidence_interval'][bound][i] == pytest.approx(
+                    single['confidence_interval'][bound]
+                )
+
+
+def test_z_test_batch_matches_single_runs():
+    rows = [
+        {'successes': 60, 'n': 100, 'p0': 0.5},
+        {'successes': 3, 'n': 40, 'p0': 0.2},
+        {'successes': 500, 'n': 1000, 'p0': 0.5},
+    ]
+    simulation = create_simulation('z_test_prop')
+    for alternative in ('two-sided', 'greater', 'less'):
+        batch = simulation.run_batch({
+            **{key: [row[key] for row in rows] for key in rows[0]},
+            'alternative': alternative
+        }).metrics
+
+        for i, row in enumerate(rows):
+            single = simulation.run({**row, 'alternative': alternative}).metrics
+            for key in ('sample_proportion', 'z_statistic', 'p_value', 'standard_error',
+                        'power', 'reject_null'):
+                assert batch[key][i] == pytest.approx(single[key]), key
+            assert batch['cohens_h'][i] == pytest.approx(single['effect_size']['cohens_h'])
+            assert batch['conditions_met'][i] == single['conditions']['met']
+
+
+@pytest.mark.parametrize('sim_type, params', [
+    ('t_test_one_sample', {'sample_mean': [1], 'sample_std': [1], 'n': [10.5]}),
+    ('t_test_one_sample', {'sample_mean': [1], 'sample_std': [1], 'n': [10], 'alpha': 1.5}),
+    ('t_test_one_sample', {'sample_mean': [1], 'sample_std': [1], 'n': [10], 'alpha': 'x'}),
+    ('z_test_prop', {'successes': [5], 'n': [10.5]}),
+    ('z_test_prop', {'successes': [5], 'n': [10], 'alpha': 0}),
+])
+def test_batch_rejects_invalid_n_and_alpha(sim_type, params):
+    with pytest.raises(ValueError):
+        create_simulation(sim_type).run_batch(params)
+
+
+@pytest.mark.parametrize('probs', [
+    (1.0,),
+    (0.5, 0.5),
+    (0.1, 0.6, 0.3),
+    (0.0, 0.25, 0.0, 0.75),
+    tuple(np.random.default_rng(5).dirichlet(np.ones(50))),
+])
+def test_alias_table_reconstructs_probabilities(probs):
+    accept, alias = tables.alias_table(probs)
+    k = len(probs)
+
+    # Column i keeps i with probability accept[i], else gives alias[i]
+    mass = accept / k + np.bincount(alias, weights=(1 - accept) / k, minlength=k)
+
+    np.testing.assert_allclose(mass, probs, atol=1e-12)
+
+
+def test_alias_sampling_frequencies():
+    probs = (0.1, 0.6, 0.05, 0.25)
+    draws = 200_000
+    counts = np.bincount(
+        sample_indices(np.random.default_rng(0), probs, draws), minlength=len(probs)
+    )
+
+    # Within 5 standard errors of the expected counts
+    expected = np.array(probs) * draws
+    assert np.all(np.abs(counts - expected) < 5 * np.sqrt(expected * (1 - np.array(probs))))
+
+
+def test_summary_merge_matches_whole():
+    rng = np.random.default_rng(1)
+    chunks = [rng.normal(10, 3, 5000), rng.exponential(2, 1234), rng.uniform(-5, 5, 1), rng.normal(0, 1, 800)]
+    values = np.concatenate(chunks)
+
+    merged = summaries.merge_all(summaries.summarize(chunk) for chunk in chunks)
+    whole = summaries.summarize(values)
+
+    assert merged['count'] == whole['count'] == len(values)
+    assert merged['mean'] == pytest.approx(whole['mean'])
+    assert merged['m2'] == pytest.approx(whole['m2'])
+    assert merged['min'] == whole['min']
+    assert merged['max'] == whole['max']
+    assert summaries.std(merged) == pytest.approx(np.std(values, ddof=1))
+    assert sum(merged['sketch']['weights']) == pytest.approx(len(values))
+    assert len(merged['sketch']['means']) <= summaries.SKETCH_CENTROIDS
+
+    # Sketch quantiles stay within a few centroids' worth of rank
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        rank = np.searchsorted(np.sort(values), summaries.quantile(merged, q)) / len(values)
+        assert abs(rank - q) < 3 / summaries.SKETCH_CENTROIDS
+
+
+def test_summary_merge_with_empty():
+    summary = summaries.summarize(np.arange(10.0))
+    empty = summaries.summarize(np.empty(0))
+
+    assert summaries.merge(empty, summary) == summary
+    assert summaries.merge(summary, empty) == summary